@@ -1,55 +1,69 @@
 import asyncio
 import asyncio.events
-import undetected_chromedriver as uc
+import hashlib
+import time
 import uvicorn
 from contextlib import asynccontextmanager
 from datetime import datetime
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, BackgroundTasks
+from functools import partial
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, BackgroundTasks, HTTPException, Header, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi_utils.tasks import repeat_every
-
-from models.models import JoinMeetingRequest, ChangeLayoutRequest, SendChatMessageRequest
-from services.launch_svc import launch_webdriver
+from typing import Any, Callable, Optional
+
+from models.models import JoinMeetingRequest, ChangeLayoutRequest, SendChatMessageRequest, SessionState, ImageFormat, \
+    RecordingFormat, CameraSourceRequest, PlaybackRequest
+from helpers.config import CAMERA_ENABLED, CAMERA_SOURCE, PLAYBACK_AUTO_UNMUTE, GOVERNOR_ENABLED, GOVERNOR_INTERVAL
+from helpers.screenshots import take_screenshot, screenshot_bytes
+from helpers.selectors import selector_stats
+from helpers.tracing import tracer
+from helpers.utils import drain_page_events, probe_state
+from services.audio_svc import AudioRecorder, AudioPlayer, Playback
+from services.camera_svc import CameraStreamer
+from services.cdp_svc import PageEventStream
+from services.command_svc import Command, QueueFullError
+from services.events_svc import ConnectionManager
+from services.governor_svc import MemoryGovernor
+from services.metrics_svc import RequestMetrics, loop_lag, render_metrics
+from services.preview_svc import PreviewStream
 from services.meet_svc import join_google_meet, toggle_mute_state, change_meeting_layout, send_chat_message, \
-    exit_meeting, toggle_video_state
-
-driver = None
-
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        await websocket.send_json({
-            "type": "connection_established",
-            "timestamp": datetime.now().isoformat(),
-            "data": "Connected to MeetBot events stream"
-        })
-
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                print(f"Error broadcasting message: {e}")
-
+    send_chat_messages, exit_meeting, toggle_video_state, set_mute_state, open_chat_panel, read_participants
+from services.session_svc import SessionPool, Session, PoolFullError
+
+pool = SessionPool()
+recorder = AudioRecorder()
+player = AudioPlayer()
+camera = CameraStreamer()
+governor = MemoryGovernor()
+# Sessions whose microphone was unmuted for playback and gets muted again after their last clip
+playback_unmuted: set[str] = set()
+# Rejoins started by the memory governor, by session id
+rejoins: dict[str, asyncio.Task] = {}
 
 manager = ConnectionManager()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global driver
-    driver = launch_webdriver()
+    pool.drivers.refill()
+    loop_lag.start()
+    # The audio player starts with the first clip, see start_player
+    if CAMERA_ENABLED:
+        try:
+            await asyncio.to_thread(camera.start, CAMERA_SOURCE)
+        except Exception as e:
+            print(f"Error starting virtual camera: {e}")
     await check_participants()
+    if GOVERNOR_ENABLED:
+        await govern_memory()
     yield
-    driver.quit()
+    await loop_lag.stop()
+    recorder.stop()
+    player.stop()
+    camera.stop()
+    pool.close_all()
+    manager.log.close()
 
 
 app = FastAPI(title="Meetbot API", version="0.0.1", lifespan=lifespan)
@@ -60,154 +74,896 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestMetrics)
 
 
-async def ws_broadcast(event: str, message: dict):
+async def ws_broadcast(event: str, message: dict, session_id: Optional[str] = None,
+                       command: Optional[Command] = None):
+    """
+    Broadcasts an event to subscribers. Completion events carry the request id and duration of their command.
+    """
     try:
         await manager.broadcast({
             "type": event,
             "timestamp": datetime.now().isoformat(),
+            "session_id": session_id,
+            "request_id": command.request_id if command else None,
+            "duration_ms": command.duration_ms if command else None,
             "data": message
         })
     except Exception as e:
         print(f"Error broadcasting event: {e}")
 
 
+def get_session(session_id: Optional[str], require_driver: bool = True) -> Session:
+    """
+    Resolves the session a request is addressed to.
+    When no session_id is given and exactly one session is active, that session is used.
+    """
+    if session_id is None:
+        if len(pool.sessions) == 1:
+            session = next(iter(pool.sessions.values()))
+        elif not pool.sessions:
+            raise HTTPException(status_code=404, detail="No active session")
+        else:
+            raise HTTPException(status_code=400, detail="session_id is required when multiple sessions are active")
+    else:
+        session = pool.get(session_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    if require_driver and session.driver is None:
+        raise HTTPException(status_code=409, detail=f"Session {session.session_id} browser is not ready yet")
+    return session
+
+
+@app.get("/sessions")
+async def list_sessions():
+    return {
+        "max_sessions": pool.max_sessions,
+        "sessions": [session.to_dict() for session in pool.sessions.values()]
+    }
+
+
+@app.get("/driver_pool")
+async def driver_pool_stats():
+    return pool.drivers.stats()
+
+
+@app.get("/selectors")
+async def selectors():
+    """
+    Returns hit and miss counts per UI selector and which fallback strategy currently goes first
+    """
+    return selector_stats()
+
+
+@app.get("/traces")
+async def traces(limit: int = Query(20, ge=1, le=1000)):
+    """
+    Returns the most recent traces of join, chat, layout and leave commands as OTLP JSON
+    """
+    return tracer.recent(limit)
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus text exposition of request and command histograms, event loop lag, queue depths, event fan-out,
+    per-session browser memory and CPU, ffmpeg streamer health and per-step latency percentiles
+    """
+    text = await render_metrics(pool, manager, tracer, recorder, player, camera, governor)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+
+@app.get("/commands")
+async def command_stats(session_id: Optional[str] = None):
+    """
+    Returns queue depth, queue-wait and execution-time metrics per command type of a session's driver
+    """
+    session = get_session(session_id, require_driver=False)
+    return {"session_id": session.session_id, **session.commands.stats()}
+
+
+@app.get("/operations/{request_id}")
+async def get_operation(request_id: str, wait: bool = False, timeout: float = 30):
+    """
+    Returns the status and result of a command by its request id, optionally waiting for it to finish
+    """
+    command = pool.operations.get(request_id)
+    if command is None:
+        raise HTTPException(status_code=404, detail=f"Operation {request_id} not found")
+    if wait:
+        await command.wait(timeout)
+    return command.to_dict()
+
+
+def submit_command(session: Session, name: str, fn: Callable, *args,
+                   batch_fn: Optional[Callable] = None) -> tuple[Command, int]:
+    """
+    Queues a browser command on the session's driver, rejecting it with 429 when the queue is full
+    """
+    try:
+        command, position = session.commands.submit(name, fn, session.driver, *args, batch_fn=batch_fn)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    # Whatever the command did to the page, the cached state probe no longer reflects it
+    command.future.add_done_callback(lambda _: session.ui_state.invalidate())
+    return command, position
+
+
+async def command_response(session: Session, command: Command, position: int, message: str,
+                           wait: bool, timeout: float) -> dict:
+    """
+    Builds the response of a command endpoint. With wait, the command's outcome is included inline
+    once it finishes or the timeout expires, whichever comes first.
+    """
+    response = {
+        "message": message,
+        "session_id": session.session_id,
+        "request_id": command.request_id,
+        "queue_position": position,
+    }
+    if wait:
+        await command.wait(timeout)
+        response.update(command.to_dict())
+    return response
+
+
+async def command_succeeded(session: Session, command: Command) -> bool:
+    """
+    Waits for a command and broadcasts command_failed when it did not succeed
+    """
+    await command.wait(timeout=None)
+    if command.status == "succeeded":
+        return True
+    await ws_broadcast("command_failed", {
+        "command": command.name,
+        "status": command.status,
+        "error": command.error
+    }, session.session_id, command)
+    return False
+
+
 @app.post("/join_meeting")
-async def join_meeting(request: JoinMeetingRequest, background_tasks: BackgroundTasks):
-    background_tasks.add_task(join_meeting_background, request)
-    return {"message": "Meet join operation started"}
+async def join_meeting(request: JoinMeetingRequest, background_tasks: BackgroundTasks,
+                       wait: bool = False, timeout: float = 120):
+    try:
+        session = pool.create(request.bot_name, request.meeting_url)
+    except PoolFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    session.commands.start()
+    launch_command, _ = session.commands.submit("launch_browser", session.launch, track=False)
+    command, position = session.commands.submit("join_meeting", join_session_meeting, session)
+    background_tasks.add_task(join_meeting_background, session, launch_command, command)
+    return await command_response(session, command, position, "Meet join operation started", wait, timeout)
+
+
+def join_session_meeting(session: Session):
+    """
+    Joins the session's meeting with the driver it was launched with
+    """
+    if session.driver is None:
+        raise RuntimeError("Browser was not launched")
+    return join_google_meet(session.driver, session.bot_name, session.meeting_url)
 
 
-async def join_meeting_background(request: JoinMeetingRequest):
+async def close_session(session: Session, recycle: bool = True):
+    """
+    Stops the session's event stream and command queue, frees its pool slot
+    and hands its browser back to the driver pool
+    """
+    rejoin = rejoins.pop(session.session_id, None)
+    if rejoin and rejoin is not asyncio.current_task():
+        rejoin.cancel()
+    await session.commands.stop()
+    if session.events:
+        await session.events.stop()
+        session.events = None
+    if session.preview:
+        await session.preview.stop()
+        session.preview = None
+    pool.remove(session.session_id)
+    governor.forget(session.session_id)
     loop = asyncio.get_event_loop()
-    await loop.run_in_executor(None, join_google_meet, driver, request.bot_name, request.meeting_url)
-    await ws_broadcast("meeting_join_request", {
-        "meeting_url": request.meeting_url,
-        "bot_name": request.bot_name
-    })
+    await loop.run_in_executor(None, session.close, recycle)
 
 
-@app.post("/leave_meeting")
-async def leave_meeting(background_tasks: BackgroundTasks):
-    background_tasks.add_task(leave_meeting_background)
-    return {"message": "Leave meeting operation started"}
+async def handle_page_event(session: Session, event: dict):
+    """
+    Broadcasts an event from the in-page observer of a session, whether pushed or drained, exactly once
+    """
+    if not session.accept_event(event):
+        return
+    event_type = event["kind"]
+    if event_type == "state_changed":
+        # Call control changes only invalidate the cached state probe
+        session.ui_state.invalidate()
+        return
+    if event_type == "participant_listed":
+        # Participant list snapshots only feed the roster
+        session.roster.mark_joined(event["name"])
+        return
+    if event_type == "bot_accepted":
+        if session.admission_started_ns:
+            tracer.record("join_meet/admission", session.admission_started_ns, session_id=session.session_id)
+            session.admission_started_ns = None
+        session.state = SessionState.IN_MEETING
+        session.ui_state.invalidate()
+        session.roster.mark_joined(session.bot_name)
+        # Participants already in the call showed no join toast, the People panel lists them.
+        # The chat panel is opened after it, Meet only renders chat messages for the observer while it is open.
+        submit_background(session, "read_participants", read_participants, on_result=session.roster.sync)
+        submit_background(session, "open_chat_panel", open_chat_panel)
+    elif event_type == "participant_joined":
+        session.roster.mark_joined(event["name"])
+    elif event_type == "participant_left":
+        session.roster.mark_left(event["name"])
+    elif event_type == "chat_message_received":
+        # The transcript file is written and flushed per message, off the event loop
+        message = await asyncio.to_thread(session.chat.append, event["message"], event.get("name"),
+                                          event.get("message_id"), event.get("sent_at"), session.session_id)
+        if message is None:
+            # Another session in the same meeting already stored it
+            return
+        await ws_broadcast(event_type, message, session.session_id)
+        return
+    await ws_broadcast(event_type, {"message": event.get("message"), "name": event.get("name")}, session.session_id)
+
+
+def submit_background(session: Session, name: str, fn: Callable, *args,
+                      on_result: Optional[Callable[[Any], None]] = None):
+    """
+    Queues a browser command on the session's driver that nobody waits for. Its result is handed to
+    on_result on the event loop, failures and a full queue are only logged.
+    """
+    def done(future: asyncio.Future):
+        session.ui_state.invalidate()
+        if future.cancelled():
+            return
+        if future.exception():
+            print(f"Error running {name} for session {session.session_id}: {future.exception()}")
+        elif on_result is not None:
+            on_result(future.result())
 
+    try:
+        command, _ = session.commands.submit(name, fn, session.driver, *args, track=False)
+    except QueueFullError as e:
+        print(f"{name} not queued for session {session.session_id}: {e}")
+        return
+    command.future.add_done_callback(done)
 
-async def leave_meeting_background():
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(None, exit_meeting, driver)
+
+async def join_failed(session: Session, command: Optional[Command], message: str, rejoin: bool):
+    """
+    Fails a join. A new session is closed, a rejoining one is kept as failed with its id, roster and chat,
+    so clients can still inspect it and leave it.
+    """
+    session.state = SessionState.FAILED
+    if not rejoin:
+        await close_session(session, recycle=False)
+    await ws_broadcast("meeting_join_failed", {"message": message, "rejoin": rejoin}, session.session_id, command)
+
+
+async def join_meeting_background(session: Session, launch_command: Command, command: Command, rejoin: bool = False):
+    await launch_command.wait(timeout=None)
+    if launch_command.status != "succeeded":
+        print(f"Error launching browser for session {session.session_id}: {launch_command.error}")
+        await join_failed(session, command, launch_command.error, rejoin)
+        return
+
+    # Observer events are pushed over DevTools, polling only covers sessions without a stream
+    session.events = PageEventStream(session.lease.debugger_address, session.lease.target_id,
+                                     partial(handle_page_event, session))
+    try:
+        await session.events.start()
+    except Exception as e:
+        print(f"Error starting event stream for session {session.session_id}, falling back to polling: {e}")
+        session.events = None
+
+    session.state = SessionState.JOINING
+    if not await command_succeeded(session, command):
+        await join_failed(session, command, command.error, rejoin)
+        return
+    # Time spent in the waiting room, traced when the observer reports the bot as accepted
+    session.admission_started_ns = time.time_ns()
+    await ws_broadcast("meeting_join_request", {
+        "meeting_url": session.meeting_url,
+        "bot_name": session.bot_name
+    }, session.session_id, command)
+
+
+@app.post("/leave_meeting")
+async def leave_meeting(background_tasks: BackgroundTasks, session_id: Optional[str] = None,
+                        wait: bool = False, timeout: float = 30):
+    session = get_session(session_id)
+    command, position = submit_command(session, "leave_meeting", exit_meeting)
+    session.state = SessionState.LEAVING
+    background_tasks.add_task(leave_meeting_background, session, command)
+    return await command_response(session, command, position, "Leave meeting operation started", wait, timeout)
+
+
+async def leave_meeting_background(session: Session, command: Command):
+    await command_succeeded(session, command)
+    await close_session(session)
     await ws_broadcast("meeting_left", {
         "message": "Bot left meeting"
-    })
+    }, session.session_id, command)
 
 
 @app.post("/toggle_mute")
-async def toggle_mute(background_tasks: BackgroundTasks):
-    background_tasks.add_task(toggle_mute_background)
-    return {"message": "Mute toggle operation started"}
+async def toggle_mute(background_tasks: BackgroundTasks, session_id: Optional[str] = None,
+                      wait: bool = False, timeout: float = 30):
+    session = get_session(session_id)
+    command, position = submit_command(session, "toggle_mute", toggle_mute_state)
+    background_tasks.add_task(toggle_mute_background, session, command)
+    return await command_response(session, command, position, "Mute toggle operation started", wait, timeout)
 
 
-async def toggle_mute_background():
-    loop = asyncio.get_event_loop()
-    mute_status = await loop.run_in_executor(None, toggle_mute_state, driver)
+async def toggle_mute_background(session: Session, command: Command):
+    if not await command_succeeded(session, command):
+        return
     await ws_broadcast("mute_toggled", {
-        "mute_status": mute_status
-    })
+        "mute_status": command.result
+    }, session.session_id, command)
 
 @app.post("/toggle_video")
-async def toggle_video(background_tasks: BackgroundTasks):
-    background_tasks.add_task(toggle_video_background)
-    return {"message": "Video toggle operation started"}
+async def toggle_video(background_tasks: BackgroundTasks, session_id: Optional[str] = None,
+                       wait: bool = False, timeout: float = 30):
+    session = get_session(session_id)
+    command, position = submit_command(session, "toggle_video", toggle_video_state)
+    background_tasks.add_task(toggle_video_background, session, command)
+    return await command_response(session, command, position, "Video toggle operation started", wait, timeout)
 
 
-async def toggle_video_background():
-    loop = asyncio.get_event_loop()
-    video_status = await loop.run_in_executor(None, toggle_video_state, driver)
+async def toggle_video_background(session: Session, command: Command):
+    if not await command_succeeded(session, command):
+        return
     await ws_broadcast("video_toggled", {
-        "video_status": video_status
-    })
+        "video_status": command.result
+    }, session.session_id, command)
 
 @app.post("/change_layout")
-async def change_layout(request: ChangeLayoutRequest, background_tasks: BackgroundTasks):
-    background_tasks.add_task(change_layout_background, request)
-    return {"message": "Layout change operation started"}
+async def change_layout(request: ChangeLayoutRequest, background_tasks: BackgroundTasks,
+                        session_id: Optional[str] = None, wait: bool = False, timeout: float = 30):
+    session = get_session(session_id)
+    command, position = submit_command(session, "change_layout", change_meeting_layout, request.layout)
+    background_tasks.add_task(change_layout_background, session, request, command)
+    return await command_response(session, command, position, "Layout change operation started", wait, timeout)
 
 
-async def change_layout_background(request: ChangeLayoutRequest):
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(None, change_meeting_layout, driver, request.layout)
+async def change_layout_background(session: Session, request: ChangeLayoutRequest, command: Command):
+    if not await command_succeeded(session, command):
+        return
     await ws_broadcast("layout_changed", {
-        "layout": request.layout.value
-    })
+        "requested": request.layout.value,
+        **command.result
+    }, session.session_id, command)
 
 
 @app.post("/create_screenshot")
-async def create_screenshot():
-    screenshot = driver.save_screenshot("screenshots/screenshot.png")
-    return {"message": "Screenshot created", "screenshot": screenshot}
+async def create_screenshot(session_id: Optional[str] = None):
+    session = get_session(session_id)
+    command, _ = submit_command(session, "create_screenshot", partial(take_screenshot, force=True), "manual")
+    screenshot = await command.future
+    if screenshot is None:
+        # The capture failed or the writer thread is behind, either may pass on a retry
+        raise HTTPException(status_code=503, detail="Screenshot could not be captured or stored, try again")
+    return {"message": "Screenshot created", "screenshot": screenshot, "session_id": session.session_id,
+            "request_id": command.request_id}
+
+
+@app.get("/screenshot")
+async def get_screenshot(session_id: Optional[str] = None, image_format: ImageFormat = Query(ImageFormat.JPEG, alias="format"),
+                         quality: int = Query(80, ge=0, le=100), scale: float = Query(1.0, gt=0, le=1),
+                         x: Optional[int] = None, y: Optional[int] = None,
+                         width: Optional[int] = Query(None, gt=0), height: Optional[int] = Query(None, gt=0),
+                         if_none_match: Optional[str] = Header(None)):
+    """
+    Returns the bot's current view as image bytes, optionally downscaled or limited to a region.
+    The capture runs on the session's driver thread. Unchanged frames are answered with 304 Not Modified
+    when the client sends the previous ETag in If-None-Match.
+    """
+    session = get_session(session_id)
+    region = (x, y, width, height)
+    if any(value is not None for value in region) and any(value is None for value in region):
+        raise HTTPException(status_code=400, detail="x, y, width and height are required together")
+    clip = {"x": x, "y": y, "width": width, "height": height} if width is not None else None
+    command, _ = submit_command(session, "screenshot", screenshot_bytes, image_format.value, quality, scale, clip)
+    try:
+        image = await command.future
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Screenshot capture failed: {e}")
+    etag = f'"{hashlib.blake2b(image, digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Request-Id": command.request_id}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=image, media_type=f"image/{image_format.value}", headers=headers)
 
 
 @app.post("/send_chat_message")
-async def send_message(request: SendChatMessageRequest, background_tasks: BackgroundTasks):
-    background_tasks.add_task(send_message_background, request)
-    return {"message": "Chat message operation started"}
+async def send_message(request: SendChatMessageRequest, background_tasks: BackgroundTasks,
+                       session_id: Optional[str] = None, wait: bool = False, timeout: float = 60):
+    session = get_session(session_id)
+    command, position = submit_command(session, "send_chat_message", send_chat_message, request.message,
+                                       request.typing_mode, batch_fn=send_chat_batch)
+    background_tasks.add_task(send_message_background, session, request, command)
+    return await command_response(session, command, position, "Chat message operation started", wait, timeout)
 
 
-async def send_message_background(request: SendChatMessageRequest):
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(None, send_chat_message, driver, request.message)
+def send_chat_batch(batch: list[tuple]) -> list:
+    """
+    Sends consecutive queued chat messages of a session with a single chat panel open
+    """
+    driver = batch[0][0]
+    return send_chat_messages(driver, [(message, typing_mode) for _, message, typing_mode in batch])
+
+
+async def send_message_background(session: Session, request: SendChatMessageRequest, command: Command):
+    if not await command_succeeded(session, command):
+        return
     await ws_broadcast("chat_message_sent", {
-        "message": request.message
-    })
+        "message": request.message,
+        "typing_mode": request.typing_mode.value
+    }, session.session_id, command)
 
 
 @repeat_every(seconds=5, raise_exceptions=True)
 async def check_participants():
-    join_message = driver.execute_script("return window._join_message")
-    left_message = driver.execute_script("return window._left_message")
-    join_accepted = driver.execute_script("return window._join_accepted")
-    if join_accepted:
-        await manager.broadcast({
-            "type": "bot_accepted",
-            "timestamp": datetime.now().isoformat(),
-            "data": {"message": "Bot accepted by host"}
-        })
-        driver.execute_script("window._join_accepted = null")
-    if join_message:
-        await manager.broadcast({
-            "type": "participant_joined",
-            "timestamp": datetime.now().isoformat(),
-            "data": {"message": join_message}
-        })
-        driver.execute_script("window._join_message = null")
-    if left_message:
-        await manager.broadcast({
-            "type": "participant_left",
-            "timestamp": datetime.now().isoformat(),
-            "data": {"message": left_message}
-        })
-        driver.execute_script("window._left_message = null")
+    # Sessions are drained concurrently, a long command on one driver must not hold up the others
+    sessions = pool.active()
+    results = await asyncio.gather(*(drain_session_events(session) for session in sessions), return_exceptions=True)
+    for session, result in zip(sessions, results):
+        if isinstance(result, Exception):
+            print(f"Error checking participants for session {session.session_id}: {result}")
+
+
+@repeat_every(seconds=GOVERNOR_INTERVAL, raise_exceptions=True)
+async def govern_memory():
+    # Sessions being rejoined are left alone until they are back in the meeting
+    sessions = [session for session in pool.active()
+                if session.state == SessionState.IN_MEETING and session.session_id not in rejoins]
+    await asyncio.gather(*(govern_session_memory(session) for session in sessions))
+
+
+async def govern_session_memory(session: Session):
+    try:
+        action = await governor.check(session, start_rejoin)
+    except Exception as e:
+        print(f"Error checking memory of session {session.session_id}: {e}")
+        return
+    if action:
+        event_type = "memory_governor_halted" if action["stage"] == "halt" else "memory_mitigation_applied"
+        await ws_broadcast(event_type, action, session.session_id)
+
+
+async def start_rejoin(session: Session):
+    """
+    Starts rejoining a session in a task of its own and returns, so a join waiting in the lobby
+    does not hold up the memory checks of the other sessions
+    """
+    session.state = SessionState.REJOINING
+    task = asyncio.get_running_loop().create_task(rejoin_session(session))
+    rejoins[session.session_id] = task
+
+    def done(_):
+        if rejoins.get(session.session_id) is task:
+            del rejoins[session.session_id]
+
+    task.add_done_callback(done)
+
+
+async def rejoin_session(session: Session):
+    """
+    Leaves the meeting and joins it again in a fresh browser. The session keeps its id, command queue,
+    roster and chat transcript, so clients see a short state change instead of a new session.
+    """
+    session.state = SessionState.REJOINING
+    await ws_broadcast("meeting_rejoin_started", {"meeting_url": session.meeting_url}, session.session_id)
+    if session.events:
+        await session.events.stop()
+        session.events = None
+    if session.preview:
+        await session.preview.stop()
+        session.preview = None
+    try:
+        await session.commands.run("leave_meeting", exit_meeting, session.driver, track=False)
+    except Exception as e:
+        print(f"Error leaving meeting before rejoin of session {session.session_id}: {e}")
+    try:
+        launch_command, _ = session.commands.submit("relaunch_browser", session.relaunch, track=False)
+        command, _ = session.commands.submit("join_meeting", join_session_meeting, session, track=False)
+    except QueueFullError as e:
+        await join_failed(session, None, str(e), rejoin=True)
+        return
+    await join_meeting_background(session, launch_command, command, rejoin=True)
+
+
+@app.get("/governor")
+async def governor_stats():
+    """
+    Returns memory governor thresholds, and per session the latest sample, stage and mitigations applied
+    """
+    return governor.stats()
+
+
+async def drain_session_events(session: Session):
+    """
+    Drains the in-page event queue of a session in one round trip and broadcasts what the push stream missed.
+    Also keeps the queue short while the push stream is connected.
+    """
+    try:
+        batch = await session.commands.run("drain_events", drain_page_events, session.driver, track=False)
+    except QueueFullError:
+        # Driver is saturated with user commands, the next round catches up
+        return
+    if not batch:
+        return
+    for event in batch["events"]:
+        await handle_page_event(session, event)
+    if batch["epoch"] == session.event_epoch and batch["dropped"] > session.events_dropped:
+        await ws_broadcast("event_buffer_overflow", {
+            "dropped": batch["dropped"],
+            "overflowed_since_last_drain": batch["dropped"] - session.events_dropped
+        }, session.session_id)
+        session.events_dropped = batch["dropped"]
+
+
+@app.get("/participants")
+async def list_participants(session_id: Optional[str] = None, present_only: bool = True):
+    """
+    Returns the participant roster of a session from memory
+    """
+    session = get_session(session_id, require_driver=False)
+    return {"session_id": session.session_id, **session.roster.to_dict(present_only)}
+
+
+@app.get("/chat")
+async def chat_transcript(session_id: Optional[str] = None, since: Optional[int] = None,
+                          sender: Optional[str] = None, q: Optional[str] = None,
+                          limit: int = Query(100, ge=1, le=1000)):
+    """
+    Returns the captured chat messages of a session's meeting after the chat seq since,
+    optionally from one sender and containing all words of q. Answered from the transcript index.
+    """
+    session = get_session(session_id, require_driver=False)
+    messages = session.chat.query(since, sender, q, limit)
+    return {"session_id": session.session_id, **session.chat.stats(), "results": messages}
+
+
+@app.get("/state")
+async def meeting_state(session_id: Optional[str] = None):
+    """
+    Returns mic, camera, chat panel, layout and in-call state of a session.
+    Served from the cached probe while it is fresh, otherwise probed in one browser round trip.
+    """
+    session = get_session(session_id)
+    state = session.ui_state.get()
+    cached = state is not None
+    if not cached:
+        generation = session.ui_state.generation
+        try:
+            state = await session.commands.run("probe_state", probe_state, session.driver, track=False)
+        except QueueFullError as e:
+            raise HTTPException(status_code=429, detail=str(e))
+        session.ui_state.update(state, generation)
+    return {"session_id": session.session_id, "cached": cached, "age_ms": session.ui_state.age_ms if cached else 0,
+            **state}
+
+
+async def start_preview(session: Session) -> PreviewStream:
+    """
+    Returns the session's live preview, starting its screencast unless it is already running
+    """
+    if session.preview is None:
+        session.preview = PreviewStream(session.lease.debugger_address, session.lease.target_id)
+    await session.preview.start()
+    return session.preview
+
+
+@app.get("/preview")
+async def preview_stats(session_id: Optional[str] = None):
+    session = get_session(session_id)
+    stats = session.preview.stats() if session.preview else {"running": False, "viewers": 0}
+    return {"session_id": session.session_id, **stats}
+
+
+@app.get("/preview.mjpeg")
+async def preview_mjpeg(session_id: Optional[str] = None, fps: Optional[float] = Query(None, gt=0)):
+    """
+    Streams the bot's live view as MJPEG, viewable directly in a browser <img> tag.
+    fps limits the frame rate for this viewer below the screencast rate.
+    """
+    session = get_session(session_id)
+    try:
+        preview = await start_preview(session)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Starting the screencast failed: {e}")
+    return StreamingResponse(preview.watch(fps, mjpeg=True), media_type="multipart/x-mixed-replace; boundary=frame",
+                             headers={"Cache-Control": "no-cache"})
+
+
+@app.websocket("/preview")
+async def preview_websocket(websocket: WebSocket, session_id: Optional[str] = None, fps: Optional[float] = None):
+    """
+    Streams the bot's live view as binary WebSocket messages, one JPEG per message
+    """
+    try:
+        session = get_session(session_id)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=str(e.detail))
+        return
+    await websocket.accept()
+    try:
+        preview = await start_preview(session)
+        async for frame in preview.watch(fps):
+            await websocket.send_bytes(frame)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"Error streaming preview for session {session.session_id}: {e}")
+        await websocket.close(code=1011)
+
+
+@app.get("/recording")
+async def recording_status():
+    return recorder.stats()
+
+
+@app.post("/recording/start")
+async def start_recording(audio_format: Optional[RecordingFormat] = Query(None, alias="format")):
+    """
+    Starts recording the meeting audio into rolling segments
+    """
+    if recorder.running:
+        raise HTTPException(status_code=409, detail="Recording is already running")
+    try:
+        recorder.start(audio_format)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Starting the recording failed: {e}")
+    await ws_broadcast("recording_started", {"directory": recorder.recording_dir, "format": recorder.audio_format.value})
+    return recorder.stats()
+
+
+@app.post("/recording/stop")
+async def stop_recording():
+    if not recorder.running:
+        raise HTTPException(status_code=409, detail="Recording is not running")
+    await asyncio.to_thread(recorder.stop)
+    await ws_broadcast("recording_stopped", {"directory": recorder.recording_dir, "segments": recorder.segments()})
+    return recorder.stats()
+
+
+@app.websocket("/recording/audio")
+async def recording_audio_websocket(websocket: WebSocket):
+    """
+    Streams the meeting audio of the running recording as binary messages of mono s16le PCM.
+    The first message is a JSON text message describing the format.
+    """
+    if not recorder.running:
+        await websocket.close(code=1008, reason="Recording is not running")
+        return
+    await websocket.accept()
+    chunks = recorder.subscribe()
+    try:
+        await websocket.send_json({"format": "s16le", "channels": 1, "sample_rate": recorder.sample_rate})
+        while (chunk := await chunks.get()) is not None:
+            await websocket.send_bytes(chunk)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"Error streaming recording audio: {e}")
+    finally:
+        recorder.unsubscribe(chunks)
+
+
+def start_player():
+    if player.running:
+        return
+    try:
+        player.start(handle_playback_event)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Starting the audio player failed: {e}")
+
+
+def playback_session(session_id: Optional[str], unmute: Optional[bool]) -> Optional[Session]:
+    """
+    Resolves the session a clip is played for. Unmuting requested explicitly needs one,
+    the configured default only applies when the session is unambiguous.
+    """
+    if session_id is not None or unmute:
+        return get_session(session_id)
+    if PLAYBACK_AUTO_UNMUTE and unmute is None and len(pool.sessions) == 1:
+        session = next(iter(pool.sessions.values()))
+        return session if session.driver else None
+    return None
+
+
+def unmute_for_playback(session: Session, playback: Playback):
+    """
+    Unmutes the session's microphone before a held clip starts, the clip is released once that finished.
+    The clip is cancelled when the unmute command is rejected.
+    """
+    try:
+        command, _ = submit_command(session, "unmute_for_playback", set_mute_state, False)
+    except HTTPException:
+        player.cancel(playback.playback_id)
+        raise
+
+    def unmuted(_):
+        if command.result:
+            playback_unmuted.add(session.session_id)
+        playback.ready.set()
+
+    command.future.add_done_callback(unmuted)
+
+
+async def handle_playback_event(event: str, playback: Playback):
+    """
+    Broadcasts playback start and completion, and mutes the microphone again after a session's last clip
+    """
+    await ws_broadcast(event, playback.to_dict(), playback.session_id)
+    session_id = playback.session_id
+    if event != "playback_finished" or session_id not in playback_unmuted or player.pending(session_id):
+        return
+    playback_unmuted.discard(session_id)
+    session = pool.get(session_id)
+    if session and session.driver:
+        try:
+            submit_command(session, "mute_after_playback", set_mute_state, True)
+        except HTTPException as e:
+            print(f"Error muting session {session_id} after playback: {e.detail}")
+
+
+@app.get("/playback")
+async def playback_status():
+    """
+    Returns the playback queue and the audio player's counters
+    """
+    return player.stats()
+
+
+@app.post("/playback")
+async def queue_playback(request: PlaybackRequest, session_id: Optional[str] = None):
+    """
+    Queues an audio file or URL (any format ffmpeg decodes, e.g. WAV or Opus) or text to speak
+    for the bot's microphone. Clips play in order; playback_started and playback_finished events report
+    their progress. With unmute, the microphone is unmuted for the clip and muted again afterwards.
+    """
+    if (request.source is None) == (request.text is None):
+        raise HTTPException(status_code=422, detail="Either source or text is required")
+    session = playback_session(session_id, request.unmute)
+    unmute = session is not None and (PLAYBACK_AUTO_UNMUTE if request.unmute is None else request.unmute)
+    start_player()
+    try:
+        if request.text is not None:
+            playback, position = player.speak(request.text, session.session_id if session else None, hold=unmute)
+        else:
+            playback, position = player.play(request.source, session.session_id if session else None, hold=unmute)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Queueing playback failed: {e}")
+    if unmute:
+        unmute_for_playback(session, playback)
+    return {"queue_position": position, **playback.to_dict()}
+
+
+@app.post("/playback/stop")
+async def stop_playback(playback_id: Optional[str] = None):
+    """
+    Cancels a queued or playing clip, or every clip without a playback_id
+    """
+    return {"cancelled": player.cancel(playback_id)}
+
+
+@app.websocket("/playback/stream")
+async def playback_stream_websocket(websocket: WebSocket, session_id: Optional[str] = None,
+                                    unmute: Optional[bool] = None):
+    """
+    Plays binary messages of mono s16le PCM at the player's sample rate into the bot's microphone.
+    The first message is a JSON text message with the expected format and the playback id.
+    The clip ends when the client sends the text message "end" or disconnects.
+    """
+    try:
+        session = playback_session(session_id, unmute)
+        unmute = session is not None and (PLAYBACK_AUTO_UNMUTE if unmute is None else unmute)
+        start_player()
+        playback, _ = player.stream(session.session_id if session else None, hold=unmute)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=str(e.detail))
+        return
+    except QueueFullError as e:
+        await websocket.close(code=1013, reason=str(e))
+        return
+    if unmute:
+        try:
+            unmute_for_playback(session, playback)
+        except HTTPException as e:
+            await websocket.close(code=1013, reason=str(e.detail))
+            return
+    await websocket.accept()
+    try:
+        await websocket.send_json({"format": "s16le", "channels": 1, "sample_rate": player.sample_rate,
+                                   "playback_id": playback.playback_id})
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect" or message.get("text") == "end":
+                break
+            if message.get("bytes") and not await asyncio.to_thread(playback.feed, message["bytes"]):
+                break
+    except Exception as e:
+        print(f"Error receiving playback audio: {e}")
+    finally:
+        await asyncio.to_thread(playback.feed, None)
+
+
+@app.get("/camera")
+async def camera_status():
+    """
+    Returns the virtual camera source, pump counters and the sink ffmpeg's fps and drop statistics
+    """
+    return camera.stats()
+
+
+@app.post("/camera/source")
+async def change_camera_source(request: CameraSourceRequest):
+    """
+    Switches what the virtual camera shows to a video file or URL, a still image or a test pattern ("pattern").
+    The new source is pre-buffered and swapped in without restarting the camera output.
+    """
+    try:
+        if camera.running:
+            await asyncio.to_thread(camera.switch, request.source, request.kind, request.cache)
+        else:
+            await asyncio.to_thread(camera.start, request.source, request.kind, request.cache)
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Switching the camera source failed: {e}")
+    await ws_broadcast("camera_source_changed", {"source": request.source})
+    return camera.stats()
+
+
+@app.post("/camera/stop")
+async def stop_camera():
+    await asyncio.to_thread(camera.stop)
+    return camera.stats()
 
 
 @app.websocket("/events")
-async def events_websocket(websocket: WebSocket):
+async def events_websocket(websocket: WebSocket, session_id: Optional[str] = None, since: Optional[int] = None,
+                           types: Optional[str] = None):
     """
     WebSocket endpoint for streaming events from the MeetBot server.
-    Clients can connect to this endpoint to receive real-time updates.
+    Clients can connect to this endpoint to receive real-time updates,
+    optionally restricted to a single session with the session_id query parameter
+    and to some event types with a comma separated types parameter.
+    Every event carries a seq number; reconnecting with since=<last seen seq> replays the missed events first.
     """
-    await manager.connect(websocket)
+    event_types = {event_type.strip() for event_type in types.split(",") if event_type.strip()} if types else None
+    subscriber = await manager.connect(websocket, session_id, since, event_types)
     try:
+        # Events are sent by the subscriber's own sender task, this only keeps the connection alive
         while True:
-            await asyncio.sleep(30)
-            await websocket.send_json({
-                "type": "heartbeat",
-                "timestamp": datetime.now().isoformat()
-            })
-    except WebSocketDisconnect:
+            try:
+                await asyncio.wait_for(subscriber.closed.wait(), timeout=30)
+                break
+            except asyncio.TimeoutError:
+                manager.send(subscriber, {
+                    "type": "heartbeat",
+                    "timestamp": datetime.now().isoformat()
+                })
+    finally:
         manager.disconnect(websocket)
 
 
+@app.get("/subscribers")
+async def subscriber_stats():
+    """
+    Returns event stream subscriber counts and per-subscriber queue statistics
+    """
+    return {**manager.stats(), "clients": [subscriber.stats() for subscriber in manager.subscribers.values()]}
+
+
 if __name__ == "__main__":
     try:
         uvicorn.run(
@@ -217,5 +973,4 @@ if __name__ == "__main__":
             reload=True,
         )
     finally:
-        if driver:
-            driver.quit()
+        pool.close_all()
@@ -0,0 +1,113 @@
+"""
+Measures event fan-out latency to WebSocket subscribers, with in-memory fake sockets.
+
+    python -m benchmarks.broadcast_fanout --subscribers 1000 --events 200 --slow 10
+
+Compares the per-subscriber queues of ConnectionManager with awaiting every send in turn,
+which is how broadcasting worked before. Slow subscribers take --slow-delay seconds per send.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from helpers.metrics import LatencyStats
+from services.events_svc import ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self, latency: LatencyStats, delay: float = 0):
+        self.latency = latency
+        self.delay = delay
+        self.received = 0
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        pass
+
+    async def send_text(self, text: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        message = json.loads(text)
+        if "sent_at" in message:
+            self.latency.observe(time.perf_counter() - message["sent_at"])
+            self.received += 1
+
+    async def send_json(self, message: dict):
+        await self.send_text(json.dumps(message))
+
+
+def report(name: str, fast: LatencyStats, slow: LatencyStats, broadcast: LatencyStats, elapsed: float):
+    print(f"{name}")
+    print(f"  total {elapsed:.3f}s, broadcast call p50 {broadcast.percentile(50) * 1000:.3f}ms "
+          f"p99 {broadcast.percentile(99) * 1000:.3f}ms")
+    for label, stats in (("fast subscribers", fast), ("slow subscribers", slow)):
+        if stats.count:
+            print(f"  {label}: {stats.count} deliveries, p50 {stats.percentile(50) * 1000:.3f}ms "
+                  f"p95 {stats.percentile(95) * 1000:.3f}ms p99 {stats.percentile(99) * 1000:.3f}ms")
+
+
+def make_sockets(args) -> tuple[list[FakeWebSocket], LatencyStats, LatencyStats]:
+    window = args.subscribers * args.events
+    fast, slow = LatencyStats(window), LatencyStats(window)
+    sockets = [FakeWebSocket(slow, args.slow_delay) if i < args.slow else FakeWebSocket(fast)
+               for i in range(args.subscribers)]
+    return sockets, fast, slow
+
+
+async def run_queued(args):
+    sockets, fast, slow = make_sockets(args)
+    broadcast = LatencyStats(args.events)
+    manager = ConnectionManager(max_queue=args.queue_size)
+    for websocket in sockets:
+        await manager.connect(websocket)
+    started = time.perf_counter()
+    for i in range(args.events):
+        call_started = time.perf_counter()
+        await manager.broadcast({"type": "benchmark", "seq": i, "sent_at": time.perf_counter()})
+        broadcast.observe(time.perf_counter() - call_started)
+        await asyncio.sleep(args.interval)
+    # Let the fast subscribers drain their queues
+    while any(s.received < args.events for s in sockets[args.slow:]):
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    report("per-subscriber queues", fast, slow, broadcast, elapsed)
+    print(f"  manager: {manager.stats()}")
+    for websocket in list(manager.subscribers):
+        manager.disconnect(websocket)
+
+
+async def run_sequential(args):
+    sockets, fast, slow = make_sockets(args)
+    broadcast = LatencyStats(args.events)
+    started = time.perf_counter()
+    for i in range(args.events):
+        call_started = time.perf_counter()
+        message = {"type": "benchmark", "seq": i, "sent_at": time.perf_counter()}
+        for websocket in sockets:
+            await websocket.send_json(message)
+        broadcast.observe(time.perf_counter() - call_started)
+        await asyncio.sleep(args.interval)
+    report("sequential send_json", fast, slow, broadcast, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--slow", type=int, default=10, help="Number of slow subscribers")
+    parser.add_argument("--slow-delay", type=float, default=0.05)
+    parser.add_argument("--interval", type=float, default=0.005, help="Seconds between events")
+    parser.add_argument("--queue-size", type=int, default=256)
+    parser.add_argument("--skip-sequential", action="store_true")
+    args = parser.parse_args()
+
+    asyncio.run(run_queued(args))
+    if not args.skip_sequential:
+        asyncio.run(run_sequential(args))
+
+
+if __name__ == "__main__":
+    main()
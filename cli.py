@@ -6,6 +6,7 @@ import websocket
 from enum import Enum
 from rich import print
 from typing import Optional
+from urllib.parse import urlencode
 
 
 class Layout(str, Enum):
@@ -14,11 +15,23 @@ class Layout(str, Enum):
     SPOTLIGHT = "spotlight"
     SIDEBAR = "sidebar"
 
+class TypingMode(str, Enum):
+    HUMANLIKE = "humanlike"
+    FAST = "fast"
+    INSTANT = "instant"
+
 API_BASE_URL = "http://localhost:8000"
 WS_URL = "ws://localhost:8000/events"
 
 app = typer.Typer(help="Meetbot CLI with WebSocket support.")
 
+SESSION_ID_HELP = "Session to address. Optional when only one session is active."
+
+
+def session_params(session_id: Optional[str]) -> Optional[dict]:
+    return {"session_id": session_id} if session_id else None
+
+
 @app.command()
 def join_meeting(
     meeting_url: str = typer.Argument(
@@ -38,31 +51,50 @@ def join_meeting(
     )
     if response.status_code == 200:
         print(f"[green]Meeting join operation initiated with bot {bot_name} at[/green] [blue]{meeting_url}[/blue]")
+        print(f"[green]Session id:[/green] [bold]{response.json()['session_id']}[/bold]")
     else:
         print(f"[bold red]Meeting join operation failed: {response.status_code}[/bold red]")
     
 @app.command()
-def leave_meeting():
+def sessions():
+    """List active meeting sessions."""
+    response = requests.get(f"{API_BASE_URL}/sessions")
+    if response.status_code == 200:
+        data = response.json()
+        print(f"[green]{len(data['sessions'])}/{data['max_sessions']} sessions active[/green]")
+        for session in data["sessions"]:
+            print(f"  [bold]{session['session_id']}[/bold] {session['state']} {session['bot_name']} [blue]{session['meeting_url']}[/blue]")
+    else:
+        print(f"[bold red]Listing sessions failed: {response.status_code}[/bold red]")
+
+@app.command()
+def leave_meeting(
+    session_id: Optional[str] = typer.Option(None, "--session-id", "-s", help=SESSION_ID_HELP)
+):
     """Leave the current meeting."""
-    response = requests.post(f"{API_BASE_URL}/leave_meeting")
+    response = requests.post(f"{API_BASE_URL}/leave_meeting", params=session_params(session_id))
     if response.status_code == 200:
         print("[green]Meeting leave operation initiated[/green]")
     else:
         print(f"[bold red]Meeting leave operation failed: {response.status_code}[/bold red]")
 
 @app.command()
-def toggle_mute():
+def toggle_mute(
+    session_id: Optional[str] = typer.Option(None, "--session-id", "-s", help=SESSION_ID_HELP)
+):
     """Toggle the mute state of the current meeting."""
-    response = requests.post(f"{API_BASE_URL}/toggle_mute")
+    response = requests.post(f"{API_BASE_URL}/toggle_mute", params=session_params(session_id))
     if response.status_code == 200:
         print("[green]Mute toggle operation initiated[/green]")
     else:
         print(f"[bold red]Mute toggle operation failed: {response.status_code}[/bold red]")
 
 @app.command()
-def toggle_video():
+def toggle_video(
+    session_id: Optional[str] = typer.Option(None, "--session-id", "-s", help=SESSION_ID_HELP)
+):
     """Toggle the video state of the current meeting."""
-    response = requests.post(f"{API_BASE_URL}/toggle_video")
+    response = requests.post(f"{API_BASE_URL}/toggle_video", params=session_params(session_id))
     if response.status_code == 200:
         print("[green]Video toggle operation initiated[/green]")
     else:
@@ -72,14 +104,22 @@ def toggle_video():
 def send_message(
     message: list[str] = typer.Argument(
         None, help="Chat message to send. Can include spaces."
-    )
+    ),
+    typing_mode: Optional[TypingMode] = typer.Option(
+        None, "--typing-mode", "-t", help="How to type the message. Server default when omitted."
+    ),
+    session_id: Optional[str] = typer.Option(None, "--session-id", "-s", help=SESSION_ID_HELP)
 ):
     """Send a message to the current meeting."""
     if not message:
         app(["send-message", "--help"], standalone_mode=False)
         return
     full_message = " ".join(message)
-    response = requests.post(f"{API_BASE_URL}/send_chat_message", json={"message": full_message})
+    payload = {"message": full_message}
+    if typing_mode:
+        payload["typing_mode"] = typing_mode.value
+    response = requests.post(f"{API_BASE_URL}/send_chat_message", json=payload,
+                             params=session_params(session_id))
     if response.status_code == 200:
         print("[green]Message sent successfully[/green]")
     else:
@@ -88,10 +128,12 @@ def send_message(
 @app.command()
 def change_layout(layout: Layout = typer.Argument(
         Layout.AUTO, help="Layout to change to."
-    )
+    ),
+    session_id: Optional[str] = typer.Option(None, "--session-id", "-s", help=SESSION_ID_HELP)
 ):
     """Change the layout of the current meeting."""
-    response = requests.post(f"{API_BASE_URL}/change_layout", json={"layout": layout})
+    response = requests.post(f"{API_BASE_URL}/change_layout", json={"layout": layout},
+                             params=session_params(session_id))
     if response.status_code == 200:
         print("[green]Layout changed successfully[/green]")
     else:
@@ -99,9 +141,79 @@ def change_layout(layout: Layout = typer.Argument(
 
 
 @app.command()
-def create_screenshot():
+def operation(
+    request_id: str = typer.Argument(..., help="Request id returned by a command."),
+    wait: bool = typer.Option(False, "--wait", help="Wait for the operation to finish."),
+    timeout: float = typer.Option(30, "--timeout", help="Seconds to wait at most.")
+):
+    """Show the status and result of a command by its request id."""
+    response = requests.get(f"{API_BASE_URL}/operations/{request_id}", params={"wait": wait, "timeout": timeout})
+    if response.status_code == 200:
+        data = response.json()
+        print(f"[green]{data['command']}[/green] status={data['status']} result={data['result']} "
+              f"error={data['error']} duration_ms={data['duration_ms']}")
+    else:
+        print(f"[bold red]Operation lookup failed: {response.status_code}[/bold red]")
+
+
+@app.command()
+def participants(
+    session_id: Optional[str] = typer.Option(None, "--session-id", "-s", help=SESSION_ID_HELP),
+    all_participants: bool = typer.Option(False, "--all", help="Include participants who already left.")
+):
+    """List the participants of the current meeting."""
+    params = {"present_only": not all_participants, **(session_params(session_id) or {})}
+    response = requests.get(f"{API_BASE_URL}/participants", params=params)
+    if response.status_code == 200:
+        data = response.json()
+        print(f"[green]{data['present_count']} participants present[/green]")
+        for participant in data["participants"]:
+            status = "[green]present[/green]" if participant["present"] else f"[yellow]left {participant['left_at']}[/yellow]"
+            print(f"  [bold]{participant['name']}[/bold] joined {participant['joined_at']} {status}")
+    else:
+        print(f"[bold red]Listing participants failed: {response.status_code}[/bold red]")
+
+
+@app.command()
+def state(
+    session_id: Optional[str] = typer.Option(None, "--session-id", "-s", help=SESSION_ID_HELP)
+):
+    """Show mic, camera, chat panel and layout state of the current meeting."""
+    response = requests.get(f"{API_BASE_URL}/state", params=session_params(session_id))
+    if response.status_code == 200:
+        data = response.json()
+        print(f"[green]In call:[/green] {data['in_call']}  [green]Mic:[/green] {data['mic']}  "
+              f"[green]Camera:[/green] {data['camera']}  [green]Chat open:[/green] {data['chat_open']}  "
+              f"[green]Layout:[/green] {data['layout'] or 'unknown'}")
+    else:
+        print(f"[bold red]Reading meeting state failed: {response.status_code}[/bold red]")
+
+
+@app.command()
+def chat(
+    sender: Optional[str] = typer.Option(None, "--sender", help="Only messages from this participant."),
+    q: Optional[str] = typer.Option(None, "--search", "-q", help="Only messages containing all these words."),
+    since: Optional[int] = typer.Option(None, "--since", help="Only messages after this chat seq."),
+    session_id: Optional[str] = typer.Option(None, "--session-id", "-s", help=SESSION_ID_HELP)
+):
+    """Show the captured chat of the current meeting."""
+    params = {"session_id": session_id, "sender": sender, "q": q, "since": since}
+    response = requests.get(f"{API_BASE_URL}/chat", params={k: v for k, v in params.items() if v is not None})
+    if response.status_code == 200:
+        data = response.json()
+        for message in data["results"]:
+            print(f"[dim]{message['seq']}[/dim] [bold]{message['sender'] or '?'}[/bold]: {message['text']}")
+        print(f"[green]{len(data['results'])} of {data['messages']} messages[/green]")
+    else:
+        print(f"[bold red]Reading chat failed: {response.status_code}[/bold red]")
+
+
+@app.command()
+def create_screenshot(
+    session_id: Optional[str] = typer.Option(None, "--session-id", "-s", help=SESSION_ID_HELP)
+):
     """Create a screenshot of the current window."""
-    response = requests.post(f"{API_BASE_URL}/create_screenshot")
+    response = requests.post(f"{API_BASE_URL}/create_screenshot", params=session_params(session_id))
     if response.status_code == 200:
         print("[green]Screenshot created successfully[/green]")
     else:
@@ -109,6 +221,92 @@ def create_screenshot():
         print(f"[bold red]Screenshot creation failed: {response.status_code}[/bold red]")
 
 
+@app.command()
+def screenshot(
+    output: str = typer.Argument("screenshot.jpeg", help="File to write the image to."),
+    image_format: str = typer.Option("jpeg", "--format", "-f", help="Image format: png, jpeg or webp."),
+    scale: float = typer.Option(1.0, "--scale", help="Downscale factor between 0 and 1."),
+    session_id: Optional[str] = typer.Option(None, "--session-id", "-s", help=SESSION_ID_HELP)
+):
+    """Download what the bot currently sees."""
+    params = {"format": image_format, "scale": scale, **(session_params(session_id) or {})}
+    response = requests.get(f"{API_BASE_URL}/screenshot", params=params)
+    if response.status_code == 200:
+        with open(output, "wb") as f:
+            f.write(response.content)
+        print(f"[green]Screenshot saved to[/green] [blue]{output}[/blue]")
+    else:
+        print(f"[bold red]Screenshot download failed: {response.status_code}[/bold red]")
+
+
+@app.command()
+def recording(
+    action: str = typer.Argument("status", help="start, stop or status."),
+    audio_format: Optional[str] = typer.Option(None, "--format", "-f", help="Segment format: opus or wav.")
+):
+    """Start or stop recording the meeting audio, or show the recording status."""
+    if action == "status":
+        response = requests.get(f"{API_BASE_URL}/recording")
+    elif action in ("start", "stop"):
+        params = {"format": audio_format} if audio_format and action == "start" else None
+        response = requests.post(f"{API_BASE_URL}/recording/{action}", params=params)
+    else:
+        app(["recording", "--help"], standalone_mode=False)
+        return
+    if response.status_code == 200:
+        data = response.json()
+        state = "[green]recording[/green]" if data["running"] else "[yellow]stopped[/yellow]"
+        print(f"{state} {data['seconds_captured']}s captured to [blue]{data['directory']}[/blue]")
+        for segment in data["segments"]:
+            print(f"  {segment}")
+    else:
+        print(f"[bold red]Recording {action} failed: {response.status_code}[/bold red]")
+
+
+@app.command()
+def camera(
+    source: Optional[str] = typer.Argument(None, help="Video file or URL, image, or 'pattern'. Shows the status when omitted.")
+):
+    """Switch what the bot's camera shows."""
+    if source:
+        response = requests.post(f"{API_BASE_URL}/camera/source", json={"source": source})
+    else:
+        response = requests.get(f"{API_BASE_URL}/camera")
+    if response.status_code == 200:
+        data = response.json()
+        current = data["source"]["spec"] if data["source"] else None
+        print(f"[green]Camera[/green] {'running' if data['running'] else 'stopped'}, source [blue]{current}[/blue], "
+              f"sink fps {data['sink']['fps']}, dropped {data['sink']['drop_frames']}")
+    else:
+        print(f"[bold red]Camera operation failed: {response.status_code} {response.json().get('detail')}[/bold red]")
+
+
+@app.command()
+def play(
+    source: Optional[str] = typer.Argument(None, help="Audio file or URL to play. Shows the queue when omitted."),
+    text: Optional[str] = typer.Option(None, "--say", help="Text to speak instead of a file."),
+    unmute: Optional[bool] = typer.Option(None, "--unmute/--no-unmute", help="Unmute the microphone while playing."),
+    session_id: Optional[str] = typer.Option(None, "--session-id", "-s", help=SESSION_ID_HELP)
+):
+    """Play audio or speak text through the bot's microphone."""
+    if source or text:
+        response = requests.post(f"{API_BASE_URL}/playback", params=session_params(session_id),
+                                 json={"source": source, "text": text, "unmute": unmute})
+    else:
+        response = requests.get(f"{API_BASE_URL}/playback")
+    if response.status_code != 200:
+        print(f"[bold red]Playback failed: {response.status_code} {response.json().get('detail')}[/bold red]")
+        return
+    data = response.json()
+    if "playback_id" in data:
+        print(f"[green]Queued[/green] [bold]{data['playback_id']}[/bold] at position {data['queue_position']}")
+        return
+    print(f"[green]Audio player[/green] {'running' if data['running'] else 'stopped'}, "
+          f"played {data['played']}, failed {data['failed']}")
+    for playback in data["queue"]:
+        print(f"  [bold]{playback['playback_id']}[/bold] {playback['status']} {playback['kind']} [blue]{playback['source']}[/blue]")
+
+
 @app.command()
 def console(
     api_url: str = typer.Option(
@@ -116,15 +314,41 @@ def console(
     ),
     ws_url: str = typer.Option(
         WS_URL, "--ws-url", help="WebSocket server URL to connect to."
+    ),
+    session_id: Optional[str] = typer.Option(
+        None, "--session-id", "-s", help="Only stream events of this session."
+    ),
+    types: Optional[str] = typer.Option(
+        None, "--types", help="Only stream these comma separated event types."
+    ),
+    since: Optional[int] = typer.Option(
+        None, "--since", help="Replay the events after this sequence number first."
     )
 ):
     """Launch Meetbot CLI session with WebSocket logging."""
+    params = {"session_id": session_id, "types": types}
+    last_seq = since
+
+    def events_url(seq: Optional[int]) -> str:
+        query = {key: value for key, value in {**params, "since": seq}.items() if value is not None}
+        return f"{ws_url}?{urlencode(query)}" if query else ws_url
+
     # WebSocket event handlers
     def on_message(ws, message):
+        nonlocal last_seq
         parsed_message = json.loads(message)
+        if "seq" in parsed_message:
+            # Reconnects resume after the last event seen, or from where the first connection started
+            if parsed_message.get("type") != "connection_established" or last_seq is None:
+                last_seq = parsed_message["seq"]
+                ws.url = events_url(last_seq)
+        elif parsed_message.get("type") == "replay_truncated" and parsed_message["data"].get("reset"):
+            # The server numbers events from scratch again, resume from its current seq
+            last_seq = parsed_message["data"]["seq"]
+            ws.url = events_url(last_seq)
         if parsed_message.get("type") == "heartbeat":
             return
-        print(f'[WS] [{parsed_message.get("timestamp")}] event={parsed_message.get("type")} data={parsed_message.get("data")}')
+        print(f'[WS] [{parsed_message.get("timestamp")}] seq={parsed_message.get("seq")} session={parsed_message.get("session_id")} event={parsed_message.get("type")} data={parsed_message.get("data")}')
 
     def on_error(ws, error):
         print(f"[red]WS error: {error}[/red]")
@@ -141,7 +365,7 @@ def console(
 
     # Start WebSocket in background thread
     ws_app = websocket.WebSocketApp(
-        ws_url,
+        events_url(since),
         on_open=on_open,
         on_message=on_message,
         on_error=on_error,
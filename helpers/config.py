@@ -0,0 +1,106 @@
+import os
+import tempfile
+
+
+# Session pool
+MAX_SESSIONS = int(os.getenv("MEETBOT_MAX_SESSIONS", "4"))
+PROFILE_ROOT = os.getenv("MEETBOT_PROFILE_ROOT", os.path.join(tempfile.gettempdir(), "meetbot-profiles"))
+HEADLESS = os.getenv("MEETBOT_HEADLESS", "false").lower() in ("1", "true", "yes")
+
+# Warm driver pool
+WARM_POOL_SIZE = int(os.getenv("MEETBOT_WARM_POOL_SIZE", "1"))
+DRIVER_MAX_SESSIONS = int(os.getenv("MEETBOT_DRIVER_MAX_SESSIONS", "5"))
+DRIVER_MAX_PSS_MB = int(os.getenv("MEETBOT_DRIVER_MAX_PSS_MB", "1500"))
+
+# In-page observer event queue
+EVENT_BUFFER_SIZE = int(os.getenv("MEETBOT_EVENT_BUFFER_SIZE", "500"))
+
+# Per-driver command queue
+COMMAND_QUEUE_DEPTH = int(os.getenv("MEETBOT_COMMAND_QUEUE_DEPTH", "16"))
+OPERATION_HISTORY_SIZE = int(os.getenv("MEETBOT_OPERATION_HISTORY_SIZE", "1000"))
+
+# Cached meeting state probe, seconds
+STATE_CACHE_TTL = float(os.getenv("MEETBOT_STATE_CACHE_TTL", "2.0"))
+
+# Chat
+CHAT_TYPING_MODE = os.getenv("MEETBOT_CHAT_TYPING_MODE", "humanlike")
+
+# Humanlike jitter between UI steps, 0 disables it
+JITTER_SCALE = float(os.getenv("MEETBOT_JITTER_SCALE", "1.0"))
+
+# Step screenshots
+SCREENSHOT_POLICY = os.getenv("MEETBOT_SCREENSHOT_POLICY", "on_error")
+SCREENSHOT_FORMAT = os.getenv("MEETBOT_SCREENSHOT_FORMAT", "jpeg")
+SCREENSHOT_QUALITY = int(os.getenv("MEETBOT_SCREENSHOT_QUALITY", "70"))
+SCREENSHOT_SCALE = float(os.getenv("MEETBOT_SCREENSHOT_SCALE", "1.0"))
+SCREENSHOT_STORE = os.getenv("MEETBOT_SCREENSHOT_STORE", "disk")
+SCREENSHOT_DIR = os.getenv("MEETBOT_SCREENSHOT_DIR", "screenshots")
+SCREENSHOT_MAX_MB = int(os.getenv("MEETBOT_SCREENSHOT_MAX_MB", "50"))
+SCREENSHOT_MEMORY_FRAMES = int(os.getenv("MEETBOT_SCREENSHOT_MEMORY_FRAMES", "32"))
+
+# Live preview screencast
+PREVIEW_FPS = float(os.getenv("MEETBOT_PREVIEW_FPS", "10"))
+PREVIEW_QUALITY = int(os.getenv("MEETBOT_PREVIEW_QUALITY", "60"))
+PREVIEW_MAX_WIDTH = int(os.getenv("MEETBOT_PREVIEW_MAX_WIDTH", "1280"))
+PREVIEW_MAX_HEIGHT = int(os.getenv("MEETBOT_PREVIEW_MAX_HEIGHT", "720"))
+
+# WebSocket event subscribers
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("MEETBOT_SUBSCRIBER_QUEUE_SIZE", "256"))
+SLOW_SUBSCRIBER_POLICY = os.getenv("MEETBOT_SLOW_SUBSCRIBER_POLICY", "drop_oldest")
+
+# Chat transcripts, one JSON lines file per meeting
+CHAT_DIR = os.getenv("MEETBOT_CHAT_DIR", "chat")
+
+# Tracing. Completed traces are kept in memory and optionally exported as OTLP JSON
+# to a file (one request per line) and/or an OTLP/HTTP collector, e.g. http://localhost:4318/v1/traces
+TRACE_BUFFER_SIZE = int(os.getenv("MEETBOT_TRACE_BUFFER_SIZE", "200"))
+TRACE_FILE = os.getenv("MEETBOT_TRACE_FILE", "")
+TRACE_OTLP_ENDPOINT = os.getenv("MEETBOT_TRACE_OTLP_ENDPOINT", "")
+TRACE_SERVICE_NAME = os.getenv("MEETBOT_TRACE_SERVICE_NAME", "meetbot")
+
+# Event replay log, kept in memory and optionally appended to a file
+EVENT_LOG_SIZE = int(os.getenv("MEETBOT_EVENT_LOG_SIZE", "10000"))
+EVENT_LOG_FILE = os.getenv("MEETBOT_EVENT_LOG_FILE", "")
+
+# Meeting audio recording. The source is a PulseAudio source name, "file:<path>" or "tone" for testing.
+AUDIO_SOURCE = os.getenv("MEETBOT_AUDIO_SOURCE", "virtual_sink.monitor")
+AUDIO_SAMPLE_RATE = int(os.getenv("MEETBOT_AUDIO_SAMPLE_RATE", "16000"))
+AUDIO_CHUNK_MS = int(os.getenv("MEETBOT_AUDIO_CHUNK_MS", "100"))
+RECORDING_DIR = os.getenv("MEETBOT_RECORDING_DIR", "recordings")
+RECORDING_FORMAT = os.getenv("MEETBOT_RECORDING_FORMAT", "opus")
+RECORDING_SEGMENT_SECONDS = int(os.getenv("MEETBOT_RECORDING_SEGMENT_SECONDS", "60"))
+RECORDING_MAX_SEGMENTS = int(os.getenv("MEETBOT_RECORDING_MAX_SEGMENTS", "60"))
+
+# Audio playback into the bot's microphone through the virtual sink. "null" or "file:<path>" for testing.
+PLAYBACK_SINK = os.getenv("MEETBOT_PLAYBACK_SINK", "virtual_sink")
+PLAYBACK_SAMPLE_RATE = int(os.getenv("MEETBOT_PLAYBACK_SAMPLE_RATE", "48000"))
+PLAYBACK_FRAME_MS = int(os.getenv("MEETBOT_PLAYBACK_FRAME_MS", "20"))
+PLAYBACK_BUFFER_MS = int(os.getenv("MEETBOT_PLAYBACK_BUFFER_MS", "60"))
+PLAYBACK_QUEUE_SIZE = int(os.getenv("MEETBOT_PLAYBACK_QUEUE_SIZE", "16"))
+PLAYBACK_AUTO_UNMUTE = os.getenv("MEETBOT_PLAYBACK_AUTO_UNMUTE", "false").lower() in ("1", "true", "yes")
+# Text to speech command, gets the text as last argument and writes a WAV file to stdout
+TTS_COMMAND = os.getenv("MEETBOT_TTS_COMMAND", "espeak --stdout")
+
+# Virtual camera streamer. The output is a v4l2 device, "null" or "file:<path>" for testing.
+CAMERA_ENABLED = os.getenv("MEETBOT_CAMERA_ENABLED", "false").lower() in ("1", "true", "yes")
+CAMERA_OUTPUT = os.getenv("MEETBOT_CAMERA_OUTPUT", "/dev/video0")
+CAMERA_SOURCE = os.getenv("MEETBOT_CAMERA_SOURCE", "https://r2.snehangshu.dev/bot_say_hello.mp4")
+CAMERA_WIDTH = int(os.getenv("MEETBOT_CAMERA_WIDTH", "1280"))
+CAMERA_HEIGHT = int(os.getenv("MEETBOT_CAMERA_HEIGHT", "720"))
+CAMERA_FPS = int(os.getenv("MEETBOT_CAMERA_FPS", "30"))
+
+# Pre-transcoded raw camera sources, evicted least recently used first above the size limit
+CAMERA_CACHE_ENABLED = os.getenv("MEETBOT_CAMERA_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CAMERA_CACHE_DIR = os.getenv("MEETBOT_CAMERA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "meetbot-camera-cache"))
+CAMERA_CACHE_MAX_MB = int(os.getenv("MEETBOT_CAMERA_CACHE_MAX_MB", "4096"))
+# 720p yuv420p at 30 fps is about 41.5 MB per second, a 60s clip takes about 2.5 GB
+CAMERA_CACHE_MAX_SECONDS = int(os.getenv("MEETBOT_CAMERA_CACHE_MAX_SECONDS", "60"))
+
+# Browser memory governor. Thresholds of the staged mitigations (lighter layout, incoming video off,
+# scoped observer, rejoin), one per stage, on the Chrome process tree PSS or the page's JS heap
+GOVERNOR_ENABLED = os.getenv("MEETBOT_GOVERNOR_ENABLED", "false").lower() in ("1", "true", "yes")
+GOVERNOR_INTERVAL = int(os.getenv("MEETBOT_GOVERNOR_INTERVAL", "30"))
+GOVERNOR_PSS_MB = [int(mb) for mb in os.getenv("MEETBOT_GOVERNOR_PSS_MB", "1000,1200,1400,1700").split(",")]
+GOVERNOR_HEAP_MB = [int(mb) for mb in os.getenv("MEETBOT_GOVERNOR_HEAP_MB", "300,400,500,700").split(",")]
+GOVERNOR_COOLDOWN = float(os.getenv("MEETBOT_GOVERNOR_COOLDOWN", "120"))
+GOVERNOR_LAYOUT = os.getenv("MEETBOT_GOVERNOR_LAYOUT", "spotlight")
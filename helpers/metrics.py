@@ -0,0 +1,158 @@
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+
+class LatencyStats:
+    """
+    Rolling window of duration samples, summarized as count, sum and percentiles
+    """
+
+    def __init__(self, window: int = 1024):
+        self.samples: deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.samples.append(seconds)
+            self.count += 1
+            self.total += seconds
+
+    def percentile(self, q: float) -> float:
+        """
+        Nearest-rank percentile over the current window, q in [0, 100]
+        """
+        with self._lock:
+            ordered = sorted(self.samples)
+        if not ordered:
+            return 0.0
+        rank = max(1, math.ceil(q / 100 * len(ordered)))
+        return ordered[rank - 1]
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            ordered = sorted(self.samples)
+            count, total = self.count, self.total
+
+        def rank(q: float) -> float:
+            return ordered[max(1, math.ceil(q / 100 * len(ordered))) - 1] if ordered else 0.0
+
+        return {
+            "count": count,
+            "sum": round(total, 6),
+            "avg": round(total / count, 6) if count else 0.0,
+            "p50": round(rank(50), 6),
+            "p95": round(rank(95), 6),
+            "p99": round(rank(99), 6),
+            "max": round(ordered[-1], 6) if ordered else 0.0,
+        }
+
+
+class Histogram:
+    """
+    Cumulative bucket counts of durations since startup, for Prometheus histograms
+    """
+
+    # Seconds, from a fast in-page script to a full join
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    self.counts[i] += 1
+
+    def snapshot(self) -> tuple[list[tuple[float, int]], int, float]:
+        with self._lock:
+            return list(zip(self.buckets, self.counts)), self.count, self.total
+
+
+class EventLoopLag:
+    """
+    Measures how late the event loop wakes up a sleeping task. Blocking calls on the loop show up as lag.
+    """
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.lag = LatencyStats()
+        self.histogram = Histogram()
+        self.last = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.last = max(0.0, time.perf_counter() - started - self.interval)
+            self.lag.observe(self.last)
+            self.histogram.observe(self.last)
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+def prometheus_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+
+    def escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def prometheus_summary(name: str, help_text: str, series: list[tuple[dict, LatencyStats]]) -> list[str]:
+    """
+    Prometheus text format lines of a summary with p50/p95/p99 quantiles over the rolling window, one series per label set
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} summary"]
+    for labels, stats in series:
+        summary = stats.to_dict()
+        for quantile, key in (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99")):
+            lines.append(f"{name}{prometheus_labels({**labels, 'quantile': quantile})} {summary[key]}")
+        lines.append(f"{name}_sum{prometheus_labels(labels)} {summary['sum']}")
+        lines.append(f"{name}_count{prometheus_labels(labels)} {summary['count']}")
+    return lines
+
+
+def prometheus_metric(name: str, metric_type: str, help_text: str, series: list[tuple[dict, float]]) -> list[str]:
+    """
+    Prometheus text format lines of a counter or gauge, one series per label set
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    lines.extend(f"{name}{prometheus_labels(labels)} {value}" for labels, value in series)
+    return lines
+
+
+def prometheus_histogram(name: str, help_text: str, series: list[tuple[dict, Histogram]]) -> list[str]:
+    """
+    Prometheus text format lines of a histogram, one series per label set
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, histogram in series:
+        buckets, count, total = histogram.snapshot()
+        for bound, bucket_count in buckets:
+            lines.append(f"{name}_bucket{prometheus_labels({**labels, 'le': bound})} {bucket_count}")
+        lines.append(f"{name}_bucket{prometheus_labels({**labels, 'le': '+Inf'})} {count}")
+        lines.append(f"{name}_sum{prometheus_labels(labels)} {round(total, 6)}")
+        lines.append(f"{name}_count{prometheus_labels(labels)} {count}")
+    return lines
@@ -0,0 +1,84 @@
+import os
+
+
+def child_pids(pid: int) -> list[int]:
+    """
+    Returns the pids of all descendants of a process, read from /proc
+    """
+    parents: dict[int, list[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces, fields after it are fixed
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        parents.setdefault(ppid, []).append(int(entry))
+
+    descendants, stack = [], [pid]
+    while stack:
+        for child in parents.get(stack.pop(), []):
+            descendants.append(child)
+            stack.append(child)
+    return descendants
+
+
+def process_rss_bytes(pid: int) -> int:
+    """
+    Resident set size of a single process in bytes, 0 if the process is gone
+    """
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def process_pss_bytes(pid: int) -> int:
+    """
+    Proportional set size of a single process in bytes, its private memory plus its share of pages mapped
+    by several processes, so summing it over Chrome's processes counts shared memory once. 0 if the process is gone.
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, IndexError, ValueError):
+        pass
+    return 0
+
+
+def process_tree_pss_bytes(pid: int) -> int:
+    """
+    Proportional set size of a process and all its descendants (e.g. Chrome and its renderers)
+    """
+    return sum(process_pss_bytes(p) for p in [pid, *child_pids(pid)])
+
+
+def process_cpu_seconds(pid: int) -> float:
+    """
+    User plus system CPU time a single process used so far, 0 if the process is gone
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # utime and stime are fields 14 and 15, the 12th and 13th after the command name
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return 0.0
+
+
+def process_tree_stats(pid: int) -> dict:
+    """
+    Resident and proportional set size and CPU time of a process and all its descendants, read with a single /proc scan
+    """
+    pids = [pid, *child_pids(pid)]
+    return {
+        "processes": len(pids),
+        "rss_bytes": sum(process_rss_bytes(p) for p in pids),
+        "pss_bytes": sum(process_pss_bytes(p) for p in pids),
+        "cpu_seconds": round(sum(process_cpu_seconds(p) for p in pids), 3),
+    }
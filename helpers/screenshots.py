@@ -0,0 +1,186 @@
+import base64
+import functools
+import os
+import queue
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Callable, Optional
+import undetected_chromedriver as uc
+
+from helpers.config import SCREENSHOT_POLICY, SCREENSHOT_FORMAT, SCREENSHOT_QUALITY, SCREENSHOT_SCALE, \
+    SCREENSHOT_STORE, SCREENSHOT_DIR, SCREENSHOT_MAX_MB, SCREENSHOT_MEMORY_FRAMES
+from models.models import ScreenshotPolicy
+
+policy = ScreenshotPolicy(SCREENSHOT_POLICY)
+
+
+class ScreenshotStore:
+    """
+    Screenshots of one session, either as timestamped files in a per-session directory
+    capped at a total size, or only in a bounded in-memory ring
+    """
+
+    def __init__(self, name: str, in_memory: bool = SCREENSHOT_STORE == "memory",
+                 max_bytes: int = SCREENSHOT_MAX_MB * 1024 * 1024, memory_frames: int = SCREENSHOT_MEMORY_FRAMES):
+        self.name = name
+        self.directory = os.path.join(SCREENSHOT_DIR, name)
+        self.in_memory = in_memory
+        self.max_bytes = max_bytes
+        self.frames: deque[tuple[str, bytes]] = deque(maxlen=memory_frames)
+        self.files: deque[tuple[str, int]] = deque()
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+
+    def key_for(self, step: str, extension: str) -> str:
+        """
+        Timestamped name of a screenshot, the file path when stored on disk
+        """
+        key = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{step.replace('/', '_')}.{extension}"
+        return key if self.in_memory else os.path.join(self.directory, key)
+
+    def save(self, key: str, data: bytes) -> None:
+        """
+        Stores a screenshot, dropping the oldest ones beyond the ring size or the size cap. Runs on the writer thread.
+        """
+        with self._lock:
+            if self.in_memory:
+                self.frames.append((key, data))
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            with open(key, "wb") as f:
+                f.write(data)
+            self.files.append((key, len(data)))
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes and len(self.files) > 1:
+                path, size = self.files.popleft()
+                self.total_bytes -= size
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    print(f"Error removing screenshot {path}: {e}")
+
+    def latest(self) -> Optional[tuple[str, bytes]]:
+        with self._lock:
+            if self.in_memory:
+                return self.frames[-1] if self.frames else None
+            if not self.files:
+                return None
+            path = self.files[-1][0]
+        with open(path, "rb") as f:
+            return path, f.read()
+
+
+class ScreenshotWriter:
+    """
+    Decodes and stores captured screenshots on a background thread, so the driver thread only pays for the capture.
+    Captures are dropped when the writer falls behind.
+    """
+
+    def __init__(self, max_pending: int = 64):
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, store: ScreenshotStore, key: str, data: str) -> bool:
+        """
+        Queues a capture for writing, returns False when it was dropped because the writer fell behind
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="screenshot-writer", daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait((store, key, data))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def _run(self) -> None:
+        while True:
+            store, key, data = self._queue.get()
+            try:
+                store.save(key, base64.b64decode(data))
+            except Exception as e:
+                print(f"Error writing screenshot {key}: {e}")
+
+
+writer = ScreenshotWriter()
+_default_store = ScreenshotStore("default")
+_stores: dict[uc.Chrome, ScreenshotStore] = {}
+
+
+def attach_store(driver: uc.Chrome, store: ScreenshotStore) -> None:
+    """
+    Routes the screenshots taken with a driver to a session's store
+    """
+    _stores[driver] = store
+
+
+def detach_store(driver: uc.Chrome) -> None:
+    _stores.pop(driver, None)
+
+
+def capture_screenshot(driver: uc.Chrome, image_format: str = SCREENSHOT_FORMAT, quality: int = SCREENSHOT_QUALITY,
+                       scale: float = SCREENSHOT_SCALE, clip: Optional[dict] = None) -> str:
+    """
+    Captures the viewport through CDP Page.captureScreenshot and returns it base64 encoded.
+    A scale below 1 downsizes the viewport, clip selects a region ({x, y, width, height}) instead.
+    """
+    params = {"format": image_format, "optimizeForSpeed": True}
+    if image_format != "png":
+        params["quality"] = quality
+    if clip is None and scale != 1:
+        viewport = driver.execute_cdp_cmd("Page.getLayoutMetrics", {})["cssVisualViewport"]
+        clip = {"x": viewport["pageX"], "y": viewport["pageY"],
+                "width": viewport["clientWidth"], "height": viewport["clientHeight"]}
+    if clip is not None:
+        params["clip"] = {**clip, "scale": scale}
+    return driver.execute_cdp_cmd("Page.captureScreenshot", params)["data"]
+
+
+def screenshot_bytes(driver: uc.Chrome, image_format: str = SCREENSHOT_FORMAT, quality: int = SCREENSHOT_QUALITY,
+                     scale: float = 1.0, clip: Optional[dict] = None) -> bytes:
+    """
+    Captures the viewport like capture_screenshot and returns the decoded image
+    """
+    return base64.b64decode(capture_screenshot(driver, image_format, quality, scale, clip))
+
+
+def take_screenshot(driver: uc.Chrome, step: str, error: bool = False, force: bool = False) -> Optional[str]:
+    """
+    Takes a step screenshot according to the screenshot policy and hands it to the writer thread.
+    Returns its file path (or in-memory key), None when the policy skipped it, the capture failed
+    or the writer was too far behind to take it.
+    """
+    if not force and (policy == ScreenshotPolicy.OFF or (policy == ScreenshotPolicy.ON_ERROR and not error)):
+        return None
+    store = _stores.get(driver, _default_store)
+    try:
+        data = capture_screenshot(driver)
+    except Exception as e:
+        print(f"Error capturing screenshot {step}: {e}")
+        return None
+    key = store.key_for(step, "jpg" if SCREENSHOT_FORMAT == "jpeg" else SCREENSHOT_FORMAT)
+    if not writer.submit(store, key, data):
+        print(f"Screenshot writer is behind, dropped screenshot {step}")
+        return None
+    return key
+
+
+def screenshot_on_error(step: str) -> Callable:
+    """
+    Decorates a driver operation to take a screenshot when it raises, before the error propagates
+    """
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(driver: uc.Chrome, *args, **kwargs):
+            try:
+                return fn(driver, *args, **kwargs)
+            except Exception:
+                take_screenshot(driver, f"{step}/error", error=True)
+                raise
+        return wrapper
+    return decorator
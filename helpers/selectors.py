@@ -0,0 +1,352 @@
+import threading
+import time
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.action_chains import ActionChains
+from selenium.webdriver.remote.webelement import WebElement
+from typing import Optional
+import undetected_chromedriver as uc
+
+from helpers.waits import wait_for_js
+
+# Nodes of the page selected by one strategy: "css" and "xpath" match value, "text" matches the elements
+# selected by the CSS value whose trimmed text matches the case insensitive regex pattern.
+_STRATEGY_NODES = """(kind, value, pattern) => {
+    if (kind === 'css')
+        return Array.from(document.querySelectorAll(value));
+    if (kind === 'xpath') {
+        const nodes = [];
+        const result = document.evaluate(value, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        for (let i = 0; i < result.snapshotLength; i++) nodes.push(result.snapshotItem(i));
+        return nodes;
+    }
+    if (kind === 'text') {
+        const re = new RegExp(pattern, 'i');
+        return Array.from(document.querySelectorAll(value)).filter(node => re.test((node.textContent || '').trim()));
+    }
+    return [];
+}"""
+
+# Tries every strategy in the given order and returns the first (visible) match with its strategy index.
+# Strategies are [index, kind, value, pattern], see Target.ordered.
+_RESOLVE_CONDITION = """(strategies, visible) => {
+    const nodesOf = __NODES__;
+    const shown = (node) => !visible
+        || (node.offsetParent !== null && node.getClientRects().length > 0 && !node.disabled);
+    for (const [index, kind, value, pattern] of strategies) {
+        for (const node of nodesOf(kind, value, pattern)) {
+            if (shown(node)) return [node, index];
+        }
+    }
+    return null;
+}""".replace("__NODES__", _STRATEGY_NODES)
+
+# Returns every node selected by the first strategy that selects any, e.g. all items of a list
+_RESOLVE_ALL = """(strategies) => {
+    const nodesOf = __NODES__;
+    for (const [index, kind, value, pattern] of strategies) {
+        const nodes = nodesOf(kind, value, pattern);
+        if (nodes.length) return nodes;
+    }
+    return [];
+}""".replace("__NODES__", _STRATEGY_NODES)
+
+
+class Target:
+    """
+    A UI element of the Meet page with ordered strategies to find it, e.g. ("css", "button[aria-label='People']")
+    or ("text", "li[role='menuitem']", "change layout"). Values may contain str.format placeholders.
+    The strategy that matched last is tried first next time. Targets are shared by every session's
+    command thread, their stats are guarded by a lock.
+    """
+
+    def __init__(self, name: str, *strategies: tuple):
+        self.name = name
+        self.strategies = strategies
+        self.preferred = 0
+        self.hits = [0] * len(strategies)
+        self.misses = 0
+        self.resolve_ms = 0.0
+        self._lock = threading.Lock()
+
+    def ordered(self, params: dict) -> list[list]:
+        with self._lock:
+            preferred = self.preferred
+        order = [preferred] + [i for i in range(len(self.strategies)) if i != preferred]
+        resolved = []
+        for index in order:
+            kind, value, *pattern = self.strategies[index]
+            pattern = pattern[0] if pattern else None
+            if params:
+                value = value.format(**params)
+                pattern = pattern.format(**params) if pattern else None
+            resolved.append([index, kind, value, pattern])
+        return resolved
+
+    def record(self, index: Optional[int], elapsed: float) -> None:
+        with self._lock:
+            self.resolve_ms += elapsed * 1000
+            if index is None:
+                self.misses += 1
+                return
+            self.hits[index] += 1
+            self.preferred = index
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses, resolve_ms, preferred = list(self.hits), self.misses, self.resolve_ms, self.preferred
+        lookups = sum(hits) + misses
+        return {
+            "hits": sum(hits),
+            "misses": misses,
+            "avg_resolve_ms": round(resolve_ms / lookups, 3) if lookups else None,
+            "preferred": list(self.strategies[preferred]),
+            "strategies": [{"strategy": list(strategy), "hits": count}
+                           for strategy, count in zip(self.strategies, hits)],
+        }
+
+
+SELECTORS = {target.name: target for target in (
+    Target("prejoin_mic_off",
+           ("css", "div[role='button'][aria-label='Turn off microphone']"),
+           ("css", "[aria-label='Turn off microphone']"),
+           ("css", "[role='button'][aria-label*='microphone' i][data-is-muted='false']")),
+    Target("prejoin_camera_off",
+           ("css", "div[role='button'][aria-label='Turn off camera']"),
+           ("css", "[aria-label='Turn off camera']"),
+           ("css", "[role='button'][aria-label*='camera' i][data-is-muted='false']")),
+    Target("name_input",
+           ("css", "input[type='text'][placeholder='Your name']"),
+           ("css", "input[aria-label='Your name']"),
+           ("css", "input[type='text'][autocomplete='name']")),
+    Target("join_button",
+           ("text", "span", "^(ask to join|join now)$"),
+           ("text", "button", "ask to join|join now")),
+    Target("people_button",
+           ("css", "button[aria-label='People']"),
+           ("css", "button[aria-label^='People' i]"),
+           ("css", "button[aria-label='Show everyone']")),
+    Target("participants_list",
+           ("css", "div[role='list'][aria-label='Participants']"),
+           ("css", "[role='list'][aria-label='Participants']")),
+    Target("participant_item",
+           ("css", "div[role='list'][aria-label='Participants'] div[role='listitem']"),
+           ("css", "[aria-label='Participants'] [role='listitem']")),
+    Target("more_options_button",
+           ("css", "button[aria-label='More options'][data-use-native-focus-logic='true']"),
+           ("css", "button[aria-label='More options']"),
+           ("css", "button[aria-label^='More options' i]")),
+    Target("call_options_menu",
+           ("css", "ul[aria-label='Call options']"),
+           ("css", "[role='menu'][aria-label='Call options']"),
+           ("css", "ul[role='menu']")),
+    Target("change_layout_item",
+           ("text", "ul[aria-label='Call options'] li[role='menuitem']", "change layout"),
+           ("text", "[role='menuitem']", "change layout"),
+           ("text", "[role='menu'] span", "^change layout$")),
+    Target("layout_radiogroup",
+           ("css", "div[aria-label='Change layout'][role='radiogroup']"),
+           ("css", "[role='radiogroup'][aria-label*='layout' i]")),
+    Target("layout_option",
+           ("text", "div[aria-label='Change layout'][role='radiogroup'] label", "{layout}"),
+           ("text", "[role='radiogroup'] label", "{layout}"),
+           ("text", "[role='radiogroup'] [role='radio']", "{layout}")),
+    Target("chat_button",
+           ("css", "button[aria-label='Chat with everyone']"),
+           ("css", "button[aria-label^='Chat with everyone' i]"),
+           ("css", "button[aria-label*='chat' i]")),
+    Target("chat_input",
+           ("css", "textarea[aria-label='Send a message']"),
+           ("css", "textarea[aria-label^='Send a message' i]"),
+           ("css", "textarea[placeholder^='Send a message' i]")),
+    Target("mic_button",
+           ("css", "button[aria-label='Turn {action} microphone']"),
+           ("css", "[role='button'][aria-label^='Turn {action} microphone' i]")),
+    Target("camera_button",
+           ("css", "button[aria-label='Turn {action} camera']"),
+           ("css", "[role='button'][aria-label^='Turn {action} camera' i]")),
+    Target("leave_button",
+           ("css", "button[aria-label='Leave call']"),
+           ("css", "button[aria-label^='Leave call' i]"),
+           ("css", "[role='button'][aria-label^='Leave' i]")),
+    Target("got_it_button",
+           ("text", "button", "^got it$"),
+           ("xpath", "//button[.//span[normalize-space(.)='Got it']]")),
+)}
+
+
+def find(driver: uc.Chrome, name: str, timeout: float = 10, visible: bool = True, **params) -> WebElement:
+    """
+    Resolves a registered target, trying all its strategies in a single in-page wait.
+    Raises TimeoutException when none matched within the timeout.
+    """
+    target = SELECTORS[name]
+    started = time.perf_counter()
+    try:
+        element, index = wait_for_js(driver, _RESOLVE_CONDITION, target.ordered(params), visible, timeout=timeout)
+    except TimeoutException:
+        target.record(None, time.perf_counter() - started)
+        raise TimeoutException(f"No strategy of selector {name} matched within {timeout}s")
+    target.record(index, time.perf_counter() - started)
+    return element
+
+
+def find_now(driver: uc.Chrome, name: str, visible: bool = True, record: bool = True,
+             **params) -> Optional[WebElement]:
+    """
+    Resolves a registered target without waiting, None when it is not on the page.
+    Polling callers for which absence is expected pass record=False to keep it out of the miss counter.
+    """
+    target = SELECTORS[name]
+    started = time.perf_counter()
+    script = f"return ({_RESOLVE_CONDITION})(arguments[0], arguments[1]);"
+    found = driver.execute_script(script, target.ordered(params), visible)
+    if found or record:
+        target.record(found[1] if found else None, time.perf_counter() - started)
+    return found[0] if found else None
+
+
+def wait_gone(driver: uc.Chrome, name: str, timeout: float = 10, **params) -> None:
+    """
+    Waits until no strategy of a registered target matches a visible element anymore
+    """
+    condition = f"(strategies, visible) => !({_RESOLVE_CONDITION})(strategies, visible)"
+    wait_for_js(driver, condition, SELECTORS[name].ordered(params), True, timeout=timeout)
+
+
+def strategies(name: str, **params) -> list[list]:
+    """
+    Strategies of a registered target, last matched first, to pass into a page_script
+    """
+    return SELECTORS[name].ordered(params)
+
+
+def css_selector(name: str, **params) -> str:
+    """
+    The CSS strategies of a registered target joined into one selector list, for page code that matches
+    nodes as they are added instead of resolving the target
+    """
+    return ", ".join(value for _, kind, value, _ in strategies(name, **params) if kind == "css")
+
+
+def page_script(script: str) -> str:
+    """
+    Prefixes a page script with resolve(strategies, visible), which returns the first match and its strategy index
+    or null, and resolveAll(strategies), which returns every node selected by the first strategy selecting any.
+    The script gets the strategies of the targets it needs as arguments, see strategies.
+    """
+    return f"const resolve = {_RESOLVE_CONDITION};\nconst resolveAll = {_RESOLVE_ALL};\n{script}"
+
+
+def click(driver: uc.Chrome, name: str, timeout: float = 10, **params) -> bool:
+    """
+    Clicks a registered target with ActionChains, or JavaScript when that fails. Returns whether it was clicked.
+    """
+    try:
+        element = find(driver, name, timeout, **params)
+    except Exception as e:
+        print(f"Could not click {name}: {e}")
+        return False
+    try:
+        ActionChains(driver).move_to_element(element).click().perform()
+    except Exception as e:
+        print(f"ActionChains click on {name} failed: {e}, trying JavaScript click")
+        driver.execute_script("arguments[0].click();", element)
+    return True
+
+
+# Runs a list of [action, target, skip_if] steps inside the page, each step waiting for its target on DOM mutations:
+# "wait" for it, "click" it, "check" the radio or checkbox in it and wait until it is checked,
+# "close" the dialog containing it (its Close button, Escape otherwise) and wait until it is gone.
+# A step is skipped when its skip_if target is already shown, e.g. a dialog that is still open.
+_NAVIGATE_SCRIPT = """
+const done = arguments[arguments.length - 1];
+const [steps, targets, timeoutMs] = arguments;
+const resolve = __RESOLVE__;
+const started = performance.now();
+const report = [];
+let text = null;
+let closed = null;
+
+const until = (check, ms) => new Promise((resolveWait, rejectWait) => {
+    const initial = check();
+    if (initial) return resolveWait(initial);
+    const finish = (value, error) => {
+        observer.disconnect();
+        clearInterval(timer);
+        error ? rejectWait(error) : resolveWait(value);
+    };
+    const deadline = Date.now() + ms;
+    const observer = new MutationObserver(() => { const value = check(); if (value) finish(value); });
+    observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true});
+    const timer = setInterval(() => {
+        const value = check();
+        if (value) finish(value);
+        else if (Date.now() > deadline) finish(null, new Error('timed out'));
+    }, 50);
+});
+
+(async () => {
+    for (const [action, name, skipIf] of steps) {
+        const stepStarted = performance.now();
+        const entry = {action: action, target: name, strategy: null, ms: null, skipped: false};
+        report.push(entry);
+        if (skipIf && resolve(targets[skipIf], true)) {
+            entry.skipped = true;
+            continue;
+        }
+        if (action === 'close') {
+            const found = resolve(targets[name], true);
+            if (found) {
+                const dialog = found[0].closest('[role="dialog"]');
+                const button = dialog && dialog.querySelector('button[aria-label^="Close"]');
+                if (button) button.click();
+                else document.dispatchEvent(new KeyboardEvent('keydown', {key: 'Escape', code: 'Escape', keyCode: 27, bubbles: true}));
+            }
+            closed = await until(() => !resolve(targets[name], true), Math.min(timeoutMs, 3000)).then(() => true, () => false);
+        } else {
+            const [node, index] = await until(() => resolve(targets[name], true), timeoutMs);
+            entry.strategy = index;
+            if (action === 'click') {
+                node.click();
+            } else if (action === 'check') {
+                const input = node.matches('input') ? node : (node.querySelector('input[type="radio"], input[type="checkbox"]') || node);
+                const isChecked = () => input.checked || input.getAttribute('aria-checked') === 'true';
+                if (!isChecked()) input.click();
+                await until(isChecked, Math.min(timeoutMs, 5000));
+                text = ((input.closest('label') || node).textContent || '').trim();
+            }
+        }
+        entry.ms = performance.now() - stepStarted;
+    }
+    return null;
+})().then(
+    () => done({ok: true, steps: report, text: text, closed: closed, duration_ms: performance.now() - started}),
+    (e) => done({ok: false, error: String(e && e.message || e), steps: report, text: text, closed: closed,
+                 duration_ms: performance.now() - started})
+);
+""".replace("__RESOLVE__", _RESOLVE_CONDITION)
+
+
+def navigate(driver: uc.Chrome, steps: list[tuple], timeout: float = 10, **params) -> dict:
+    """
+    Walks through a menu or dialog in a single round trip, see _NAVIGATE_SCRIPT for the step actions.
+    Returns the per-step report with the matched strategies, the text of the last checked option,
+    whether the closed dialog went away and the total duration. Raises TimeoutException when a step failed.
+    """
+    names = {step[1] for step in steps} | {step[2] for step in steps if len(step) > 2}
+    targets = {name: SELECTORS[name].ordered(params) for name in names}
+    driver.set_script_timeout(timeout * len(steps) + 5)
+    result = driver.execute_async_script(_NAVIGATE_SCRIPT, [list(step) + [None] * (3 - len(step)) for step in steps],
+                                         targets, int(timeout * 1000))
+    for entry in result["steps"]:
+        if entry["skipped"] or entry["action"] == "close":
+            continue
+        SELECTORS[entry["target"]].record(entry["strategy"], (entry["ms"] or 0) / 1000)
+    if not result["ok"]:
+        failed = result["steps"][-1]
+        raise TimeoutException(f"{failed['action']} {failed['target']} failed: {result['error']}")
+    return result
+
+
+def selector_stats() -> dict:
+    return {name: target.stats() for name, target in SELECTORS.items()}
@@ -0,0 +1,182 @@
+import json
+import queue
+import secrets
+import threading
+import time
+import urllib.request
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+from helpers.config import TRACE_BUFFER_SIZE, TRACE_FILE, TRACE_OTLP_ENDPOINT, TRACE_SERVICE_NAME
+from helpers.metrics import LatencyStats
+
+
+def otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # int64 is a string in the protobuf JSON mapping
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Span:
+    """
+    A timed step. Spans opened while another one is active on the same thread become its children.
+    """
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, attributes: Optional[dict] = None,
+                 start_ns: Optional[int] = None):
+        self.name = name
+        self.parent = parent
+        self.root: Span = parent.root if parent else self
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = {key: value for key, value in (attributes or {}).items() if value is not None}
+        self.error: Optional[str] = None
+        # Finished spans of the trace, collected on the root
+        self.finished: list[Span] = []
+
+    def set(self, **attributes) -> None:
+        self.attributes.update({key: value for key, value in attributes.items() if value is not None})
+
+    @property
+    def duration(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            # SPAN_KIND_INTERNAL
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": otlp_value(value)} for key, value in self.attributes.items()],
+            # STATUS_CODE_ERROR or STATUS_CODE_OK
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent:
+            span["parentSpanId"] = self.parent.span_id
+        return span
+
+
+class Tracer:
+    """
+    Collects finished spans. Durations feed rolling percentiles per span name; completed traces are kept
+    in a bounded ring and exported as OTLP JSON, one ExportTraceServiceRequest per line to a file
+    and/or posted to an OTLP/HTTP collector from a background thread.
+    """
+
+    def __init__(self, capacity: int = TRACE_BUFFER_SIZE, path: str = TRACE_FILE,
+                 endpoint: str = TRACE_OTLP_ENDPOINT, service_name: str = TRACE_SERVICE_NAME):
+        self.path = path
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.traces: deque[list[Span]] = deque(maxlen=capacity)
+        self.steps: dict[str, LatencyStats] = {}
+        self.errors: dict[str, int] = {}
+        self.export_errors = 0
+        self._lock = threading.Lock()
+        self._outbox: Optional[queue.Queue] = None
+        if endpoint:
+            self._outbox = queue.Queue(maxsize=1000)
+            threading.Thread(target=self._post_loop, name="trace-exporter", daemon=True).start()
+
+    def finish(self, span: Span, end_ns: Optional[int] = None) -> None:
+        span.end_ns = end_ns or time.time_ns()
+        with self._lock:
+            self.steps.setdefault(span.name, LatencyStats()).observe(span.duration)
+            if span.error:
+                self.errors[span.name] = self.errors.get(span.name, 0) + 1
+            span.root.finished.append(span)
+            if span is not span.root:
+                return
+            spans = span.finished
+            self.traces.append(spans)
+        self._export(spans)
+
+    def record(self, name: str, start_ns: int, end_ns: Optional[int] = None, **attributes) -> Span:
+        """
+        Records a step that was not timed by a span, e.g. a wait measured between two events
+        """
+        span = Span(name, attributes=attributes, start_ns=start_ns)
+        self.finish(span, end_ns)
+        return span
+
+    def payload(self, traces: list[list[Span]]) -> dict:
+        """
+        OTLP JSON ExportTraceServiceRequest of some traces
+        """
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": otlp_value(self.service_name)}]},
+            "scopeSpans": [{
+                "scope": {"name": "meetbot"},
+                "spans": [span.to_otlp() for spans in traces for span in spans],
+            }],
+        }]}
+
+    def _export(self, spans: list[Span]) -> None:
+        if not self.path and self._outbox is None:
+            return
+        text = json.dumps(self.payload([spans]))
+        if self.path:
+            try:
+                with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                    f.write(text + "\n")
+            except OSError as e:
+                self.export_errors += 1
+                print(f"Error writing trace to {self.path}: {e}")
+        if self._outbox is not None:
+            try:
+                self._outbox.put_nowait(text)
+            except queue.Full:
+                self.export_errors += 1
+
+    def _post_loop(self) -> None:
+        while True:
+            text = self._outbox.get()
+            request = urllib.request.Request(self.endpoint, data=text.encode(), method="POST",
+                                             headers={"Content-Type": "application/json"})
+            try:
+                urllib.request.urlopen(request, timeout=5).close()
+            except Exception as e:
+                self.export_errors += 1
+                print(f"Error exporting trace to {self.endpoint}: {e}")
+
+    def recent(self, limit: int = 20) -> dict:
+        with self._lock:
+            traces = list(self.traces)[-limit:]
+        return self.payload(traces)
+
+    def step_stats(self) -> dict[str, LatencyStats]:
+        with self._lock:
+            return dict(self.steps)
+
+
+tracer = Tracer()
+_current: ContextVar[Optional[Span]] = ContextVar("meetbot_span", default=None)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """
+    Times a step as a child of the active span, or as a new trace. An exception marks the span as failed and propagates.
+    """
+    current = Span(name, _current.get(), attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = str(e) or type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        tracer.finish(current)
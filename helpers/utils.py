@@ -1,59 +1,116 @@
-import random
-import time
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
-from typing import Tuple
+import json
+from typing import Optional
 import undetected_chromedriver as uc
 
-
-def reliable_click(driver: uc.Chrome, target_locator: Tuple[By, str], wait_time: int = 10) -> bool:
-    """
-    Click element with actionchains or JavaScript, whichever works
-    """
-    try:        
-        # Find the element
-        element = WebDriverWait(driver, wait_time).until(
-            EC.element_to_be_clickable(target_locator)
-        )
-        
-        # Try ActionChains click
-        try:
-            action = ActionChains(driver)
-            action.move_to_element(element)
-            action.click()
-            action.perform()
-            return True
-        except Exception as e:
-            print(f"ActionChains click failed: {e}, trying JavaScript click")
-            # Fall back to JavaScript click
-            driver.execute_script("arguments[0].click();", element)
-            return True
-            
-    except Exception as e:
-        print(f"Could not click: {e}")
-        return False
+from helpers.config import EVENT_BUFFER_SIZE
+from helpers.selectors import find_now, wait_gone, page_script, strategies, css_selector
 
 
-def setup_mutation_observer(driver: uc.Chrome) -> None:
+def setup_mutation_observer(driver: uc.Chrome, buffer_size: int = EVENT_BUFFER_SIZE) -> None:
     """
     Sets up a JS mutation observer to monitor DOM changes. 
-    Monitors for participants joining or leaving meetings, and when the bot is accepted into the meeting.
+    Monitors for participants joining or leaving meetings, participants listed in the People panel,
+    chat messages shown in the chat panel, call control state changes, and when the bot is accepted into the meeting.
+    Every event gets a sequence number and is appended to a bounded in-page queue (window.__meetbot),
+    and is pushed to Python right away through the __meetbotEmit Runtime binding when it is attached.
     """
     mutation_observer_script = """
+    (() => {
     // Regex definitions for join / leave toast notifications
     const joinedRe = /\\bjoined$/i;
     const leftRe = /\\bhas left the meeting$/i;
 
+    // Bounded event queue, drained by drain_page_events. The epoch tells page reloads apart.
+    const state = window.__meetbot = window.__meetbot || {
+        epoch: Date.now().toString(36) + Math.random().toString(36).slice(2, 8),
+        seq: 0,
+        events: [],
+        dropped: 0,
+        capacity: __BUFFER_SIZE__,
+        accepted: false
+    };
+
+    function emit(kind, message, name, extra) {
+        const event = {epoch: state.epoch, seq: ++state.seq, kind: kind, message: message, name: name, ts: Date.now()};
+        Object.assign(event, extra);
+        state.events.push(event);
+        if (state.events.length > state.capacity) {
+            state.events.shift();
+            state.dropped++;
+        }
+        if (typeof window.__meetbotEmit === 'function') {
+            window.__meetbotEmit(JSON.stringify(event));
+        }
+    }
+
+    // Selectors of registered targets, see helpers/selectors.py
+    const listSelector = __PARTICIPANTS_LIST__;
+    const itemSelector = __PARTICIPANT_ITEM__;
+
+    // Names of participant list items contained in (or being) an added node
+    function listedParticipants(node) {
+        if (node.nodeType !== Node.ELEMENT_NODE)
+            return [];
+        if (!node.closest(listSelector) && !node.querySelector(listSelector))
+            return [];
+        const items = node.matches(itemSelector) ? [node] : node.querySelectorAll(itemSelector);
+        return Array.from(items).filter(item => item.hasAttribute('aria-label'))
+            .map(item => item.getAttribute('aria-label'));
+    }
+
+    // Chat messages carry a stable data-message-id. Sender and time sit in the header of the message group,
+    // whose obfuscated class names are only a fallback for the data attributes.
+    // Only the most recent ids are remembered, older messages are not re-rendered and Python dedupes them anyway.
+    const seenMessages = state.seenMessages = state.seenMessages || new Set();
+    const seenCapacity = 5000;
+    function chatMessages(node) {
+        if (node.nodeType !== Node.ELEMENT_NODE)
+            return [];
+        const items = node.matches('[data-message-id]') ? [node] : node.querySelectorAll('[data-message-id]');
+        const messages = [];
+        for (const item of items) {
+            const id = item.getAttribute('data-message-id');
+            const body = item.querySelector('[jsname="dTKtvb"]') || item;
+            const text = (body.innerText || body.textContent || '').trim();
+            if (!id || !text || seenMessages.has(id))
+                continue;
+            seenMessages.add(id);
+            if (seenMessages.size > seenCapacity)
+                // Sets iterate in insertion order, the first id is the oldest
+                seenMessages.delete(seenMessages.values().next().value);
+            const group = item.closest('[data-sender-name]') || item.closest('.Ss4fHf');
+            const sender = group && (group.getAttribute('data-sender-name')
+                || (group.querySelector('.poVWob') || {}).textContent);
+            const time = group && (group.getAttribute('data-formatted-timestamp')
+                || (group.querySelector('.MuzmKe') || {}).textContent);
+            messages.push({id: id, text: text, sender: sender ? sender.trim() : null, time: time || null});
+        }
+        return messages;
+    }
+
+    // Call controls whose label or pressed state changing means the cached state probe is outdated
+    const controlSelector = __CONTROLS__;
+
     // callback function for mutation observer
     function onMutations(mutationsList) {
         for (const mutation of mutationsList) {
+            if (mutation.type === 'attributes') {
+                if (mutation.target.matches(controlSelector))
+                    emit('state_changed', mutation.target.getAttribute('aria-label'), null);
+                continue;
+            }
             // We only care about nodes being added
             if (mutation.type !== 'childList' || mutation.addedNodes.length === 0)
                 continue;
 
             for (const node of mutation.addedNodes) {
+                // Chat goes first, a message ending in "joined" is not a join toast
+                const messages = chatMessages(node);
+                if (messages.length) {
+                    for (const chat of messages)
+                        emit('chat_message_received', chat.text, chat.sender, {message_id: chat.id, sent_at: chat.time});
+                    continue;
+                }
                 // If it's an element, grab its text; if it's a text node, use it directly
                 const text = (node.nodeType === Node.TEXT_NODE)
                     ? node.nodeValue
@@ -61,31 +118,52 @@ def setup_mutation_observer(driver: uc.Chrome) -> None:
                 if (text) {
                     if (joinedRe.test(text.trim())) {
                         console.log('Someone joined! Text matched "joined":', text.trim());
-                        window._join_message = text.trim(); // storing info in global window object
-                        return;
+                        emit('participant_joined', text.trim(), text.trim().replace(joinedRe, '').trim());
+                        continue;
                     }
                     if (leftRe.test(text.trim())) {
                         console.log('Someone left! Text matched "has left the meeting":', text.trim());
-                        window._left_message = text.trim(); // storing info in global window object
-                        return;
+                        emit('participant_left', text.trim(), text.trim().replace(leftRe, '').trim());
+                        continue;
                     }   
                 }
-                if (node.tagName === 'BUTTON' && node.getAttribute('aria-label') === 'Meeting details') {
+                if (node.tagName === 'BUTTON' && node.getAttribute('aria-label') === 'Meeting details'
+                        && !state.accepted) {
                     console.log('Meeting details button found!');
-                    window._join_accepted = true; // storing info in global window object
-                    return;
+                    state.accepted = true;
+                    emit('bot_accepted', 'Bot accepted by host', null);
+                    continue;
+                }
+                for (const name of listedParticipants(node)) {
+                    emit('participant_listed', null, name);
                 }
             }
         }
     }
 
-    // Create & attach the observer
-    const observer = new MutationObserver(onMutations);
-    observer.observe(document.body || document.documentElement, {
+    // Create & attach the observer, replacing the one of an earlier setup. scope_mutation_observer narrows it later.
+    if (state.observer)
+        state.observer.disconnect();
+    if (state.scopeWatcher) {
+        state.scopeWatcher.disconnect();
+        state.scopeWatcher = null;
+    }
+    const observer = state.observer = new MutationObserver(onMutations);
+    state.observerOptions = {
         childList: true,
-        subtree: true
-    });
-    """
+        subtree: true,
+        attributes: true,
+        attributeFilter: ['aria-label', 'aria-pressed']
+    };
+    state.scoped = false;
+    observer.observe(document.body || document.documentElement, state.observerOptions);
+    })();
+    """.replace("__BUFFER_SIZE__", str(buffer_size)) \
+        .replace("__PARTICIPANTS_LIST__", json.dumps(css_selector("participants_list"))) \
+        .replace("__PARTICIPANT_ITEM__", json.dumps(css_selector("participant_item"))) \
+        .replace("__CONTROLS__", json.dumps(", ".join(
+            [css_selector(button, action=action) for button in ("mic_button", "camera_button") for action in ("on", "off")]
+            + [css_selector("chat_button")])))
     driver.execute_cdp_cmd(
         "Runtime.evaluate",
         {
@@ -95,60 +173,140 @@ def setup_mutation_observer(driver: uc.Chrome) -> None:
         },
     )
 
+
+def scope_mutation_observer(driver: uc.Chrome) -> int:
+    """
+    Narrows the observer from the whole page to the containers its events come from: live regions (join and
+    leave toasts, chat), side panels and dialogs (chat, people) and the call controls bar.
+    Meet's video grid is no longer watched. A watcher on the direct children of the body attaches containers
+    added there later, e.g. toasts and dialogs; calling this again picks up those rendered deeper in the page.
+    Returns the number of containers newly observed.
+    """
+    return driver.execute_script(page_script("""
+        const [participantsList, leaveButton, micButtons] = arguments;
+        const state = window.__meetbot;
+        if (!state || !state.observer)
+            return 0;
+        const containers = '[aria-live], [role="complementary"], [role="dialog"]';
+        const attach = (targets) => {
+            let added = 0;
+            for (const target of targets) {
+                if (state.scopedTargets.has(target))
+                    continue;
+                state.scopedTargets.add(target);
+                state.observer.observe(target, state.observerOptions);
+                added++;
+            }
+            return added;
+        };
+        if (!state.scoped) {
+            state.observer.disconnect();
+            state.scoped = true;
+            state.scopedTargets = new WeakSet();
+            state.scopeWatcher = new MutationObserver((mutations) => {
+                for (const mutation of mutations) {
+                    for (const node of mutation.addedNodes) {
+                        if (node.nodeType !== Node.ELEMENT_NODE)
+                            continue;
+                        const targets = Array.from(node.querySelectorAll(containers));
+                        if (node.matches(containers))
+                            targets.push(node);
+                        targets.push(...resolveAll(participantsList).filter(list => node.contains(list)));
+                        attach(targets);
+                    }
+                }
+            });
+            state.scopeWatcher.observe(document.body, {childList: true});
+        }
+        const targets = Array.from(document.querySelectorAll(containers));
+        targets.push(...resolveAll(participantsList));
+        // The call controls bar is the closest ancestor of the leave button also holding the mic button
+        const leave = resolve(leaveButton, false);
+        const mic = micButtons.map(button => resolve(button, false)).find(found => found);
+        let controls = leave && mic ? leave[0] : null;
+        while (controls && !controls.contains(mic[0]))
+            controls = controls.parentElement;
+        if (controls)
+            targets.push(controls);
+        return attach(targets);
+    """), strategies("participants_list"), strategies("leave_button"),
+        [strategies("mic_button", action="off"), strategies("mic_button", action="on")])
+
+
+def read_participant_names(driver: uc.Chrome) -> list[str]:
+    """
+    Reads the names in the open participants list in a single round trip
+    """
+    return driver.execute_script(page_script("""
+        return resolveAll(arguments[0]).filter(item => item.hasAttribute('aria-label'))
+            .map(item => item.getAttribute('aria-label'));
+    """), strategies("participant_item"))
+
+
+def drain_page_events(driver: uc.Chrome) -> Optional[dict]:
+    """
+    Takes every queued observer event out of the page in a single round trip.
+    Returns the events in order along with the page epoch and the overflow counter, or None before the observer is set up.
+    """
+    return driver.execute_script("""
+        const state = window.__meetbot;
+        if (!state) return null;
+        const events = state.events;
+        state.events = [];
+        return {epoch: state.epoch, events: events, dropped: state.dropped};
+    """)
+
 def clear_got_it_dialogs(driver):
     """
     Removes any "Got it" tutorial/intro dialog boxes that might obstruct interaction with the UI
     """
     try:
-        got_it_buttons = driver.find_elements(
-            By.XPATH, "//button[.//span[normalize-space(.)='Got it']]"
-        )
-        for button in got_it_buttons:
+        clicked = 0
+        # Usually there is none, which is not worth a miss in the selector stats
+        while clicked < 5 and (button := find_now(driver, "got_it_button", record=False)):
             driver.execute_script("arguments[0].click();", button)
-            time.sleep(1)
+            clicked += 1
+        if clicked:
+            wait_gone(driver, "got_it_button", timeout=3)
     except Exception as e:
         print(f"Error clearing got it dialogs: {e}")
 
+def probe_state(driver: uc.Chrome) -> dict:
+    """
+    Reads mic, camera, chat panel, layout and in-call state of the meeting page in a single round trip
+    """
+    return driver.execute_script(page_script("""
+        const [micOff, micOn, cameraOff, cameraOn, chatInput, leaveButton] = arguments;
+        const present = (target) => resolve(target, false) !== null;
+        return {
+            mic: present(micOff) ? 'unmuted' : present(micOn) ? 'muted' : 'unknown',
+            camera: present(cameraOff) ? 'video_on' : present(cameraOn) ? 'video_off' : 'unknown',
+            chat_open: resolve(chatInput, true) !== null,
+            layout: (window.__meetbot && window.__meetbot.layout) || null,
+            in_call: present(leaveButton)
+        };
+    """), strategies("mic_button", action="off"), strategies("mic_button", action="on"),
+        strategies("camera_button", action="off"), strategies("camera_button", action="on"),
+        strategies("chat_input"), strategies("leave_button"))
+
+
 def find_mute_status(driver: uc.Chrome) -> str:
     """
     Determines the current microphone mute status.
     """
     try:
-        mic_off_buttons = driver.find_elements(
-            By.XPATH, "//button[@aria-label='Turn off microphone']"
-        )
-        mic_on_buttons = driver.find_elements(
-            By.XPATH, "//button[@aria-label='Turn on microphone']"
-        )
-
-        if len(mic_off_buttons) > 0:
-            return "unmuted"
-        elif len(mic_on_buttons) > 0:
-            return "muted"
-        else:
-            return "unknown"
+        return probe_state(driver)["mic"]
     except Exception as e:
         print(f"Error checking mute status: {e}")
         return "unknown"
-    
+
+
 def find_video_status(driver: uc.Chrome) -> str:
     """
     Determines the current camera video status.
     """
     try:
-        video_off_buttons = driver.find_elements(
-            By.XPATH, "//button[@aria-label='Turn off camera']"
-        )
-        video_on_buttons = driver.find_elements(
-            By.XPATH, "//button[@aria-label='Turn on camera']"
-        )
-
-        if len(video_off_buttons) > 0:
-            return "video_on"
-        elif len(video_on_buttons) > 0:
-            return "video_off"
-        else:
-            return "unknown"
+        return probe_state(driver)["camera"]
     except Exception as e:
         print(f"Error checking video status: {e}")
         return "unknown"
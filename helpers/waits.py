@@ -0,0 +1,60 @@
+import random
+import time
+from selenium.common.exceptions import TimeoutException
+from typing import Any
+import undetected_chromedriver as uc
+
+from helpers.config import JITTER_SCALE
+
+# Resolves once the condition returns a truthy value, re-checked on every DOM mutation and on a short interval.
+# __CONDITION__ is replaced by a JS function expression taking the script arguments.
+_WAIT_SCRIPT = """
+const done = arguments[arguments.length - 1];
+const timeoutMs = arguments[arguments.length - 2];
+const args = Array.prototype.slice.call(arguments, 0, -2);
+const condition = __CONDITION__;
+const check = () => { try { return condition(...args); } catch (e) { return null; } };
+
+const initial = check();
+if (initial) {
+    done(initial);
+    return;
+}
+const deadline = Date.now() + timeoutMs;
+let finished = false;
+const finish = (value) => {
+    if (finished) return;
+    finished = true;
+    observer.disconnect();
+    clearInterval(timer);
+    done(value);
+};
+const observer = new MutationObserver(() => { const value = check(); if (value) finish(value); });
+observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true, characterData: true});
+const timer = setInterval(() => {
+    const value = check();
+    if (value) finish(value);
+    else if (Date.now() > deadline) finish(null);
+}, 50);
+"""
+
+
+def wait_for_js(driver: uc.Chrome, condition: str, *args: Any, timeout: float = 10) -> Any:
+    """
+    Waits inside the page until a JS condition function, called with args, returns a truthy value.
+    The whole wait is a single execute_async_script round trip. Raises TimeoutException on timeout.
+    """
+    script = _WAIT_SCRIPT.replace("__CONDITION__", condition)
+    driver.set_script_timeout(timeout + 5)
+    result = driver.execute_async_script(script, *args, int(timeout * 1000))
+    if not result:
+        raise TimeoutException(f"Condition not met within {timeout}s")
+    return result
+
+
+def human_pause(low: float, high: float) -> None:
+    """
+    Humanlike random pause, scaled by MEETBOT_JITTER_SCALE. Disabled entirely with a scale of 0.
+    """
+    if JITTER_SCALE > 0:
+        time.sleep(random.uniform(low, high) * JITTER_SCALE)
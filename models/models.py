@@ -1,5 +1,8 @@
 from enum import Enum
 from pydantic import BaseModel
+from typing import Optional
+
+from helpers.config import CHAT_TYPING_MODE
 
 class JoinMeetingRequest(BaseModel):
     meeting_url: str
@@ -14,5 +17,49 @@ class Layout(Enum):
 class ChangeLayoutRequest(BaseModel):
     layout: Layout
 
+class TypingMode(Enum):
+    HUMANLIKE = "humanlike"
+    FAST = "fast"
+    INSTANT = "instant"
+
 class SendChatMessageRequest(BaseModel):
     message: str
+    typing_mode: TypingMode = TypingMode(CHAT_TYPING_MODE)
+
+class SessionState(str, Enum):
+    STARTING = "starting"
+    JOINING = "joining"
+    IN_MEETING = "in_meeting"
+    REJOINING = "rejoining"
+    LEAVING = "leaving"
+    CLOSED = "closed"
+    FAILED = "failed"
+
+class ScreenshotPolicy(str, Enum):
+    OFF = "off"
+    ON_ERROR = "on_error"
+    ALWAYS = "always"
+
+class ImageFormat(str, Enum):
+    PNG = "png"
+    JPEG = "jpeg"
+    WEBP = "webp"
+
+class RecordingFormat(str, Enum):
+    OPUS = "opus"
+    WAV = "wav"
+
+class CameraSourceKind(str, Enum):
+    VIDEO = "video"
+    IMAGE = "image"
+    PATTERN = "pattern"
+
+class CameraSourceRequest(BaseModel):
+    source: str
+    kind: Optional[CameraSourceKind] = None
+    cache: bool = True
+
+class PlaybackRequest(BaseModel):
+    source: Optional[str] = None
+    text: Optional[str] = None
+    unmute: Optional[bool] = None
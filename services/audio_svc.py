@@ -0,0 +1,549 @@
+import asyncio
+import os
+import queue
+import shlex
+import shutil
+import signal
+import subprocess
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+
+import ffmpeg
+
+from helpers.config import AUDIO_SOURCE, AUDIO_SAMPLE_RATE, AUDIO_CHUNK_MS, RECORDING_DIR, RECORDING_FORMAT, \
+    RECORDING_SEGMENT_SECONDS, RECORDING_MAX_SEGMENTS, PLAYBACK_SINK, PLAYBACK_SAMPLE_RATE, PLAYBACK_FRAME_MS, \
+    PLAYBACK_BUFFER_MS, PLAYBACK_QUEUE_SIZE, TTS_COMMAND
+from models.models import RecordingFormat
+from services.command_svc import QueueFullError
+
+SEGMENT_CODECS = {
+    RecordingFormat.OPUS: {"acodec": "libopus", "audio_bitrate": "32k"},
+    RecordingFormat.WAV: {"acodec": "pcm_s16le"},
+}
+
+
+def audio_input(source: str):
+    """
+    ffmpeg input for an audio source: a PulseAudio source name, "file:<path>" played in a loop
+    at real-time speed, or "tone" for a generated test tone
+    """
+    if source == "tone":
+        return ffmpeg.input("sine=frequency=440:sample_rate=48000", f="lavfi", re=None)
+    if source.startswith("file:"):
+        return ffmpeg.input(source[len("file:"):], stream_loop=-1, re=None)
+    return ffmpeg.input(source, f="pulse")
+
+
+class AudioRecorder:
+    """
+    Records the meeting audio from the virtual sink monitor with a single ffmpeg process.
+    ffmpeg writes rolling segments to disk (the oldest segment file is overwritten once the limit is reached)
+    and streams mono s16le PCM on stdout, which a reader thread hands out in fixed size chunks to subscribers.
+    Every subscriber queue is bounded, slow subscribers lose their oldest chunks.
+    """
+
+    def __init__(self, source: str = AUDIO_SOURCE, directory: str = RECORDING_DIR,
+                 sample_rate: int = AUDIO_SAMPLE_RATE, chunk_ms: int = AUDIO_CHUNK_MS,
+                 segment_seconds: int = RECORDING_SEGMENT_SECONDS, max_segments: int = RECORDING_MAX_SEGMENTS):
+        self.source = source
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.chunk_bytes = sample_rate * 2 * chunk_ms // 1000
+        self.segment_seconds = segment_seconds
+        self.max_segments = max_segments
+        self.audio_format: Optional[RecordingFormat] = None
+        self.recording_dir: Optional[str] = None
+        self.started_at: Optional[datetime] = None
+        self.bytes_captured = 0
+        self.chunks_dropped = 0
+        self.process: Optional[subprocess.Popen] = None
+        self.stderr_tail: deque[str] = deque(maxlen=20)
+        self._subscribers: set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self, audio_format: Optional[RecordingFormat] = None) -> None:
+        """
+        Starts recording into a new timestamped directory. Must be called from the event loop.
+        """
+        with self._lock:
+            if self.running:
+                raise RuntimeError("Recording is already running")
+            self._loop = asyncio.get_running_loop()
+            self.audio_format = audio_format or RecordingFormat(RECORDING_FORMAT)
+            self.started_at = datetime.now()
+            self.recording_dir = os.path.join(self.directory, self.started_at.strftime("%Y%m%d-%H%M%S"))
+            os.makedirs(self.recording_dir, exist_ok=True)
+            self.bytes_captured = 0
+            self.chunks_dropped = 0
+            self.stderr_tail.clear()
+
+            audio = audio_input(self.source).audio
+            segments = ffmpeg.output(
+                audio, os.path.join(self.recording_dir, f"segment_%03d.{self.audio_format.value}"),
+                f="segment", segment_time=self.segment_seconds, segment_wrap=self.max_segments,
+                reset_timestamps=1, **SEGMENT_CODECS[self.audio_format]
+            )
+            pcm = ffmpeg.output(audio, "pipe:1", f="s16le", acodec="pcm_s16le", ac=1, ar=self.sample_rate)
+            self.process = (
+                ffmpeg.merge_outputs(segments, pcm)
+                .global_args("-hide_banner", "-loglevel", "error", "-nostdin")
+                .run_async(pipe_stdout=True, pipe_stderr=True)
+            )
+            threading.Thread(target=self._read_pcm, args=(self.process,), name="audio-recorder", daemon=True).start()
+            threading.Thread(target=self._read_stderr, args=(self.process,), name="audio-recorder-log",
+                             daemon=True).start()
+            print(f"Recording {self.source} to {self.recording_dir}")
+
+    def stop(self, timeout: float = 5) -> None:
+        """
+        Stops ffmpeg, letting it finalize the current segment. Blocking.
+        """
+        with self._lock:
+            process = self.process
+            if process is None or process.poll() is not None:
+                return
+            process.send_signal(signal.SIGINT)
+            try:
+                process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+    def _read_pcm(self, process: subprocess.Popen) -> None:
+        while True:
+            chunk = process.stdout.read(self.chunk_bytes)
+            if not chunk:
+                break
+            self.bytes_captured += len(chunk)
+            if self._subscribers:
+                self._call_in_loop(self._publish, chunk)
+        # Tell subscribers the stream ended
+        self._call_in_loop(self._publish, None)
+
+    def _call_in_loop(self, callback, *args) -> None:
+        try:
+            self._loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # Event loop already closed, the API is shutting down
+            pass
+
+    def _read_stderr(self, process: subprocess.Popen) -> None:
+        for line in process.stderr:
+            self.stderr_tail.append(line.decode(errors="replace").rstrip())
+
+    def _publish(self, chunk: Optional[bytes]) -> None:
+        for subscriber in self._subscribers:
+            if subscriber.full():
+                subscriber.get_nowait()
+                self.chunks_dropped += 1
+            subscriber.put_nowait(chunk)
+
+    def subscribe(self, max_chunks: int = 50) -> asyncio.Queue:
+        """
+        Returns a queue receiving PCM chunks, None once the recording stopped
+        """
+        subscriber = asyncio.Queue(maxsize=max_chunks)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: asyncio.Queue) -> None:
+        self._subscribers.discard(subscriber)
+
+    def segments(self) -> list[str]:
+        if not self.recording_dir or not os.path.isdir(self.recording_dir):
+            return []
+        paths = [os.path.join(self.recording_dir, name) for name in os.listdir(self.recording_dir)]
+        return sorted(paths, key=os.path.getmtime)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "source": self.source,
+            "format": self.audio_format.value if self.audio_format else None,
+            "directory": self.recording_dir,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "sample_rate": self.sample_rate,
+            "seconds_captured": round(self.bytes_captured / (self.sample_rate * 2), 3),
+            "segments": self.segments(),
+            "subscribers": len(self._subscribers),
+            "chunks_dropped": self.chunks_dropped,
+            "exit_code": self.process.poll() if self.process else None,
+            "errors": list(self.stderr_tail),
+        }
+
+
+class Playback:
+    """
+    A clip queued for the bot's microphone: a decoded file or URL, synthesized speech or PCM streamed by a client.
+    Its mono s16le PCM arrives through a bounded chunk queue, None marks the end.
+    """
+
+    def __init__(self, kind: str, source: str, session_id: Optional[str] = None, max_chunks: int = 64):
+        self.playback_id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.source = source
+        self.session_id = session_id
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.created_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.bytes_played = 0
+        self.underruns = 0
+        # Cleared while the playback waits for something else, e.g. the microphone being unmuted
+        self.ready = threading.Event()
+        self.ready.set()
+        self.chunks: queue.Queue[Optional[bytes]] = queue.Queue(maxsize=max_chunks)
+        self.processes: list[subprocess.Popen] = []
+        self._buffer = bytearray()
+        self._ended = False
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("finished", "failed", "cancelled")
+
+    def feed(self, chunk: Optional[bytes]) -> bool:
+        """
+        Queues PCM, or the end of the stream with None. Blocks while the queue is full.
+        Returns False once the playback was cancelled.
+        """
+        while not self.done:
+            try:
+                self.chunks.put(chunk, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def decode(self, args: list[str], stdin=subprocess.DEVNULL) -> None:
+        """
+        Runs a decoder writing PCM to stdout and feeds its output
+        """
+        process = subprocess.Popen(args, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.processes.append(process)
+        threading.Thread(target=self._read_decoder, args=(process,), name="audio-decoder", daemon=True).start()
+
+    def _read_decoder(self, process: subprocess.Popen) -> None:
+        # read1 hands over whatever is available, so playback starts with the first decoded bytes
+        while chunk := process.stdout.read1(65536):
+            if not self.feed(chunk):
+                break
+        process.wait()
+        if process.returncode and not self.done:
+            self.error = process.stderr.read().decode(errors="replace").strip() or f"Decoder exited with code {process.returncode}"
+        self.feed(None)
+
+    def read(self, size: int) -> Optional[bytes]:
+        """
+        Returns the next size bytes without blocking, fewer at the end of the clip, b"" when nothing
+        arrived in time and None once everything was played
+        """
+        while len(self._buffer) < size and not self._ended:
+            try:
+                chunk = self.chunks.get_nowait()
+            except queue.Empty:
+                break
+            if chunk is None:
+                self._ended = True
+            else:
+                self._buffer += chunk
+        if len(self._buffer) >= size or (self._ended and self._buffer):
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+            return data
+        return None if self._ended else b""
+
+    def cancel(self) -> None:
+        if self.done:
+            return
+        self.status = "cancelled"
+        self.close()
+
+    def close(self) -> None:
+        for process in self.processes:
+            if process.poll() is None:
+                process.kill()
+
+    def to_dict(self) -> dict:
+        return {
+            "playback_id": self.playback_id,
+            "kind": self.kind,
+            "source": self.source,
+            "session_id": self.session_id,
+            "status": self.status,
+            "error": self.error,
+            "latency_ms": round((self.started_at - self.created_at) * 1000, 3) if self.started_at else None,
+            "duration_ms": round((self.finished_at - self.started_at) * 1000, 3)
+            if self.started_at and self.finished_at else None,
+            "underruns": self.underruns,
+        }
+
+
+class AudioPlayer:
+    """
+    Plays queued clips into the virtual sink, which Chrome uses as its microphone through virtual_source.
+    A single ffmpeg process stays connected to the sink and is fed silence while idle, so a new clip
+    only waits for its first decoded frame instead of a process start and a PulseAudio stream setup.
+    Clips play one after another in the order they were queued.
+    """
+
+    def __init__(self, sink: str = PLAYBACK_SINK, sample_rate: int = PLAYBACK_SAMPLE_RATE,
+                 frame_ms: int = PLAYBACK_FRAME_MS, buffer_ms: int = PLAYBACK_BUFFER_MS,
+                 max_queue: int = PLAYBACK_QUEUE_SIZE, tts_command: str = TTS_COMMAND, hold_timeout: float = 5):
+        self.sink = sink
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame_bytes = sample_rate * 2 * frame_ms // 1000
+        self.buffer_ms = buffer_ms
+        self.max_queue = max_queue
+        self.tts_command = shlex.split(tts_command)
+        self.hold_timeout = hold_timeout
+        self.queue: deque[Playback] = deque()
+        self.process: Optional[subprocess.Popen] = None
+        self.played = 0
+        self.failed = 0
+        self.restarts = 0
+        self.stderr_tail: deque[str] = deque(maxlen=20)
+        self._backoff = 1.0
+        self._listener: Optional[Callable[[str, Playback], Awaitable]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = True
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._stopped
+
+    def _output(self, stream):
+        if self.sink == "null":
+            return stream.output("-", f="null")
+        if self.sink.startswith("file:"):
+            return stream.output(self.sink[len("file:"):], f="wav")
+        return stream.output("meetbot", f="pulse", device=self.sink, buffer_duration=self.buffer_ms)
+
+    def _start_output(self) -> None:
+        pcm = ffmpeg.input("pipe:0", f="s16le", ac=1, ar=self.sample_rate)
+        self.process = (
+            self._output(pcm)
+            .global_args("-hide_banner", "-loglevel", "error")
+            .overwrite_output()
+            .run_async(pipe_stdin=True, pipe_stderr=True)
+        )
+        threading.Thread(target=self._read_stderr, args=(self.process,), name="audio-player-log", daemon=True).start()
+
+    def _read_stderr(self, process: subprocess.Popen) -> None:
+        for line in process.stderr:
+            self.stderr_tail.append(line.decode(errors="replace").rstrip())
+
+    def start(self, listener: Optional[Callable[[str, Playback], Awaitable]] = None) -> None:
+        """
+        Connects to the sink and starts the playback thread. Must be called from the event loop.
+        The listener is awaited with "playback_started" and "playback_finished" for every clip.
+        """
+        with self._lock:
+            if self.running:
+                return
+            self._loop = asyncio.get_running_loop()
+            self._listener = listener
+            self._start_output()
+            self._stopped = False
+            self._thread = threading.Thread(target=self._play, name="audio-player", daemon=True)
+            self._thread.start()
+            print(f"Audio player connected to {self.sink}")
+
+    def stop(self, timeout: float = 5) -> None:
+        """
+        Cancels all clips and disconnects from the sink. Blocking.
+        """
+        self._stopped = True
+        self.cancel()
+        if self._thread:
+            self._thread.join(timeout)
+        process = self.process
+        if process is None or process.poll() is not None:
+            return
+        process.stdin.close()
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    def _decoder_args(self, stream) -> list[str]:
+        return (
+            stream.audio
+            .output("pipe:1", f="s16le", acodec="pcm_s16le", ac=1, ar=self.sample_rate)
+            .global_args("-hide_banner", "-loglevel", "error", "-nostdin")
+            .compile()
+        )
+
+    def enqueue(self, playback: Playback) -> int:
+        """
+        Appends a clip to the queue and returns its position, 0 meaning it plays right away.
+        Raises QueueFullError when the queue is at its maximum length.
+        """
+        with self._lock:
+            if len(self.queue) >= self.max_queue:
+                raise QueueFullError(f"Playback queue is full ({self.max_queue} clips)")
+            self.queue.append(playback)
+            return len(self.queue) - 1
+
+    def play(self, source: str, session_id: Optional[str] = None, hold: bool = False) -> tuple[Playback, int]:
+        """
+        Queues an audio file or URL in any format ffmpeg decodes, e.g. WAV or Opus.
+        A held clip waits (up to hold_timeout) until its ready event is set.
+        """
+        playback = Playback("file", source, session_id)
+        if hold:
+            playback.ready.clear()
+        position = self.enqueue(playback)
+        playback.decode(self._decoder_args(ffmpeg.input(source)))
+        return playback, position
+
+    def speak(self, text: str, session_id: Optional[str] = None, hold: bool = False) -> tuple[Playback, int]:
+        """
+        Queues text synthesized by the text to speech command
+        """
+        if not shutil.which(self.tts_command[0]):
+            raise RuntimeError(f"Text to speech command {self.tts_command[0]} is not installed")
+        playback = Playback("speech", text, session_id)
+        if hold:
+            playback.ready.clear()
+        position = self.enqueue(playback)
+        tts = subprocess.Popen([*self.tts_command, text], stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL)
+        playback.processes.append(tts)
+        playback.decode(self._decoder_args(ffmpeg.input("pipe:0")), stdin=tts.stdout)
+        # The decoder owns the pipe now
+        tts.stdout.close()
+        return playback, position
+
+    def stream(self, session_id: Optional[str] = None, hold: bool = False) -> tuple[Playback, int]:
+        """
+        Queues a clip whose PCM (mono s16le at the player's sample rate) is fed by the caller
+        """
+        playback = Playback("stream", "websocket", session_id)
+        if hold:
+            playback.ready.clear()
+        return playback, self.enqueue(playback)
+
+    def cancel(self, playback_id: Optional[str] = None) -> int:
+        """
+        Cancels a clip, or every queued clip without an id. Returns how many were cancelled.
+        """
+        cancelled = 0
+        for playback in list(self.queue):
+            if playback_id is None or playback.playback_id == playback_id:
+                if not playback.done:
+                    playback.cancel()
+                    cancelled += 1
+        return cancelled
+
+    def pending(self, session_id: Optional[str] = None) -> int:
+        return sum(1 for playback in self.queue
+                   if not playback.done and (session_id is None or playback.session_id == session_id))
+
+    def _emit(self, event: str, playback: Playback) -> None:
+        if self._listener is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._listener(event, playback), self._loop)
+        except RuntimeError:
+            # Event loop already closed, the API is shutting down
+            pass
+
+    def _finish(self, playback: Playback) -> None:
+        with self._lock:
+            self.queue.popleft()
+        if not playback.done:
+            playback.status = "failed" if playback.error else "finished"
+        playback.finished_at = time.monotonic()
+        playback.close()
+        if playback.status == "finished":
+            self.played += 1
+        elif playback.status == "failed":
+            self.failed += 1
+        self._emit("playback_finished", playback)
+
+    def _next_frame(self) -> Optional[bytes]:
+        while self.queue:
+            playback = self.queue[0]
+            if playback.done:
+                self._finish(playback)
+                continue
+            if not playback.ready.is_set():
+                if time.monotonic() - playback.created_at < self.hold_timeout:
+                    return None
+                playback.ready.set()
+            frame = playback.read(self.frame_bytes)
+            if frame is None:
+                self._finish(playback)
+                continue
+            if not frame:
+                if playback.started_at:
+                    playback.underruns += 1
+                return None
+            if playback.started_at is None:
+                playback.started_at = time.monotonic()
+                playback.status = "playing"
+                self._emit("playback_started", playback)
+            playback.bytes_played += len(frame)
+            return frame.ljust(self.frame_bytes, b"\0")
+        return None
+
+    def _play(self) -> None:
+        # Frames are paced in real time, so the pipe to ffmpeg never buffers more than a frame
+        silence = bytes(self.frame_bytes)
+        interval = self.frame_ms / 1000
+        next_tick = time.monotonic()
+        while not self._stopped:
+            frame = self._next_frame() or silence
+            try:
+                self.process.stdin.write(frame)
+                self.process.stdin.flush()
+                self._backoff = 1.0
+            except (OSError, ValueError) as e:
+                if self._stopped:
+                    break
+                print(f"Audio player output failed, reconnecting to {self.sink} in {self._backoff:.0f}s: {e}")
+                time.sleep(self._backoff)
+                self._backoff = min(self._backoff * 2, 30)
+                try:
+                    self._start_output()
+                    self.restarts += 1
+                except Exception as e:
+                    print(f"Error reconnecting audio player: {e}")
+                next_tick = time.monotonic()
+                continue
+            next_tick += interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "sink": self.sink,
+            "sample_rate": self.sample_rate,
+            "frame_ms": self.frame_ms,
+            "queue": [playback.to_dict() for playback in self.queue],
+            "max_queue": self.max_queue,
+            "played": self.played,
+            "failed": self.failed,
+            "restarts": self.restarts,
+            "tts_available": shutil.which(self.tts_command[0]) is not None,
+            "exit_code": self.process.poll() if self.process else None,
+            "errors": list(self.stderr_tail),
+        }
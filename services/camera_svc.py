@@ -0,0 +1,548 @@
+import hashlib
+import mmap
+import os
+import subprocess
+import threading
+import time
+from collections import deque
+from typing import Iterator, Optional
+
+import ffmpeg
+
+from helpers.config import CAMERA_OUTPUT, CAMERA_WIDTH, CAMERA_HEIGHT, CAMERA_FPS, CAMERA_CACHE_ENABLED, \
+    CAMERA_CACHE_DIR, CAMERA_CACHE_MAX_MB, CAMERA_CACHE_MAX_SECONDS
+from models.models import CameraSourceKind
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".webp")
+
+
+def detect_source_kind(spec: str) -> CameraSourceKind:
+    if spec == "pattern" or spec.startswith("pattern:"):
+        return CameraSourceKind.PATTERN
+    if spec.lower().endswith(IMAGE_EXTENSIONS):
+        return CameraSourceKind.IMAGE
+    return CameraSourceKind.VIDEO
+
+
+def camera_frames(stream, width: int, height: int, fps: int):
+    """
+    Scales and letterboxes a video stream to the camera size and frame rate
+    """
+    return (
+        stream
+        .filter("scale", width, height, force_original_aspect_ratio="decrease")
+        .filter("pad", width, height, "(ow-iw)/2", "(oh-ih)/2")
+        .filter("fps", fps)
+    )
+
+
+class FrameSource:
+    """
+    Produces raw yuv420p frames of the camera size on its own thread and keeps only the latest one.
+    Frames replaced before the camera took them count as dropped.
+    """
+
+    def __init__(self, spec: str, frame_size: int, kind: Optional[CameraSourceKind] = None):
+        self.spec = spec
+        self.frame_size = frame_size
+        self.kind = kind
+        self.latest: Optional[bytes] = None
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.error: Optional[str] = None
+        self.first_frame = threading.Event()
+        self.finished = threading.Event()
+        self._taken = True
+        self._stopped = False
+
+    def _frames(self) -> Iterator[bytes]:
+        raise NotImplementedError
+
+    def _run(self) -> None:
+        try:
+            for frame in self._frames():
+                if self._stopped:
+                    break
+                if not self._taken:
+                    self.frames_dropped += 1
+                self.latest, self._taken = frame, False
+                self.frames_read += 1
+                self.first_frame.set()
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self.finished.set()
+
+    def start(self) -> None:
+        threading.Thread(target=self._run, name="camera-source", daemon=True).start()
+
+    def take(self) -> tuple[Optional[bytes], bool]:
+        """
+        Returns the latest frame and whether it is new since the last call
+        """
+        new = not self._taken
+        self._taken = True
+        return self.latest, new
+
+    def stop(self) -> None:
+        self._stopped = True
+
+    def stats(self) -> dict:
+        return {
+            "spec": self.spec,
+            "kind": self.kind.value if self.kind else None,
+            "cached": isinstance(self, RawFileSource),
+            "frames_read": self.frames_read,
+            "frames_dropped": self.frames_dropped,
+            "finished": self.finished.is_set(),
+            "error": self.error,
+        }
+
+
+class FfmpegSource(FrameSource):
+    """
+    Decodes a video file or URL, a still image or a test pattern with ffmpeg at real-time speed,
+    scaled and converted to the camera format
+    """
+
+    def __init__(self, spec: str, kind: CameraSourceKind, width: int, height: int, fps: int):
+        super().__init__(spec, width * height * 3 // 2, kind)
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.process: Optional[subprocess.Popen] = None
+
+    def _input(self):
+        if self.kind == CameraSourceKind.PATTERN:
+            pattern = self.spec.partition(":")[2] or "testsrc2"
+            return ffmpeg.input(f"{pattern}=size={self.width}x{self.height}:rate={self.fps}", f="lavfi", re=None)
+        if self.kind == CameraSourceKind.IMAGE:
+            return ffmpeg.input(self.spec, loop=1, framerate=self.fps, re=None)
+        return ffmpeg.input(self.spec, stream_loop=-1, re=None)
+
+    def _frames(self) -> Iterator[bytes]:
+        self.process = (
+            camera_frames(self._input().video, self.width, self.height, self.fps)
+            .output("pipe:1", f="rawvideo", pix_fmt="yuv420p")
+            .global_args("-hide_banner", "-loglevel", "error", "-nostdin")
+            .run_async(pipe_stdout=True)
+        )
+        while not self._stopped:
+            frame = self.process.stdout.read(self.frame_size)
+            if len(frame) < self.frame_size:
+                if self.process.wait() != 0:
+                    self.error = f"ffmpeg exited with code {self.process.returncode}"
+                return
+            yield frame
+
+    def stop(self) -> None:
+        super().stop()
+        if self.process and self.process.poll() is None:
+            self.process.kill()
+
+
+class RawFileSource(FrameSource):
+    """
+    Plays a pre-transcoded raw yuv420p file in a loop straight from a memory map, without any decoding.
+    Frames are handed out as zero-copy views into the map.
+    """
+
+    def __init__(self, spec: str, path: str, frame_size: int, fps: int, kind: Optional[CameraSourceKind] = None):
+        super().__init__(spec, frame_size, kind)
+        self.path = path
+        self.fps = fps
+
+    def _frames(self) -> Iterator[memoryview]:
+        with open(self.path, "rb") as f:
+            frames = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(frames)
+        count = len(frames) // self.frame_size
+        if count == 0:
+            raise RuntimeError(f"{self.path} holds no complete frame")
+        interval = 1 / self.fps
+        next_tick = time.monotonic()
+        index = 0
+        try:
+            while not self._stopped:
+                yield view[index * self.frame_size:(index + 1) * self.frame_size]
+                index = (index + 1) % count
+                next_tick += interval
+                delay = next_tick - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_tick = time.monotonic()
+        finally:
+            try:
+                view.release()
+                frames.close()
+            except BufferError:
+                # The streamer still repeats a frame of this map, the garbage collector unmaps it later
+                pass
+
+
+def probe_duration(spec: str) -> Optional[float]:
+    """
+    Duration of a local media file in seconds, None when unknown. URLs are not probed, ffprobe could hang on them.
+    """
+    if not os.path.isfile(spec):
+        return None
+    try:
+        return float(ffmpeg.probe(spec)["format"]["duration"])
+    except Exception:
+        return None
+
+
+class SourceCache:
+    """
+    Content-addressed cache of camera sources transcoded once to raw yuv420p at the camera size and frame rate.
+    Local files are addressed by their content, URLs by the URL. The directory is kept under a size limit
+    by evicting the least recently played entries. Videos longer than the frame budget, and sources whose
+    transcode timed out, are remembered as uncacheable so they go straight to live decoding.
+    """
+
+    def __init__(self, width: int, height: int, fps: int, directory: str = CAMERA_CACHE_DIR,
+                 max_bytes: int = CAMERA_CACHE_MAX_MB * 1024 * 1024, max_seconds: int = CAMERA_CACHE_MAX_SECONDS):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.frame_size = width * height * 3 // 2
+        # Digest -> why the source is decoded live instead
+        self.uncacheable: dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._digests: dict[tuple, str] = {}
+        # Digest -> lock held while that source is transcoded
+        self._transcodes: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _digest(self, spec: str) -> str:
+        digest = hashlib.sha256(f"{self.width}x{self.height}@{self.fps}\n".encode())
+        if not os.path.isfile(spec):
+            digest.update(spec.encode())
+            return digest.hexdigest()
+        stat = os.stat(spec)
+        key = (os.path.abspath(spec), stat.st_size, stat.st_mtime_ns, self.width, self.height, self.fps)
+        if key not in self._digests:
+            with open(spec, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+            self._digests[key] = digest.hexdigest()
+        return self._digests[key]
+
+    def entries(self) -> list[tuple[str, os.stat_result]]:
+        """
+        Cached files, least recently used first
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".yuv")]
+        return sorted(((path, os.stat(path)) for path in paths), key=lambda entry: entry[1].st_mtime)
+
+    def _evict(self, keep: str) -> None:
+        entries = self.entries()
+        total = sum(stat.st_size for _, stat in entries)
+        for path, stat in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            os.remove(path)
+            total -= stat.st_size
+            self.evictions += 1
+
+    @property
+    def frame_budget(self) -> int:
+        """
+        Most frames a cached video may have, its length limit or what fits the cache size limit when that is smaller
+        """
+        return min(self.max_seconds * self.fps, self.max_bytes // self.frame_size)
+
+    def _reject(self, digest: str, spec: str, reason: str) -> None:
+        self.uncacheable[digest] = reason
+        raise RuntimeError(f"Not caching {spec}: {reason}")
+
+    def get(self, spec: str, kind: CameraSourceKind, timeout: Optional[float] = None) -> str:
+        """
+        Returns the raw file of a source, transcoding it on first use. Blocking, up to timeout for a transcode.
+        The cache lock only covers lookups and bookkeeping. Transcodes of different sources run side by side,
+        while callers wanting the same source wait for the one transcode running. Raises RuntimeError when the
+        source cannot be cached.
+        """
+        digest = self._digest(spec)
+        path = os.path.join(self.directory, f"{digest}.yuv")
+        with self._lock:
+            transcode_lock = self._transcodes.setdefault(digest, threading.Lock())
+        started = time.monotonic()
+        if not transcode_lock.acquire(timeout=-1 if timeout is None else timeout):
+            raise RuntimeError(f"Transcoding {spec} is still running")
+        try:
+            with self._lock:
+                if digest in self.uncacheable:
+                    raise RuntimeError(f"Not caching {spec}: {self.uncacheable[digest]}")
+                if os.path.exists(path):
+                    # The modification time doubles as the LRU timestamp
+                    os.utime(path)
+                    self.hits += 1
+                    return path
+                self.misses += 1
+                budget = self.frame_budget
+            # Time spent waiting for a transcode of the same source counts against the timeout
+            remaining = None if timeout is None else max(timeout - (time.monotonic() - started), 0.1)
+            self._transcode(spec, kind, digest, path, budget, remaining)
+        finally:
+            transcode_lock.release()
+        with self._lock:
+            self._evict(keep=path)
+        return path
+
+    def _transcode(self, spec: str, kind: CameraSourceKind, digest: str, path: str, budget: int,
+                   timeout: Optional[float]) -> None:
+        if kind == CameraSourceKind.IMAGE:
+            # A still image needs a single frame, playback repeats it
+            limit = 1
+        else:
+            duration = probe_duration(spec)
+            if duration is not None and duration * self.fps > budget:
+                self._reject(digest, spec, f"longer than the {budget / self.fps:.0f}s that fit the cache")
+            # Without a known duration one frame past the budget tells whether the video fits
+            limit = budget + 1
+        os.makedirs(self.directory, exist_ok=True)
+        partial = f"{path}.part"
+        source = ffmpeg.input(spec, loop=1) if kind == CameraSourceKind.IMAGE else ffmpeg.input(spec)
+        process = (
+            camera_frames(source.video, self.width, self.height, self.fps)
+            .output(partial, f="rawvideo", pix_fmt="yuv420p", frames=limit)
+            .global_args("-hide_banner", "-loglevel", "error", "-nostdin")
+            .overwrite_output()
+            .run_async(pipe_stderr=True)
+        )
+        try:
+            _, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            if os.path.exists(partial):
+                os.remove(partial)
+            self._reject(digest, spec, f"transcoding took longer than {timeout:.0f}s")
+        if process.returncode != 0:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise RuntimeError(f"Transcoding {spec} failed: {stderr.decode(errors='replace').strip()}")
+        if os.path.getsize(partial) > budget * self.frame_size:
+            os.remove(partial)
+            self._reject(digest, spec, f"longer than the {budget / self.fps:.0f}s that fit the cache")
+        os.replace(partial, path)
+
+    def stats(self) -> dict:
+        entries = self.entries()
+        return {
+            "directory": self.directory,
+            "entries": len(entries),
+            "bytes": sum(stat.st_size for _, stat in entries),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "frame_budget": self.frame_budget,
+            "uncacheable": len(self.uncacheable),
+        }
+
+
+class CameraStreamer:
+    """
+    Feeds the virtual camera from a single long-lived ffmpeg sink process reading raw frames on stdin.
+    Sources are decoded by their own ffmpeg processes and swapped by the pump thread without touching the sink,
+    so the camera never goes dark. The next source is started and pre-buffered before the swap.
+    A supervisor restarts the sink or the source when their ffmpeg process dies.
+    """
+
+    def __init__(self, output: str = CAMERA_OUTPUT, width: int = CAMERA_WIDTH, height: int = CAMERA_HEIGHT,
+                 fps: int = CAMERA_FPS, cache_enabled: bool = CAMERA_CACHE_ENABLED):
+        self.output = output
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.frame_size = width * height * 3 // 2
+        self.cache = SourceCache(width, height, fps) if cache_enabled else None
+        self.source: Optional[FrameSource] = None
+        self.sink: Optional[subprocess.Popen] = None
+        self.sink_progress: dict[str, str] = {}
+        self.sink_errors: deque[str] = deque(maxlen=20)
+        self.frames_written = 0
+        self.frames_repeated = 0
+        self.frames_late = 0
+        self.write_errors = 0
+        self.restarts = {"sink": 0, "source": 0}
+        self.running = False
+        self._last_frame: Optional[bytes] = None
+        self._lock = threading.Lock()
+
+    def make_source(self, spec: str, kind: Optional[CameraSourceKind] = None, cache: bool = True,
+                    timeout: Optional[float] = None) -> FrameSource:
+        """
+        Plays videos and images from the transcode cache when enabled, decoding live only when caching fails
+        """
+        kind = kind or detect_source_kind(spec)
+        if cache and self.cache and kind != CameraSourceKind.PATTERN:
+            try:
+                return RawFileSource(spec, self.cache.get(spec, kind, timeout), self.frame_size, self.fps, kind)
+            except Exception as e:
+                print(f"Error caching camera source {spec}, decoding it live: {e}")
+        return FfmpegSource(spec, kind, self.width, self.height, self.fps)
+
+    def _output(self, frames):
+        if self.output == "null":
+            return frames.output("-", f="null")
+        if self.output.startswith("file:"):
+            return frames.output(self.output[len("file:"):], vcodec="libx264", preset="ultrafast", pix_fmt="yuv420p")
+        return frames.output(self.output, f="v4l2", vcodec="rawvideo", pix_fmt="yuv420p")
+
+    def _start_sink(self) -> None:
+        frames = ffmpeg.input("pipe:0", f="rawvideo", pix_fmt="yuv420p", s=f"{self.width}x{self.height}",
+                              r=self.fps)
+        self.sink = (
+            self._output(frames)
+            .global_args("-hide_banner", "-loglevel", "error", "-progress", "pipe:2", "-stats_period", "1")
+            .overwrite_output()
+            .run_async(pipe_stdin=True, pipe_stderr=True)
+        )
+        threading.Thread(target=self._read_sink_progress, args=(self.sink,), name="camera-sink-log",
+                         daemon=True).start()
+
+    def _read_sink_progress(self, sink: subprocess.Popen) -> None:
+        # -progress prints key=value blocks, everything else on stderr is an error message
+        for raw in sink.stderr:
+            line = raw.decode(errors="replace").strip()
+            key, separator, value = line.partition("=")
+            if separator and " " not in key:
+                self.sink_progress[key] = value
+            elif line:
+                self.sink_errors.append(line)
+
+    def start(self, spec: str, kind: Optional[CameraSourceKind] = None, cache: bool = True,
+              timeout: float = 15) -> None:
+        """
+        Starts the sink and the pump with an initial source. Blocking until the source delivered its first frame.
+        """
+        with self._lock:
+            if self.running:
+                return
+            self._start_sink()
+            self.running = True
+        threading.Thread(target=self._pump, name="camera-pump", daemon=True).start()
+        threading.Thread(target=self._supervise, name="camera-supervisor", daemon=True).start()
+        self.switch(spec, kind, cache, timeout)
+
+    def switch(self, spec: str, kind: Optional[CameraSourceKind] = None, cache: bool = True,
+               timeout: float = 15) -> None:
+        """
+        Swaps the camera to a new source once it delivered its first frame, the old one keeps playing until then.
+        A source transcoded into the cache for the first time plays once the transcode finished.
+        Blocking. Raises RuntimeError when the source fails or stays silent past the timeout.
+        """
+        deadline = time.monotonic() + timeout
+        # A transcode running out of time is abandoned for live decoding within the same timeout
+        source = self.make_source(spec, kind, cache, timeout / 2)
+        source.start()
+        if not source.first_frame.wait(max(0.0, deadline - time.monotonic())):
+            source.stop()
+            raise RuntimeError(source.error or f"No frame from {spec} within {timeout}s")
+        with self._lock:
+            previous, self.source = self.source, source
+        if previous:
+            previous.stop()
+        print(f"Camera source switched to {spec}")
+
+    def _pump(self) -> None:
+        interval = 1 / self.fps
+        # Black in yuv420p: luma 16, chroma 128
+        black = bytes([16]) * (self.width * self.height) + bytes([128]) * (self.width * self.height // 2)
+        next_tick = time.monotonic()
+        while self.running:
+            source = self.source
+            frame, new = source.take() if source else (None, False)
+            if frame is None:
+                frame = self._last_frame or black
+            if not new:
+                self.frames_repeated += 1
+            self._last_frame = frame
+            try:
+                self.sink.stdin.write(frame)
+                self.sink.stdin.flush()
+                self.frames_written += 1
+            except (BrokenPipeError, ValueError, OSError):
+                # Sink died, the supervisor restarts it
+                self.write_errors += 1
+            next_tick += interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -interval:
+                self.frames_late += 1
+                next_tick = time.monotonic()
+
+    def _supervise(self, interval: float = 1) -> None:
+        failures = 0
+        while self.running:
+            # Back off while a source keeps failing to restart
+            time.sleep(min(30, interval * 2 ** failures))
+            if not self.running:
+                break
+            if self.sink.poll() is not None:
+                print(f"Camera sink exited with code {self.sink.returncode}, restarting it")
+                self.restarts["sink"] += 1
+                self._start_sink()
+            source = self.source
+            if source and source.finished.is_set():
+                print(f"Camera source {source.spec} stopped ({source.error}), restarting it")
+                self.restarts["source"] += 1
+                try:
+                    self.switch(source.spec, source.kind, isinstance(source, RawFileSource))
+                    failures = 0
+                except Exception as e:
+                    failures += 1
+                    print(f"Error restarting camera source {source.spec}: {e}")
+
+    def stop(self) -> None:
+        with self._lock:
+            if not self.running:
+                return
+            self.running = False
+            source, self.source = self.source, None
+        if source:
+            source.stop()
+        try:
+            self.sink.stdin.close()
+            self.sink.wait(5)
+        except Exception:
+            self.sink.kill()
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "output": self.output,
+            "width": self.width,
+            "height": self.height,
+            "fps": self.fps,
+            "source": self.source.stats() if self.source else None,
+            "frames_written": self.frames_written,
+            "frames_repeated": self.frames_repeated,
+            "frames_late": self.frames_late,
+            "write_errors": self.write_errors,
+            "restarts": self.restarts,
+            "cache": self.cache.stats() if self.cache else None,
+            "sink": {
+                "alive": self.sink is not None and self.sink.poll() is None,
+                "fps": self.sink_progress.get("fps"),
+                "frame": self.sink_progress.get("frame"),
+                "drop_frames": self.sink_progress.get("drop_frames"),
+                "dup_frames": self.sink_progress.get("dup_frames"),
+                "speed": self.sink_progress.get("speed"),
+                "errors": list(self.sink_errors),
+            },
+        }
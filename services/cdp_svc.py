@@ -0,0 +1,196 @@
+import asyncio
+import itertools
+import json
+import urllib.request
+from typing import Any, Awaitable, Callable, Optional
+
+from websockets.asyncio.client import ClientConnection, connect
+from websockets.exceptions import ConnectionClosed
+
+# Name of the Runtime binding the in-page observer calls to push events to Python
+EVENT_BINDING = "__meetbotEmit"
+
+
+class CDPError(Exception):
+    """
+    Raised when a DevTools protocol command returns an error
+    """
+
+
+def page_websocket_url(address: str, target_id: str) -> str:
+    """
+    Looks up the DevTools websocket URL of a page target from Chrome's debugger address, see DriverLease.
+    Only talks to Chrome's HTTP endpoint, never to the driver. Blocking.
+    """
+    with urllib.request.urlopen(f"http://{address}/json/list", timeout=5) as response:
+        targets = json.load(response)
+    pages = [target for target in targets if target.get("type") == "page"]
+    for target in pages:
+        if target.get("id") == target_id:
+            return target["webSocketDebuggerUrl"]
+    if pages:
+        return pages[0]["webSocketDebuggerUrl"]
+    raise CDPError(f"No page target found at {address}")
+
+
+class CDPConnection:
+    """
+    Minimal DevTools protocol client for a page target.
+    Used alongside Selenium for what WebDriver cannot do, like receiving CDP events as they happen.
+    """
+
+    def __init__(self, ws_url: str):
+        self.ws_url = ws_url
+        self._ws: Optional[ClientConnection] = None
+        self._ids = itertools.count(1)
+        self._pending: dict[int, asyncio.Future] = {}
+        self._listeners: dict[str, list[Callable[[dict], Any]]] = {}
+        self._reader: Optional[asyncio.Task] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._reader is not None and not self._reader.done()
+
+    async def connect(self) -> None:
+        self._ws = await connect(self.ws_url, max_size=None, ping_interval=None)
+        self._reader = asyncio.create_task(self._read_loop())
+
+    def on(self, event: str, callback: Callable[[dict], Any]) -> None:
+        """
+        Registers a callback (plain or async) for a CDP event, called in arrival order
+        """
+        self._listeners.setdefault(event, []).append(callback)
+
+    async def send(self, method: str, params: Optional[dict] = None, timeout: float = 10) -> dict:
+        if not self.connected:
+            raise CDPError("DevTools connection is closed")
+        command_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[command_id] = future
+        try:
+            await self._ws.send(json.dumps({"id": command_id, "method": method, "params": params or {}}))
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(command_id, None)
+
+    async def send_nowait(self, method: str, params: Optional[dict] = None) -> None:
+        """
+        Sends a command without waiting for its response. Event callbacks must use this,
+        they run on the reader that would deliver the response.
+        """
+        if not self.connected:
+            raise CDPError("DevTools connection is closed")
+        await self._ws.send(json.dumps({"id": next(self._ids), "method": method, "params": params or {}}))
+
+    async def wait_closed(self) -> None:
+        if self._reader:
+            await asyncio.shield(self._reader)
+
+    async def close(self) -> None:
+        if self._ws:
+            await self._ws.close()
+        if self._reader:
+            await asyncio.gather(self._reader, return_exceptions=True)
+
+    async def _read_loop(self) -> None:
+        try:
+            async for raw in self._ws:
+                message = json.loads(raw)
+                if "id" in message:
+                    future = self._pending.get(message["id"])
+                    if future and not future.done():
+                        if "error" in message:
+                            future.set_exception(CDPError(message["error"].get("message")))
+                        else:
+                            future.set_result(message.get("result", {}))
+                    continue
+                for callback in self._listeners.get(message.get("method"), []):
+                    try:
+                        result = callback(message.get("params", {}))
+                        if asyncio.iscoroutine(result):
+                            await result
+                    except Exception as e:
+                        print(f"Error handling CDP event {message.get('method')}: {e}")
+        except ConnectionClosed:
+            pass
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(CDPError("DevTools connection closed"))
+
+
+class PageEventStream:
+    """
+    Receives the events the in-page mutation observer pushes through the EVENT_BINDING Runtime binding,
+    reconnecting to the page target if the DevTools connection drops
+    """
+
+    def __init__(self, address: str, target_id: str, on_event: Callable[[dict], Awaitable[None]],
+                 reconnect_delay: float = 1):
+        self.address = address
+        self.target_id = target_id
+        self.on_event = on_event
+        self.reconnect_delay = reconnect_delay
+        self.connection: Optional[CDPConnection] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopped = False
+
+    @property
+    def connected(self) -> bool:
+        return self.connection is not None and self.connection.connected
+
+    async def _on_binding_called(self, params: dict) -> None:
+        if params.get("name") != EVENT_BINDING:
+            return
+        await self.on_event(json.loads(params["payload"]))
+
+    async def _connect(self) -> None:
+        ws_url = await asyncio.to_thread(page_websocket_url, self.address, self.target_id)
+        connection = CDPConnection(ws_url)
+        await connection.connect()
+        connection.on("Runtime.bindingCalled", self._on_binding_called)
+        try:
+            await connection.send("Runtime.enable")
+            # Bindings added without an execution context survive reloads and navigations
+            await connection.send("Runtime.addBinding", {"name": EVENT_BINDING})
+            await connection.send("Performance.enable")
+        except Exception:
+            await connection.close()
+            raise
+        self.connection = connection
+
+    async def _supervise(self) -> None:
+        while not self._stopped:
+            await self.connection.wait_closed()
+            while not self._stopped:
+                await asyncio.sleep(self.reconnect_delay)
+                try:
+                    await self._connect()
+                    break
+                except Exception as e:
+                    print(f"Error reconnecting page event stream: {e}")
+
+    async def start(self) -> None:
+        """
+        Connects to the page, then keeps the stream up from a background task
+        """
+        await self._connect()
+        self._task = asyncio.create_task(self._supervise())
+
+    async def performance_metrics(self, timeout: float = 2) -> dict[str, float]:
+        """
+        Page metrics from Performance.getMetrics (JSHeapUsedSize, Nodes, TaskDuration, ...), read over the
+        event stream's connection so they never wait behind the session's browser commands
+        """
+        if not self.connected:
+            raise CDPError("DevTools connection is closed")
+        result = await self.connection.send("Performance.getMetrics", timeout=timeout)
+        return {metric["name"]: metric["value"] for metric in result.get("metrics", [])}
+
+    async def stop(self) -> None:
+        self._stopped = True
+        if self.connection:
+            await self.connection.close()
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
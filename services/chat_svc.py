@@ -0,0 +1,162 @@
+import json
+import os
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Optional
+from urllib.parse import urlparse
+
+from helpers.config import CHAT_DIR
+
+WORD_RE = re.compile(r"\w+")
+
+
+def meeting_key(meeting_url: str) -> str:
+    """
+    File name safe key of a meeting, its code for Meet URLs (abc-defg-hij)
+    """
+    path = urlparse(meeting_url).path.strip("/").lower()
+    key = re.sub(r"[^a-z0-9-]+", "_", path or meeting_url.lower()).strip("_")
+    return key or "meeting"
+
+
+class ChatStore:
+    """
+    Chat transcript of one meeting. Messages are appended to a JSON lines file and indexed in memory
+    by sequence number, sender and words, so queries never scan the whole transcript.
+    The file is replayed into the index when the store is opened again, e.g. after a restart or rejoin.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.messages: list[dict] = []
+        self.seqs: list[int] = []
+        # Positions in messages, ascending
+        self.by_sender: dict[str, list[int]] = {}
+        self.by_word: dict[str, list[int]] = {}
+        self.message_ids: set[str] = set()
+        self._lock = threading.Lock()
+        self._file = None
+        self._restore()
+
+    def _restore(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self._index(json.loads(line))
+                    except ValueError:
+                        # Torn last line of a crashed run
+                        continue
+        except FileNotFoundError:
+            pass
+
+    def _index(self, message: dict) -> None:
+        position = len(self.messages)
+        self.messages.append(message)
+        self.seqs.append(message["seq"])
+        if message.get("message_id"):
+            self.message_ids.add(message["message_id"])
+        self.by_sender.setdefault((message.get("sender") or "").lower(), []).append(position)
+        for word in set(WORD_RE.findall(message["text"].lower())):
+            self.by_word.setdefault(word, []).append(position)
+
+    def append(self, text: str, sender: Optional[str], message_id: Optional[str] = None,
+               sent_at: Optional[str] = None, session_id: Optional[str] = None) -> Optional[dict]:
+        """
+        Stores a message and returns it with its sequence number, or None when the message id was already stored
+        """
+        with self._lock:
+            if message_id and message_id in self.message_ids:
+                return None
+            message = {
+                "seq": self.seqs[-1] + 1 if self.seqs else 1,
+                "message_id": message_id,
+                "sender": sender,
+                "text": text,
+                "sent_at": sent_at,
+                "received_at": datetime.now().isoformat(),
+                "session_id": session_id,
+            }
+            if self._file is None:
+                # Created with the first message, meetings without chat leave no file behind
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(json.dumps(message) + "\n")
+            self._file.flush()
+            self._index(message)
+            return message
+
+    def query(self, since: Optional[int] = None, sender: Optional[str] = None, q: Optional[str] = None,
+              limit: int = 100) -> list[dict]:
+        """
+        Returns messages after a sequence number, from a sender (case insensitive) and containing
+        all words of q (whole words, case insensitive), oldest first
+        """
+        with self._lock:
+            start = bisect_right(self.seqs, since) if since is not None else 0
+            postings = []
+            if sender is not None:
+                postings.append(self.by_sender.get(sender.lower(), []))
+            for word in set(WORD_RE.findall(q.lower())) if q else ():
+                postings.append(self.by_word.get(word, []))
+            if not postings:
+                return self.messages[start:start + limit]
+            # Posting lists are ascending, only their part after since is intersected
+            postings = sorted((positions[bisect_left(positions, start):] for positions in postings), key=len)
+            candidates = set(postings[0])
+            for positions in postings[1:]:
+                candidates.intersection_update(positions)
+            return [self.messages[position] for position in sorted(candidates)[:limit]]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "messages": len(self.messages),
+            "senders": len(self.by_sender),
+            "words": len(self.by_word),
+            "last_seq": self.seqs[-1] if self.seqs else 0,
+        }
+
+
+_stores: dict[str, ChatStore] = {}
+# Sessions holding each store, see release_chat_store
+_holders: dict[str, set[str]] = {}
+_stores_lock = threading.Lock()
+
+
+def open_chat_store(meeting_url: str, holder: str, directory: str = CHAT_DIR) -> ChatStore:
+    """
+    Returns the chat store of a meeting, shared by every session in it, and holds it for a session
+    """
+    path = os.path.join(directory, f"{meeting_key(meeting_url)}.jsonl")
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = ChatStore(path)
+        _holders.setdefault(path, set()).add(holder)
+        return _stores[path]
+
+
+def release_chat_store(store: ChatStore, holder: str) -> None:
+    """
+    Releases a session's hold on a chat store. The last session of a meeting closes the store,
+    the next session joining it replays the transcript file. Releasing twice is a no-op.
+    """
+    with _stores_lock:
+        holders = _holders.get(store.path)
+        if holders is None:
+            return
+        holders.discard(holder)
+        if holders:
+            return
+        del _holders[store.path]
+        if _stores.get(store.path) is store:
+            del _stores[store.path]
+    store.close()
@@ -0,0 +1,278 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from helpers.config import COMMAND_QUEUE_DEPTH, OPERATION_HISTORY_SIZE
+from helpers.metrics import Histogram, LatencyStats
+from helpers.tracing import span
+
+
+class QueueFullError(Exception):
+    """
+    Raised when a driver's command queue is at its maximum depth
+    """
+
+
+class Command:
+    """
+    A browser command waiting for, or running on, a driver's worker thread.
+    Its request_id lets clients correlate the HTTP response, the operation record and the completion event.
+    """
+
+    def __init__(self, name: str, fn: Callable, args: tuple, queue_name: str):
+        self.request_id = uuid.uuid4().hex
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.queue_name = queue_name
+        self.batch_fn: Optional[Callable[[list[tuple]], list]] = None
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.perf_counter()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def status(self) -> str:
+        if self.future.cancelled():
+            return "cancelled"
+        if self.future.done():
+            return "failed" if self.future.exception() else "succeeded"
+        return "running" if self.started_at else "queued"
+
+    @property
+    def result(self) -> Any:
+        return self.future.result() if self.status == "succeeded" else None
+
+    @property
+    def error(self) -> Optional[str]:
+        return str(self.future.exception()) if self.status == "failed" else None
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return round((self.finished_at - self.started_at) * 1000, 3)
+
+    async def wait(self, timeout: float) -> None:
+        """
+        Waits up to timeout seconds for the command to finish, without raising its error
+        """
+        await asyncio.wait([self.future], timeout=timeout)
+
+    def to_dict(self) -> dict:
+        return {
+            "request_id": self.request_id,
+            "command": self.name,
+            "session_id": self.queue_name,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "queue_wait_ms": round((self.started_at - self.enqueued_at) * 1000, 3) if self.started_at else None,
+            "duration_ms": self.duration_ms,
+        }
+
+
+class OperationRegistry:
+    """
+    Bounded lookup of recent commands by request id, evicting the oldest finished ones first
+    """
+
+    def __init__(self, capacity: int = OPERATION_HISTORY_SIZE):
+        self.capacity = capacity
+        self.operations: OrderedDict[str, Command] = OrderedDict()
+
+    def add(self, command: Command) -> None:
+        self.operations[command.request_id] = command
+        while len(self.operations) > self.capacity:
+            finished = next((key for key, op in self.operations.items() if op.future.done()), None)
+            self.operations.pop(finished if finished else next(iter(self.operations)))
+
+    def get(self, request_id: str) -> Optional[Command]:
+        return self.operations.get(request_id)
+
+
+class CommandMetrics:
+    """
+    Counters and duration histograms per command type, shared by the command queues of all sessions
+    so they outlive the sessions that ran the commands
+    """
+
+    def __init__(self):
+        self.issued: dict[str, int] = {}
+        self.completed: dict[str, int] = {}
+        self.failed: dict[str, int] = {}
+        self.rejected: dict[str, int] = {}
+        self.wait_time: dict[str, Histogram] = {}
+        self.run_time: dict[str, Histogram] = {}
+
+    @staticmethod
+    def _count(counters: dict[str, int], name: str) -> None:
+        counters[name] = counters.get(name, 0) + 1
+
+    def issue(self, name: str) -> None:
+        self._count(self.issued, name)
+
+    def reject(self, name: str) -> None:
+        self._count(self.rejected, name)
+
+    def start(self, name: str, wait_seconds: float) -> None:
+        self.wait_time.setdefault(name, Histogram()).observe(wait_seconds)
+
+    def finish(self, name: str, run_seconds: float, failed: bool) -> None:
+        self.run_time.setdefault(name, Histogram()).observe(run_seconds)
+        self._count(self.failed if failed else self.completed, name)
+
+
+class CommandQueue:
+    """
+    Serializes every browser command of one driver on a single dedicated worker thread.
+    Selenium commands from concurrent requests would otherwise interleave on the same browser.
+    Adjacent queued commands of the same name that provide a batch function run together in one call.
+    """
+
+    def __init__(self, name: str, max_depth: int = COMMAND_QUEUE_DEPTH,
+                 registry: Optional[OperationRegistry] = None, metrics: Optional[CommandMetrics] = None):
+        self.name = name
+        self.max_depth = max_depth
+        self.registry = registry
+        self.metrics = metrics or CommandMetrics()
+        self.running: list[Command] = []
+        self.wait_time: dict[str, LatencyStats] = {}
+        self.run_time: dict[str, LatencyStats] = {}
+        self.completed: dict[str, int] = {}
+        self.failed: dict[str, int] = {}
+        self.batched = 0
+        self.rejected = 0
+        self._pending: deque[Command] = deque()
+        self._wakeup = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"driver-{name}")
+        self._worker: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        """
+        Commands waiting plus the ones running
+        """
+        return len(self._pending) + len(self.running)
+
+    def start(self) -> None:
+        self._worker = asyncio.create_task(self._run())
+
+    def submit(self, name: str, fn: Callable, *args: Any, track: bool = True,
+               batch_fn: Optional[Callable[[list[tuple]], list]] = None) -> tuple[Command, int]:
+        """
+        Enqueues a command and returns it with its queue position, the number of commands ahead of it.
+        Tracked commands can be looked up by request id in the registry.
+        With batch_fn, this command and the adjacent queued commands of the same name are run as
+        batch_fn([args, ...]), which returns one result (or exception instance) per command.
+        Raises QueueFullError when the queue is at its maximum depth.
+        """
+        if len(self._pending) >= self.max_depth:
+            self.rejected += 1
+            self.metrics.reject(name)
+            raise QueueFullError(f"Command queue of {self.name} is full ({self.max_depth} commands waiting)")
+        position = self.depth
+        command = Command(name, fn, args, self.name)
+        command.batch_fn = batch_fn
+        self.metrics.issue(name)
+        self._pending.append(command)
+        self._wakeup.set()
+        if track and self.registry is not None:
+            self.registry.add(command)
+        return command, position
+
+    async def run(self, name: str, fn: Callable, *args: Any, track: bool = True) -> Any:
+        """
+        Enqueues a command and waits for its result
+        """
+        command, _ = self.submit(name, fn, *args, track=track)
+        return await command.future
+
+    def _next_batch(self) -> list[Command]:
+        batch = [self._pending.popleft()]
+        if batch[0].batch_fn is not None:
+            while self._pending and self._pending[0].name == batch[0].name and self._pending[0].batch_fn is not None:
+                batch.append(self._pending.popleft())
+        return batch
+
+    def _execute(self, batch: list[Command]) -> list:
+        """
+        Runs a batch on the worker thread, returning one result or exception per command.
+        Each run is the root span of a trace, the steps traced inside the command become its children.
+        """
+        try:
+            with span(f"command/{batch[0].name}", session_id=self.name, request_id=batch[0].request_id,
+                      batch_size=len(batch) if len(batch) > 1 else None):
+                if batch[0].batch_fn is not None:
+                    return batch[0].batch_fn([command.args for command in batch])
+                return [batch[0].fn(*batch[0].args)]
+        except Exception as e:
+            return [e] * len(batch)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            while not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            batch = self.running = self._next_batch()
+            if len(batch) > 1:
+                self.batched += len(batch) - 1
+            started_at = time.perf_counter()
+            for command in batch:
+                command.started_at = started_at
+                self.wait_time.setdefault(command.name, LatencyStats()).observe(started_at - command.enqueued_at)
+                self.metrics.start(command.name, started_at - command.enqueued_at)
+            try:
+                results = await loop.run_in_executor(self._executor, self._execute, batch)
+            except asyncio.CancelledError:
+                for command in batch:
+                    command.future.cancel()
+                raise
+            finished_at = time.perf_counter()
+            for command, result in zip(batch, results):
+                command.finished_at = finished_at
+                self.run_time.setdefault(command.name, LatencyStats()).observe(finished_at - started_at)
+                if command.future.done():
+                    continue
+                self.metrics.finish(command.name, finished_at - started_at, isinstance(result, Exception))
+                if isinstance(result, Exception):
+                    self.failed[command.name] = self.failed.get(command.name, 0) + 1
+                    command.future.set_exception(result)
+                else:
+                    self.completed[command.name] = self.completed.get(command.name, 0) + 1
+                    command.future.set_result(result)
+            self.running = []
+
+    async def stop(self) -> None:
+        """
+        Stops the worker and cancels every command still waiting. A running command finishes on its thread.
+        """
+        if self._worker:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+        while self._pending:
+            self._pending.popleft().future.cancel()
+        self.running = []
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "running": [command.name for command in self.running],
+            "batched": self.batched,
+            "rejected": self.rejected,
+            "commands": {
+                name: {
+                    "completed": self.completed.get(name, 0),
+                    "failed": self.failed.get(name, 0),
+                    "wait_seconds": self.wait_time[name].to_dict(),
+                    "run_seconds": self.run_time.get(name, LatencyStats()).to_dict(),
+                }
+                for name in self.wait_time
+            },
+        }
@@ -0,0 +1,260 @@
+import asyncio
+import json
+import time
+from collections import deque
+from datetime import datetime
+from typing import Optional
+
+from fastapi import WebSocket
+
+from helpers.config import SUBSCRIBER_QUEUE_SIZE, SLOW_SUBSCRIBER_POLICY, EVENT_LOG_SIZE, EVENT_LOG_FILE
+from helpers.metrics import Histogram
+
+
+class EventLog:
+    """
+    Numbers every broadcast event with a monotonic sequence number and keeps the latest ones in a bounded ring,
+    so reconnecting clients can replay what they missed. Optionally appends every event to a JSON lines file,
+    which also restores the ring and the sequence after a restart.
+    """
+
+    def __init__(self, capacity: int = EVENT_LOG_SIZE, path: str = EVENT_LOG_FILE):
+        self.capacity = capacity
+        self.path = path
+        self.seq = 0
+        # (seq, type, session_id, serialized event)
+        self.events: deque[tuple[int, str, Optional[str], str]] = deque(maxlen=capacity)
+        self._file = None
+        if path:
+            self._restore()
+            self._file = open(path, "a", encoding="utf-8")
+
+    def _restore(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        message = json.loads(line)
+                    except ValueError:
+                        # Torn last line of a crashed run
+                        continue
+                    self.events.append((message["seq"], message.get("type"), message.get("session_id"), line.rstrip("\n")))
+                    self.seq = message["seq"]
+        except FileNotFoundError:
+            pass
+
+    def append(self, message: dict) -> str:
+        """
+        Assigns the next sequence number to an event, stores it and returns it serialized
+        """
+        self.seq += 1
+        message["seq"] = self.seq
+        text = json.dumps(message)
+        self.events.append((self.seq, message.get("type"), message.get("session_id"), text))
+        if self._file:
+            self._file.write(text + "\n")
+            self._file.flush()
+        return text
+
+    @property
+    def oldest_seq(self) -> int:
+        return self.events[0][0] if self.events else self.seq + 1
+
+    def since(self, seq: int) -> list[tuple[int, str, Optional[str], str]]:
+        """
+        Returns the stored events after a sequence number, oldest first
+        """
+        if seq >= self.seq:
+            return []
+        return [entry for entry in self.events if entry[0] > seq]
+
+    def close(self) -> None:
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+class Subscriber:
+    """
+    A WebSocket client of the event stream with its own bounded outbound queue, drained by a dedicated sender task.
+    A client that cannot keep up either loses its oldest queued events or gets disconnected, depending on the policy.
+    """
+
+    def __init__(self, websocket: WebSocket, session_id: Optional[str] = None,
+                 max_queue: int = SUBSCRIBER_QUEUE_SIZE, policy: str = SLOW_SUBSCRIBER_POLICY,
+                 types: Optional[set[str]] = None, delivery_time: Optional[Histogram] = None):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.types = types
+        self.max_queue = max_queue
+        self.policy = policy
+        self.sent = 0
+        self.dropped = 0
+        self.closed = asyncio.Event()
+        # Time from queueing an event until it was written to the socket
+        self.delivery_time = delivery_time or Histogram()
+        # (serialized event, queued at)
+        self._queue: deque[tuple[str, float]] = deque()
+        self._pending = asyncio.Event()
+        self._sender: Optional[asyncio.Task] = None
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def wants(self, session_id: Optional[str], event_type: Optional[str]) -> bool:
+        if self.types is not None and event_type not in self.types:
+            return False
+        # Subscribers of one session only get that session's events and pool-wide ones
+        return not (self.session_id and session_id and self.session_id != session_id)
+
+    def push(self, text: str, replay: bool = False) -> bool:
+        """
+        Queues a serialized event without waiting. Returns False when the subscriber has to be disconnected.
+        Replayed events are never dropped, the event log bounds them.
+        """
+        if self.closed.is_set():
+            return False
+        if len(self._queue) >= self.max_queue and not replay:
+            if self.policy == "disconnect":
+                return False
+            self._queue.popleft()
+            self.dropped += 1
+        self._queue.append((text, time.perf_counter()))
+        self._pending.set()
+        return True
+
+    def start(self) -> None:
+        self._sender = asyncio.create_task(self._send_loop())
+
+    async def _send_loop(self) -> None:
+        try:
+            while True:
+                while not self._queue:
+                    self._pending.clear()
+                    await self._pending.wait()
+                text, queued_at = self._queue.popleft()
+                await self.websocket.send_text(text)
+                self.delivery_time.observe(time.perf_counter() - queued_at)
+                self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error sending event to subscriber, disconnecting it: {e}")
+        finally:
+            self.closed.set()
+
+    async def close(self, code: int = 1000, reason: str = "") -> None:
+        self.closed.set()
+        if self._sender:
+            self._sender.cancel()
+            await asyncio.gather(self._sender, return_exceptions=True)
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except Exception:
+            # Already closed by the client
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "types": sorted(self.types) if self.types is not None else None,
+            "queued": self.queued,
+            "sent": self.sent,
+            "dropped": self.dropped,
+        }
+
+
+class ConnectionManager:
+    """
+    Fans events out to WebSocket subscribers. Each event is logged, serialized once and queued per subscriber,
+    so a slow or stalled client never delays the others; dead clients are evicted.
+    """
+
+    def __init__(self, max_queue: int = SUBSCRIBER_QUEUE_SIZE, policy: str = SLOW_SUBSCRIBER_POLICY,
+                 log: Optional[EventLog] = None):
+        self.max_queue = max_queue
+        self.policy = policy
+        self.log = log or EventLog()
+        self.subscribers: dict[WebSocket, Subscriber] = {}
+        self.evicted = 0
+        self.broadcasts: dict[str, int] = {}
+        # Logging, serializing and queueing one event for every subscriber
+        self.broadcast_time = Histogram()
+        self.delivery_time = Histogram()
+
+    async def connect(self, websocket: WebSocket, session_id: Optional[str] = None, since: Optional[int] = None,
+                      types: Optional[set[str]] = None) -> Subscriber:
+        """
+        Registers a subscriber. With since, the logged events after that sequence number are replayed first;
+        nothing can be broadcast in between, so replay and live events neither overlap nor leave a gap.
+        """
+        await websocket.accept()
+        subscriber = Subscriber(websocket, session_id, self.max_queue, self.policy, types, self.delivery_time)
+        subscriber.start()
+        self.send(subscriber, {
+            "type": "connection_established",
+            "timestamp": datetime.now().isoformat(),
+            "seq": self.log.seq,
+            "data": "Connected to MeetBot events stream"
+        })
+        if since is not None:
+            # A since past the current seq was numbered by an earlier run without an event log file,
+            # the new numbering would otherwise look like events the client already saw
+            reset = since > self.log.seq
+            if reset or since + 1 < self.log.oldest_seq:
+                self.send(subscriber, {
+                    "type": "replay_truncated",
+                    "timestamp": datetime.now().isoformat(),
+                    "data": {"since": since, "oldest_seq": self.log.oldest_seq, "seq": self.log.seq, "reset": reset}
+                })
+            for _, event_type, event_session_id, text in self.log.since(since):
+                if subscriber.wants(event_session_id, event_type):
+                    subscriber.push(text, replay=True)
+        self.subscribers[websocket] = subscriber
+        return subscriber
+
+    def disconnect(self, websocket: WebSocket) -> None:
+        subscriber = self.subscribers.pop(websocket, None)
+        if subscriber:
+            subscriber.closed.set()
+            asyncio.get_running_loop().create_task(subscriber.close())
+
+    def send(self, subscriber: Subscriber, message: dict) -> None:
+        """
+        Queues a message for a single subscriber
+        """
+        if not subscriber.push(json.dumps(message)):
+            self._evict(subscriber)
+
+    def _evict(self, subscriber: Subscriber) -> None:
+        if self.subscribers.pop(subscriber.websocket, None) is None:
+            return
+        self.evicted += 1
+        reason = "Too slow, event queue overflowed" if not subscriber.closed.is_set() else ""
+        subscriber.closed.set()
+        asyncio.get_running_loop().create_task(subscriber.close(code=1008, reason=reason))
+
+    async def broadcast(self, message: dict) -> None:
+        started = time.perf_counter()
+        session_id, event_type = message.get("session_id"), message.get("type")
+        text = self.log.append(message)
+        for subscriber in list(self.subscribers.values()):
+            if not subscriber.wants(session_id, event_type):
+                continue
+            if not subscriber.push(text):
+                self._evict(subscriber)
+        self.broadcasts[event_type] = self.broadcasts.get(event_type, 0) + 1
+        self.broadcast_time.observe(time.perf_counter() - started)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "seq": self.log.seq,
+            "logged": len(self.log.events),
+            "max_queue": self.max_queue,
+            "policy": self.policy,
+            "evicted": self.evicted,
+            "dropped": sum(subscriber.dropped for subscriber in self.subscribers.values()),
+            "queued": sum(subscriber.queued for subscriber in self.subscribers.values()),
+        }
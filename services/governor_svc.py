@@ -0,0 +1,175 @@
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+from helpers.config import GOVERNOR_PSS_MB, GOVERNOR_HEAP_MB, GOVERNOR_COOLDOWN, GOVERNOR_LAYOUT
+from helpers.utils import scope_mutation_observer
+from models.models import Layout
+from services.command_svc import QueueFullError
+from services.meet_svc import change_meeting_layout, disable_incoming_video
+from services.metrics_svc import browser_stats
+from services.session_svc import Session
+
+# Mitigations in the order they are applied, each one more disruptive than the previous
+STAGES = ("lighter_layout", "incoming_video_off", "scoped_observer", "rejoin")
+
+
+class GovernorState:
+    """
+    Memory samples and applied mitigations of one session
+    """
+
+    def __init__(self):
+        # Number of stages applied since the browser was (re)launched
+        self.stage = 0
+        self.pss_bytes = 0
+        self.heap_bytes = 0
+        self.sampled_at: Optional[float] = None
+        self.acted_at: Optional[float] = None
+        self.rejoins = 0
+        # Set by a rejoin until the first sample after its cooldown tells whether it helped
+        self.rejoined = False
+        # Set when a rejoin did not help, no further mitigations are applied
+        self.halted = False
+        self.actions: deque[dict] = deque(maxlen=20)
+
+    def to_dict(self) -> dict:
+        return {
+            "stage": STAGES[self.stage - 1] if self.stage else None,
+            "pss_mb": round(self.pss_bytes / 1024 / 1024, 1),
+            "heap_mb": round(self.heap_bytes / 1024 / 1024, 1),
+            "rejoins": self.rejoins,
+            "halted": self.halted,
+            "actions": list(self.actions),
+        }
+
+
+class MemoryGovernor:
+    """
+    Samples the Chrome process tree PSS and the page's JS heap of every session in a meeting, and applies
+    staged mitigations as thresholds are crossed: a lighter layout, no incoming video, an observer scoped
+    to the containers it needs, and as a last resort a rejoin in a fresh browser under the same session id.
+    One stage is applied per check, at most once per cooldown, so the effect of a stage is measured
+    before the next one is taken. A stage that failed is retried after the cooldown.
+    Mitigations live in the page, a rejoin starts over from the first stage. When memory is still above
+    the first threshold after a rejoin, rejoining again would not help either and the session is left alone.
+    """
+
+    def __init__(self, pss_mb: list[int] = GOVERNOR_PSS_MB, heap_mb: list[int] = GOVERNOR_HEAP_MB,
+                 cooldown: float = GOVERNOR_COOLDOWN, layout: str = GOVERNOR_LAYOUT):
+        if len(pss_mb) != len(STAGES) or len(heap_mb) != len(STAGES):
+            raise ValueError(f"Memory governor needs one threshold per stage ({', '.join(STAGES)})")
+        self.pss_limits = [mb * 1024 * 1024 for mb in pss_mb]
+        self.heap_limits = [mb * 1024 * 1024 for mb in heap_mb]
+        self.cooldown = cooldown
+        self.layout = Layout(layout)
+        self.sessions: dict[str, GovernorState] = {}
+
+    def level(self, pss_bytes: int, heap_bytes: int) -> int:
+        """
+        Number of stages whose PSS or heap threshold is crossed
+        """
+        return max(
+            sum(1 for limit in self.pss_limits if pss_bytes >= limit),
+            sum(1 for limit in self.heap_limits if heap_bytes >= limit),
+        )
+
+    async def check(self, session: Session, rejoin: Callable[[Session], Awaitable[None]]) -> Optional[dict]:
+        """
+        Samples a session and applies the next mitigation when its memory calls for it.
+        Returns the action taken, or None.
+        """
+        state = self.sessions.setdefault(session.session_id, GovernorState())
+        stats = await browser_stats(session)
+        state.pss_bytes = stats["process"].get("pss_bytes", 0)
+        state.heap_bytes = int(stats["page"].get("JSHeapUsedSize", 0))
+        state.sampled_at = time.monotonic()
+        if state.halted:
+            return None
+
+        level = self.level(state.pss_bytes, state.heap_bytes)
+        cooling_down = state.acted_at is not None and state.sampled_at - state.acted_at < self.cooldown
+        if state.rejoined and not cooling_down:
+            state.rejoined = False
+            if level:
+                state.halted = True
+                action = self._action("halt", state)
+                print(f"Memory governor giving up on session {session.session_id}, still at PSS {action['pss_mb']} MB, "
+                      f"JS heap {action['heap_mb']} MB after a rejoin")
+                state.actions.append(action)
+                return action
+        if level <= state.stage or cooling_down:
+            await self._maintain(session, state)
+            return None
+
+        stage = STAGES[state.stage]
+        action = self._action(stage, state)
+        print(f"Memory governor applying {stage} to session {session.session_id} "
+              f"(PSS {action['pss_mb']} MB, JS heap {action['heap_mb']} MB)")
+        try:
+            action["result"] = await self._apply(session, stage, rejoin)
+        except QueueFullError:
+            # Driver is saturated with user commands, the next check tries again
+            return None
+        except Exception as e:
+            # The stage is not taken, it is retried once the cooldown is over
+            print(f"Error applying {stage} to session {session.session_id}: {e}")
+            action["error"] = str(e)
+        state.acted_at = time.monotonic()
+        state.actions.append(action)
+        if action["error"] is not None:
+            return action
+        state.stage += 1
+        if stage == "rejoin":
+            state.stage = 0
+            state.rejoins += 1
+            state.rejoined = True
+        return action
+
+    @staticmethod
+    def _action(stage: str, state: GovernorState) -> dict:
+        return {
+            "stage": stage,
+            "pss_mb": round(state.pss_bytes / 1024 / 1024, 1),
+            "heap_mb": round(state.heap_bytes / 1024 / 1024, 1),
+            "error": None,
+        }
+
+    async def _apply(self, session: Session, stage: str, rejoin: Callable[[Session], Awaitable[None]]):
+        if stage == "lighter_layout":
+            return await session.commands.run("change_layout", change_meeting_layout, session.driver, self.layout,
+                                              track=False)
+        if stage == "incoming_video_off":
+            return await session.commands.run("disable_incoming_video", disable_incoming_video, session.driver,
+                                              track=False)
+        if stage == "scoped_observer":
+            return await session.commands.run("scope_observer", scope_mutation_observer, session.driver, track=False)
+        await rejoin(session)
+        return None
+
+    async def _maintain(self, session: Session, state: GovernorState) -> None:
+        """
+        Re-applies the in-page mitigations to video tiles and panels added since they were taken
+        """
+        try:
+            if state.stage >= 2:
+                await session.commands.run("disable_incoming_video", disable_incoming_video, session.driver,
+                                           track=False)
+            if state.stage >= 3:
+                await session.commands.run("scope_observer", scope_mutation_observer, session.driver, track=False)
+        except Exception as e:
+            print(f"Error re-applying memory mitigations to session {session.session_id}: {e}")
+
+    def forget(self, session_id: str) -> None:
+        self.sessions.pop(session_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "stages": [
+                {"stage": stage, "pss_mb": pss // 1024 // 1024, "heap_mb": heap // 1024 // 1024}
+                for stage, pss, heap in zip(STAGES, self.pss_limits, self.heap_limits)
+            ],
+            "cooldown_seconds": self.cooldown,
+            "layout": self.layout.value,
+            "sessions": {session_id: state.to_dict() for session_id, state in self.sessions.items()},
+        }
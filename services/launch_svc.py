@@ -1,8 +1,24 @@
+import os
+import shutil
+import threading
+import time
+import uuid
 import undetected_chromedriver as uc
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
-def launch_webdriver(headless: bool = False) -> uc.Chrome:
+from helpers.config import HEADLESS, PROFILE_ROOT, WARM_POOL_SIZE, DRIVER_MAX_SESSIONS, DRIVER_MAX_PSS_MB
+from helpers.metrics import LatencyStats
+from helpers.procstats import process_tree_pss_bytes
+
+# undetected_chromedriver patches a shared chromedriver binary on every start,
+# concurrent launches must not race on it
+_launch_lock = threading.Lock()
+
+def launch_webdriver(headless: bool = False, user_data_dir: Optional[str] = None) -> uc.Chrome:
     """
-    Launch an undetected Chrome webdriver instance
+    Launch an undetected Chrome webdriver instance, optionally bound to a dedicated profile directory
     """
     options = uc.ChromeOptions()
     if headless:
@@ -18,9 +34,10 @@ def launch_webdriver(headless: bool = False) -> uc.Chrome:
     # options.add_argument("--use-fake-device-for-media-stream")
     options.add_argument("--use-fake-ui-for-media-stream")
     options.add_argument("--window-size=1920,1080")
-        
+
     # Create undetected ChromeDriver instance
-    driver = uc.Chrome(options=options)
+    with _launch_lock:
+        driver = uc.Chrome(options=options, user_data_dir=user_data_dir)
     # driver.maximize_window() # failed for fake xvfb display
 
     # Setting permissions for meet.google.com beforehand
@@ -29,6 +46,197 @@ def launch_webdriver(headless: bool = False) -> uc.Chrome:
         "origin": "https://meet.google.com",
         "permissions": ["audioCapture", "videoCapture"]
     })
-    
+
 
     return driver
+
+
+class DriverLease:
+    """
+    A launched Chrome instance together with its profile directory and usage bookkeeping.
+    The DevTools address and page target id are read once here, on the launching thread, so DevTools
+    clients never send WebDriver commands next to the session's command queue.
+    """
+
+    def __init__(self, driver: uc.Chrome, profile_dir: str, launch_seconds: float):
+        self.driver = driver
+        self.profile_dir = profile_dir
+        self.launch_seconds = launch_seconds
+        self.sessions_served = 0
+        self.debugger_address: str = driver.capabilities["goog:chromeOptions"]["debuggerAddress"]
+        # chromedriver window handles are DevTools target ids
+        self.target_id: str = driver.current_window_handle
+
+    def pss_bytes(self) -> int:
+        return process_tree_pss_bytes(self.driver.browser_pid)
+
+    def is_alive(self) -> bool:
+        try:
+            self.driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def quit(self) -> None:
+        try:
+            self.driver.quit()
+        except Exception as e:
+            print(f"Error quitting driver: {e}")
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+
+class DriverPool:
+    """
+    Keeps pre-launched, permission-granted Chrome instances ready so joins skip the cold browser start.
+    Drivers are refilled in the background and recycled after a number of sessions or above a memory (PSS) limit.
+    """
+
+    def __init__(self, size: int = WARM_POOL_SIZE, max_sessions_per_driver: int = DRIVER_MAX_SESSIONS,
+                 max_pss_mb: int = DRIVER_MAX_PSS_MB, headless: bool = HEADLESS):
+        self.size = size
+        self.max_sessions_per_driver = max_sessions_per_driver
+        self.max_pss_mb = max_pss_mb
+        self.headless = headless
+        self.ready: deque[DriverLease] = deque()
+        self.launching = 0
+        self.hits = 0
+        self.misses = 0
+        self.recycled = 0
+        self.launch_failures = 0
+        self.launch_time = LatencyStats()
+        self.acquire_time = LatencyStats()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, size), thread_name_prefix="driver-pool")
+
+    def _launch(self) -> DriverLease:
+        profile_dir = os.path.join(PROFILE_ROOT, uuid.uuid4().hex[:12])
+        os.makedirs(profile_dir, exist_ok=True)
+        started = time.perf_counter()
+        try:
+            driver = launch_webdriver(headless=self.headless, user_data_dir=profile_dir)
+        except Exception:
+            shutil.rmtree(profile_dir, ignore_errors=True)
+            raise
+        elapsed = time.perf_counter() - started
+        self.launch_time.observe(elapsed)
+        return DriverLease(driver, profile_dir, elapsed)
+
+    def _warm_one(self) -> None:
+        try:
+            lease = self._launch()
+        except Exception as e:
+            print(f"Error pre-warming driver: {e}")
+            with self._lock:
+                self.launching -= 1
+                self.launch_failures += 1
+            return
+        with self._lock:
+            self.launching -= 1
+            if not self._closed:
+                self.ready.append(lease)
+                return
+        lease.quit()
+
+    def refill(self) -> None:
+        """
+        Schedules background launches until ready plus launching drivers reach the pool size
+        """
+        with self._lock:
+            if self._closed:
+                return
+            missing = self.size - len(self.ready) - self.launching
+            self.launching += max(0, missing)
+        for _ in range(missing):
+            self._executor.submit(self._warm_one)
+
+    def acquire(self) -> DriverLease:
+        """
+        Hands out a warm driver, or launches one cold when the pool is empty. Blocking.
+        """
+        started = time.perf_counter()
+        lease = None
+        while True:
+            with self._lock:
+                candidate = self.ready.popleft() if self.ready else None
+            if candidate is None:
+                break
+            if candidate.is_alive():
+                lease = candidate
+                break
+            # Warm driver crashed while idling, throw it away and try the next one
+            candidate.quit()
+
+        if lease is not None:
+            with self._lock:
+                self.hits += 1
+        else:
+            with self._lock:
+                self.misses += 1
+            lease = self._launch()
+
+        lease.sessions_served += 1
+        self.acquire_time.observe(time.perf_counter() - started)
+        self.refill()
+        return lease
+
+    def release(self, lease: DriverLease, recycle: bool = True) -> None:
+        """
+        Returns a driver after its session ended. Worn out or bloated drivers are quit instead. Blocking.
+        """
+        reusable = (
+            recycle
+            and not self._closed
+            and lease.sessions_served < self.max_sessions_per_driver
+            and lease.pss_bytes() < self.max_pss_mb * 1024 * 1024
+            and self._reset(lease)
+        )
+        with self._lock:
+            if reusable and len(self.ready) + self.launching < self.size:
+                self.ready.append(lease)
+                return
+            self.recycled += 1
+        lease.quit()
+        self.refill()
+
+    @staticmethod
+    def _reset(lease: DriverLease) -> bool:
+        """
+        Wipes meeting state from a used driver so the next session starts clean
+        """
+        try:
+            lease.driver.get("about:blank")
+            lease.driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            lease.driver.execute_cdp_cmd("Storage.clearDataForOrigin", {
+                "origin": "https://meet.google.com",
+                "storageTypes": "all"
+            })
+            return True
+        except Exception as e:
+            print(f"Error resetting driver, discarding it: {e}")
+            return False
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._closed = True
+            leases = list(self.ready)
+            self.ready.clear()
+        for lease in leases:
+            lease.quit()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "size": self.size,
+                "ready": len(self.ready),
+                "launching": self.launching,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / requests, 4) if requests else 0.0,
+                "recycled": self.recycled,
+                "launch_failures": self.launch_failures,
+                "launch_seconds": self.launch_time.to_dict(),
+                "acquire_seconds": self.acquire_time.to_dict(),
+            }
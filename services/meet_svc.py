@@ -1,122 +1,135 @@
-import random
-import time
 import undetected_chromedriver as uc
+from typing import Optional
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.support.ui import WebDriverWait
 
-from helpers.utils import reliable_click, setup_mutation_observer, clear_got_it_dialogs, find_mute_status, find_video_status
-from models.models import Layout
+from helpers.screenshots import take_screenshot, screenshot_on_error
+from helpers.selectors import click, find, find_now, navigate, wait_gone
+from helpers.tracing import span
+from helpers.waits import human_pause
+from helpers.utils import setup_mutation_observer, clear_got_it_dialogs, find_mute_status, find_video_status, \
+    read_participant_names
+from models.models import Layout, TypingMode
+from services.roster_svc import Roster
 
 
 def join_google_meet(driver: uc.Chrome, bot_name: str, meet_url: str):
     """
-    Join a Google Meet session using provided webdriver, bot name and meeting url
+    Join a Google Meet session using provided webdriver, bot name and meeting url.
+    Every step is traced. Errors are screenshotted and raised, so the join command fails.
     """
-    try:
-        # Navigate to the Google Meet URL
-        print(f"Navigating to {meet_url}")
-        driver.get(meet_url)
-
-        # Waiting 30s for the page to load
-        WebDriverWait(driver, 30).until(
-            lambda d: d.execute_script("return document.readyState") == "complete"
-        )
-        print("Page loaded successfully")
-        driver.save_screenshot("screenshots/join_meet/1_page_loaded.png")
-
-        # Add random delay
-        time.sleep(random.uniform(2.5, 4.0))
-
-        # Turn off microphone
-        mic_button_xpath = "//div[@role='button' and @aria-label='Turn off microphone']"
-        reliable_click(driver, (By.XPATH, mic_button_xpath))
-        print("Mic turned off")
-        driver.save_screenshot("screenshots/join_meet/2_mic_off.png")
-
-        # Turn off video
-        video_button_xpath = "//div[@role='button' and @aria-label='Turn off camera']"
-        reliable_click(driver, (By.XPATH, video_button_xpath))
-        print("Video turned off")
-        driver.save_screenshot("screenshots/join_meet/3_video_off.png")
-
-        # Click on name input field (no verification needed)
-        text_box_found = reliable_click(
-            driver,
-            (By.XPATH, "//input[@type='text' and @placeholder='Your name']"),
-        )
-
-        if text_box_found:
-            # Get the text box element again to type in it
-            text_box = driver.find_element(
-                By.XPATH, "//input[@type='text' and @placeholder='Your name']"
-            )
-
-            # Type name with random delays between keystrokes
-            for char in bot_name:
-                text_box.send_keys(char)
-                time.sleep(random.uniform(0.05, 0.2))  # Random delay between keystrokes
-
-            time.sleep(random.uniform(0.5, 1.0))
-            print("Name entered")
-            driver.save_screenshot("screenshots/join_meet/4_name_entered.png")
-
-        # Trying "Ask to join" button or "Join now" button for rejoin
-        reliable_click(
-            driver,
-            (By.XPATH, "//span[contains(text(), 'Ask to join') or contains(text(), 'Join now')]"),
-        )
-        driver.save_screenshot("screenshots/join_meet/5_ask_to_join.png")
-
-        print("Join attempt completed, waiting to let in by the host...")
-
-        # Setup JS mutation observer to detect when the bot is accepted by the host, participant joined or left etc.
-        setup_mutation_observer(driver)
-
-    except KeyboardInterrupt:
-        print("Exiting...")
-    except Exception as e:
-        print(f"An error occurred: {e}")
-
-
-def check_if_joined(driver: uc.Chrome, bot_name: str) -> bool:
+    with span("join_meet", bot_name=bot_name, meeting_url=meet_url):
+        try:
+            # Navigate to the Google Meet URL
+            print(f"Navigating to {meet_url}")
+            with span("join_meet/navigate"):
+                driver.get(meet_url)
+
+            # Waiting 30s for the page to load
+            with span("join_meet/page_load"):
+                WebDriverWait(driver, 30).until(
+                    lambda d: d.execute_script("return document.readyState") == "complete"
+                )
+            print("Page loaded successfully")
+            take_screenshot(driver, "join_meet/1_page_loaded")
+
+            # Humanlike pause before interacting, see MEETBOT_JITTER_SCALE
+            with span("join_meet/human_pause"):
+                human_pause(2.5, 4.0)
+
+            # Turn off microphone
+            with span("join_meet/mic_off") as step:
+                step.set(clicked=click(driver, "prejoin_mic_off"))
+            print("Mic turned off")
+            take_screenshot(driver, "join_meet/2_mic_off")
+
+            # Turn off video
+            with span("join_meet/video_off") as step:
+                step.set(clicked=click(driver, "prejoin_camera_off"))
+            print("Video turned off")
+            take_screenshot(driver, "join_meet/3_video_off")
+
+            # Click on name input field (no verification needed)
+            with span("join_meet/name_input") as step:
+                text_box_found = click(driver, "name_input")
+                step.set(clicked=text_box_found)
+
+            if text_box_found:
+                # Get the text box element again to type in it, it may re-render after the click
+                with span("join_meet/type_name"):
+                    text_box = find(driver, "name_input", timeout=5)
+
+                    # Type name with random delays between keystrokes
+                    type_text(driver, text_box, bot_name, TypingMode.HUMANLIKE)
+
+                    human_pause(0.5, 1.0)
+                print("Name entered")
+                take_screenshot(driver, "join_meet/4_name_entered")
+
+            # Trying "Ask to join" button or "Join now" button for rejoin
+            with span("join_meet/ask_to_join") as step:
+                step.set(clicked=click(driver, "join_button"))
+            take_screenshot(driver, "join_meet/5_ask_to_join")
+
+            print("Join attempt completed, waiting to let in by the host...")
+
+            # Setup JS mutation observer to detect when the bot is accepted by the host, participant joined or left etc.
+            with span("join_meet/observer_setup"):
+                setup_mutation_observer(driver)
+
+        except KeyboardInterrupt:
+            print("Exiting...")
+        except Exception as e:
+            print(f"An error occurred: {e}")
+            take_screenshot(driver, "join_meet/error", error=True)
+            raise
+
+
+@screenshot_on_error("check_joined")
+def check_if_joined(driver: uc.Chrome, bot_name: str, roster: Optional[Roster] = None) -> bool:
     """
     Checks if the bot has successfully joined the meeting by looking for its name in the participants list.
+    When a roster is given, a known member is answered from memory; otherwise the list is read once and synced into it.
     """
-    # Wait for 10 minutes to confirm that the host accepted the bot
-    people_button = WebDriverWait(driver, timeout=600, poll_frequency=5).until(
-        EC.element_to_be_clickable((By.XPATH, "//button[@aria-label='People']"))
-    )
-    people_button.click()
-    time.sleep(2)
-    driver.save_screenshot("screenshots/people_button.png")
-
-    participants_list = WebDriverWait(driver, timeout=10).until(
-        EC.presence_of_element_located(
-            (By.XPATH, "//div[@role='list' and @aria-label='Participants']")
-        )
+    if roster is not None and roster.contains(bot_name):
+        return True
+
+    # Wait for 10 minutes to confirm that the host accepted the bot, waiting in the lobby is no selector miss
+    WebDriverWait(driver, timeout=600, poll_frequency=5).until(
+        lambda d: find_now(d, "people_button", record=False)
     )
 
-    time.sleep(2)
-    driver.save_screenshot("screenshots/participants_list.png")
+    participant_names = read_participants(driver)
+    if roster is not None:
+        roster.sync(participant_names)
 
-    # Get all participant items within the list
-    participant_items = participants_list.find_elements(
-        By.XPATH, ".//div[@role='listitem']"
-    )
-    joined = False
-
-    # Iterate through each participant
-    for participant in participant_items:
-        if bot_name == participant.get_attribute("aria-label"):
-            print(f"Bot {bot_name} successfully joined the meeting")
-            joined = True
-            break
+    joined = bot_name in participant_names
+    if joined:
+        print(f"Bot {bot_name} successfully joined the meeting")
     return joined
 
 
+@screenshot_on_error("read_participants")
+def read_participants(driver: uc.Chrome) -> list[str]:
+    """
+    Opens the People panel unless it is already open, and reads all participant names in one round trip
+    """
+    if not find_now(driver, "participants_list", record=False):
+        # Clear any "Got it" dialogs, so that elements are clickable
+        clear_got_it_dialogs(driver)
+        find(driver, "people_button").click()
+        take_screenshot(driver, "people_button")
+
+    # Wait until the list is rendered with at least one participant in it
+    find(driver, "participant_item")
+    take_screenshot(driver, "participants_list")
+    return read_participant_names(driver)
+
+
+@screenshot_on_error("toggle_mute")
 def toggle_mute_state(driver: uc.Chrome) -> str:
     """
     Toggles the microphone mute state using keyboard shortcut (Ctrl+D).
@@ -124,16 +137,34 @@ def toggle_mute_state(driver: uc.Chrome) -> str:
     # Clear any "Got it" dialogs, so that elements are clickable
     clear_got_it_dialogs(driver)
 
+    previous_status = find_mute_status(driver)
+
     # Use keyboard shortcut to toggle mute state
     action = ActionChains(driver)
     action.key_down(Keys.CONTROL).send_keys("d").key_up(Keys.CONTROL).perform()
 
-    # Allow time for the UI to update
-    time.sleep(1)
+    # Wait for the button label to flip instead of a fixed delay
+    expected_action = {"unmuted": "on", "muted": "off"}.get(previous_status)
+    if expected_action:
+        try:
+            find(driver, "mic_button", timeout=3, visible=False, action=expected_action)
+        except TimeoutException:
+            print(f"Microphone button did not switch to 'Turn {expected_action} microphone'")
 
     return find_mute_status(driver)
 
 
+def set_mute_state(driver: uc.Chrome, muted: bool) -> bool:
+    """
+    Mutes or unmutes the microphone unless it already is. Returns whether it was toggled.
+    """
+    wanted = "muted" if muted else "unmuted"
+    if find_mute_status(driver) == wanted:
+        return False
+    return toggle_mute_state(driver) == wanted
+
+
+@screenshot_on_error("toggle_video")
 def toggle_video_state(driver: uc.Chrome) -> str:
     """
     Toggles the camera video state using keyboard shortcut (Ctrl+E).
@@ -141,143 +172,171 @@ def toggle_video_state(driver: uc.Chrome) -> str:
     # Clear any "Got it" dialogs, so that elements are clickable
     clear_got_it_dialogs(driver)
 
+    previous_status = find_video_status(driver)
+
     # Use keyboard shortcut to toggle video state
     action = ActionChains(driver)
     action.key_down(Keys.CONTROL).send_keys("e").key_up(Keys.CONTROL).perform()
 
-    # Allow time for the UI to update
-    time.sleep(1)
+    # Wait for the button label to flip instead of a fixed delay
+    expected_action = {"video_on": "on", "video_off": "off"}.get(previous_status)
+    if expected_action:
+        try:
+            find(driver, "camera_button", timeout=3, visible=False, action=expected_action)
+        except TimeoutException:
+            print(f"Camera button did not switch to 'Turn {expected_action} camera'")
 
     return find_video_status(driver)
 
 
-def change_meeting_layout(driver: uc.Chrome, layout: Layout) -> None:
+@screenshot_on_error("change_layout")
+def change_meeting_layout(driver: uc.Chrome, layout: Layout) -> dict:
     """
     Changes the Google Meet layout to the specified option.
+    The menu walk, the radio click and the wait for it to be checked run as a single in-page script.
+    Returns the layout actually applied, the label of the checked option and the duration.
     """
-    # Clear any "Got it" dialogs, so that elements are clickable
-    clear_got_it_dialogs(driver)
-
-    more_options_button = driver.find_element(
-        By.XPATH,
-        "//button[@aria-label='More options' and @data-use-native-focus-logic='true']",
-    )
-    more_options_button.click()
-    time.sleep(1)
-    driver.save_screenshot("screenshots/change_layout/1_more_options_menu.png")
-
-    menu = WebDriverWait(driver, timeout=10).until(
-        EC.presence_of_element_located((By.XPATH, "//ul[@aria-label='Call options']"))
-    )
+    with span("change_layout", layout=layout.value) as step:
+        # Clear any "Got it" dialogs, so that elements are clickable
+        clear_got_it_dialogs(driver)
+
+        result = navigate(driver, [
+            # The menu steps are skipped when the layout dialog is still open
+            ("click", "more_options_button", "layout_radiogroup"),
+            ("wait", "call_options_menu", "layout_radiogroup"),
+            ("click", "change_layout_item", "layout_radiogroup"),
+            ("wait", "layout_radiogroup"),
+            ("check", "layout_option"),
+            ("close", "layout_radiogroup"),
+        ], layout=layout.value)
+
+        label = result["text"] or ""
+        applied = next((option.value for option in Layout if option.value in label.lower()), None)
+        step.set(applied=applied, in_page_ms=round(result["duration_ms"], 3))
+        # Meet does not expose the active layout outside this dialog, remember it for probe_state
+        driver.execute_script("if (window.__meetbot) window.__meetbot.layout = arguments[0];", applied)
+        if not result["closed"]:
+            print("Layout dialog still open, sending Escape")
+            ActionChains(driver).key_down(Keys.ESCAPE).key_up(Keys.ESCAPE).perform()
+    print(f"Changed layout to {applied} in {result['duration_ms']:.0f}ms")
+    take_screenshot(driver, f"change_layout/layout_{layout.value}")
+    return {"layout": applied, "label": label, "duration_ms": round(result["duration_ms"], 3)}
+
+
+def disable_incoming_video(driver: uc.Chrome) -> int:
+    """
+    Stops rendering incoming video: video elements are hidden and paused and their tracks disabled.
+    Idempotent, tiles added since the last call are covered by calling it again. Returns the number of tracks disabled.
+    """
+    return driver.execute_script("""
+        if (!document.getElementById('meetbot-no-video')) {
+            const style = document.createElement('style');
+            style.id = 'meetbot-no-video';
+            style.textContent = 'video { visibility: hidden !important; }';
+            document.head.appendChild(style);
+        }
+        let disabled = 0;
+        for (const video of document.querySelectorAll('video')) {
+            if (!video.paused)
+                video.pause();
+            const tracks = video.srcObject && video.srcObject.getVideoTracks ? video.srcObject.getVideoTracks() : [];
+            for (const track of tracks) {
+                if (track.enabled) {
+                    track.enabled = false;
+                    disabled++;
+                }
+            }
+        }
+        return disabled;
+    """)
+
+
+def type_text(driver: uc.Chrome, element: WebElement, text: str, typing_mode: TypingMode) -> None:
+    """
+    Types text into an input element, keystroke by keystroke, in short bursts, or all at once
+    """
+    if typing_mode == TypingMode.INSTANT:
+        # Single CDP call, inserted like a paste into the focused element
+        driver.execute_script("arguments[0].focus();", element)
+        driver.execute_cdp_cmd("Input.insertText", {"text": text})
+    elif typing_mode == TypingMode.FAST:
+        for start in range(0, len(text), 16):
+            element.send_keys(text[start:start + 16])
+            human_pause(0.01, 0.03)
+    else:
+        for char in text:
+            element.send_keys(char)
+            human_pause(0.05, 0.2)
+
+
+def open_chat_panel(driver: uc.Chrome) -> WebElement:
+    """
+    Opens the chat panel unless it is already open, and returns its message input
+    """
+    chat_input = find_now(driver, "chat_input", record=False)
+    if chat_input:
+        return chat_input
 
-    # Find all li elements in the dropdown menu
-    menu_items = menu.find_elements(By.XPATH, "//li[@role='menuitem']")
+    with span("send_chat/open_panel"):
+        # Clear any "Got it" dialogs, so that elements are clickable
+        clear_got_it_dialogs(driver)
 
-    # Look for the "Change layout" option
-    layout_option = None
-    for item in menu_items:
-        try:
-            # Find any span containing the text "Change layout"
-            span_elements = item.find_elements(By.XPATH, ".//span")
-            for span in span_elements:
-                if span.text.strip().lower() == "change layout":
-                    layout_option = item
-                    break
-            if layout_option:
-                break
-        except Exception:
-            continue
-
-    if layout_option:
-        # Click on "Change layout" option
-        layout_option.click()
-        time.sleep(1)
-    driver.save_screenshot("screenshots/change_layout/2_change_layout_menu.png")
-
-    layout_radiogroup = WebDriverWait(driver, timeout=10).until(
-        EC.presence_of_element_located(
-            (By.XPATH, "//div[@aria-label='Change layout' and @role='radiogroup']")
-        )
-    )
+        find(driver, "chat_button").click()
+        print("Chat button clicked")
 
-    # Find the correct radio based on the layout enum value
-    layout_name = layout.value
+        chat_input = find(driver, "chat_input")
+    take_screenshot(driver, "send_chat_message/1_chat_button")
+    return chat_input
 
-    # Find all radio input elements within the radiogroup
-    layout_options = layout_radiogroup.find_elements(
-        By.XPATH, ".//input[@type='radio']"
-    )
 
-    found = False
-    for radio in layout_options:
+def send_chat_messages(driver: uc.Chrome, messages: list[tuple[str, TypingMode]]) -> list:
+    """
+    Sends several chat messages with a single chat panel open, the panel is left open for the next ones.
+    Returns one entry per message, None when sent or the exception that prevented it.
+    """
+    results = []
+    for message, typing_mode in messages:
         try:
-            # Find the parent label element that contains both the radio and the text
-            label = radio.find_element(By.XPATH, "./ancestor::label")
-            if layout_name in label.text.lower():
-                radio.click()
-                print(f"Changed layout to {layout_name}")
-                time.sleep(1)
-                driver.save_screenshot(f"screenshots/change_layout/3_layout_{layout_name.lower()}.png")
-                found = True
-                break
-
+            with span("send_chat", typing_mode=typing_mode.value, length=len(message)):
+                chat_input = open_chat_panel(driver)
+                with span("send_chat/type"):
+                    type_text(driver, chat_input, message, typing_mode)
+                    chat_input.send_keys(Keys.ENTER)
+                # Meet clears the input once it took the message
+                with span("send_chat/confirm"):
+                    WebDriverWait(driver, timeout=5, poll_frequency=0.05).until(
+                        lambda d: chat_input.get_attribute("value") == ""
+                    )
+            print("Message sent")
+            results.append(None)
         except Exception as e:
-            print(f"Error checking layout option: {e}")
-            continue
-    if not found:
-        print(f"Layout {layout_name} not found in available options")
+            print(f"Error sending chat message: {e}")
+            take_screenshot(driver, "send_chat_message/error", error=True)
+            results.append(e)
+    take_screenshot(driver, "send_chat_message/2_message_sent")
+    return results
 
-    action = ActionChains(driver)
-    action.key_down(Keys.ESCAPE).key_up(Keys.ESCAPE).perform()
-    time.sleep(1)
-    driver.save_screenshot("screenshots/change_layout/4_close_button.png")
 
-
-def send_chat_message(driver: uc.Chrome, message: str) -> None:
+def send_chat_message(driver: uc.Chrome, message: str, typing_mode: TypingMode = TypingMode.HUMANLIKE) -> None:
     """
     Sends a chat message to all participants in the meeting.
     """
-    # Clear any "Got it" dialogs, so that elements are clickable
-    clear_got_it_dialogs(driver)
-
-    chat_button = WebDriverWait(driver, timeout=10).until(
-        EC.element_to_be_clickable(
-            (By.XPATH, "//button[@aria-label='Chat with everyone']")
-        )
-    )
-    chat_button.click()
-    print("Chat button clicked")
-    time.sleep(2)
-    driver.save_screenshot("screenshots/send_chat_message/1_chat_button.png")
-
-    chat_input = WebDriverWait(driver, timeout=10).until(
-        EC.presence_of_element_located(
-            (By.XPATH, "//textarea[@aria-label='Send a message']")
-        )
-    )
-    for char in message:
-        chat_input.send_keys(char)
-        time.sleep(random.uniform(0.05, 0.2))
-    chat_input.send_keys(Keys.ENTER)
-    print("Message sent")
-    time.sleep(2)
-    driver.save_screenshot("screenshots/send_chat_message/2_message_sent.png")
-
-    action = ActionChains(driver)
-    action.key_down(Keys.ESCAPE).key_up(Keys.ESCAPE).perform()
-    time.sleep(1)
+    error = send_chat_messages(driver, [(message, typing_mode)])[0]
+    if error is not None:
+        raise error
 
 
+@screenshot_on_error("leave_meeting")
 def exit_meeting(driver: uc.Chrome) -> None:
     """
     Leaves the current Google Meet session.
     """
-    # Clear any "Got it" dialogs, so that elements are clickable
-    clear_got_it_dialogs(driver)
-
-    leave_button = WebDriverWait(driver, timeout=10).until(
-        EC.element_to_be_clickable((By.XPATH, "//button[@aria-label='Leave call']"))
-    )
-    leave_button.click()
-    time.sleep(1)
-    driver.save_screenshot("screenshots/leave_meeting/1_leave_button.png")
+    with span("leave_meeting"):
+        # Clear any "Got it" dialogs, so that elements are clickable
+        clear_got_it_dialogs(driver)
+
+        with span("leave_meeting/click"):
+            find(driver, "leave_button").click()
+        with span("leave_meeting/confirm"):
+            wait_gone(driver, "leave_button", timeout=5)
+    take_screenshot(driver, "leave_meeting/1_leave_button")
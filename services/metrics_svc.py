@@ -0,0 +1,232 @@
+import asyncio
+import time
+from typing import Optional, TYPE_CHECKING
+
+from helpers.metrics import EventLoopLag, Histogram, prometheus_histogram, prometheus_metric, prometheus_summary
+from helpers.procstats import process_tree_stats
+from helpers.tracing import Tracer
+from services.audio_svc import AudioPlayer, AudioRecorder
+from services.camera_svc import CameraStreamer
+from services.events_svc import ConnectionManager
+from services.session_svc import Session, SessionPool
+
+if TYPE_CHECKING:
+    from services.governor_svc import MemoryGovernor
+
+# Performance.getMetrics values exported per session, with their Prometheus name and help text
+BROWSER_METRICS = {
+    "JSHeapUsedSize": ("meetbot_browser_js_heap_used_bytes", "gauge", "JavaScript heap in use by the Meet page"),
+    "JSHeapTotalSize": ("meetbot_browser_js_heap_total_bytes", "gauge", "JavaScript heap allocated by the Meet page"),
+    "Nodes": ("meetbot_browser_dom_nodes", "gauge", "DOM nodes of the Meet page"),
+    "JSEventListeners": ("meetbot_browser_js_event_listeners", "gauge", "Event listeners of the Meet page"),
+    "Documents": ("meetbot_browser_documents", "gauge", "Documents of the Meet page, including frames"),
+    "LayoutCount": ("meetbot_browser_layouts_total", "counter", "Layouts of the Meet page"),
+    "RecalcStyleCount": ("meetbot_browser_style_recalcs_total", "counter", "Style recalculations of the Meet page"),
+    "ScriptDuration": ("meetbot_browser_script_seconds_total", "counter", "Time the Meet page spent running scripts"),
+    "TaskDuration": ("meetbot_browser_task_seconds_total", "counter", "Time the Meet page's main thread was busy"),
+}
+
+# HTTP request durations per (method, route, status), filled by RequestMetrics
+request_time: dict[tuple[str, str, str], Histogram] = {}
+loop_lag = EventLoopLag()
+
+
+class RequestMetrics:
+    """
+    ASGI middleware timing HTTP requests into a histogram per method, route template and status code.
+    Streaming responses are timed until their first part is sent, WebSockets are not timed.
+    """
+
+    def __init__(self, app, histograms: Optional[dict[tuple[str, str, str], Histogram]] = None):
+        self.app = app
+        self.histograms = histograms if histograms is not None else request_time
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = {"code": 500, "timed": False}
+
+        def observe() -> None:
+            if status["timed"]:
+                return
+            status["timed"] = True
+            # The router stores the matched route in the scope, its template keeps label cardinality bounded
+            route = scope.get("route")
+            key = (scope["method"], getattr(route, "path", "unmatched"), str(status["code"]))
+            self.histograms.setdefault(key, Histogram()).observe(time.perf_counter() - started)
+
+        async def send_timed(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body":
+                observe()
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            observe()
+
+
+async def browser_stats(session: Session) -> dict:
+    """
+    Memory and CPU of a session's Chrome process tree from /proc, plus page metrics over CDP when the
+    session has a page event stream
+    """
+    stats: dict = {"process": {}, "page": {}}
+    lease = session.lease
+    if lease is None:
+        return stats
+    try:
+        stats["process"] = await asyncio.to_thread(process_tree_stats, lease.driver.browser_pid)
+    except Exception as e:
+        print(f"Error reading browser process stats of session {session.session_id}: {e}")
+    if session.events and session.events.connected:
+        try:
+            stats["page"] = await session.events.performance_metrics()
+        except Exception as e:
+            print(f"Error reading page metrics of session {session.session_id}: {e}")
+    return stats
+
+
+def gauge(name: str, help_text: str, value: float, metric_type: str = "gauge") -> list[str]:
+    return prometheus_metric(name, metric_type, help_text, [({}, value)])
+
+
+async def render_metrics(pool: SessionPool, manager: ConnectionManager, tracer: Tracer, recorder: AudioRecorder,
+                         player: AudioPlayer, camera: CameraStreamer,
+                         governor: Optional["MemoryGovernor"] = None) -> str:
+    """
+    Prometheus text exposition of the API, the command queues, the browsers, the ffmpeg streamers
+    and the memory governor
+    """
+    sessions = list(pool.sessions.values())
+    browsers = await asyncio.gather(*(browser_stats(session) for session in sessions))
+    commands = pool.command_metrics
+    events = manager.stats()
+    drivers = pool.drivers.stats()
+    player_stats, recorder_stats, camera_stats = player.stats(), recorder.stats(), camera.stats()
+    sink = camera_stats["sink"]
+    source = camera_stats["source"] or {}
+
+    lines = []
+    # API
+    lines += prometheus_histogram("meetbot_http_request_duration_seconds", "HTTP request duration",
+                                  [({"method": method, "route": route, "status": status}, histogram)
+                                   for (method, route, status), histogram in sorted(request_time.items())])
+    lines += prometheus_histogram("meetbot_event_loop_lag_seconds", "How late the event loop wakes up a sleeping task",
+                                  [({}, loop_lag.histogram)])
+    lines += gauge("meetbot_event_loop_lag_last_seconds", "Last measured event loop lag", round(loop_lag.last, 6))
+
+    # Commands
+    names = sorted(commands.issued)
+    lines += prometheus_metric("meetbot_commands_issued_total", "counter", "Browser commands queued",
+                               [({"command": name}, commands.issued[name]) for name in names])
+    lines += prometheus_metric("meetbot_commands_completed_total", "counter", "Browser commands that succeeded",
+                               [({"command": name}, commands.completed.get(name, 0)) for name in names])
+    lines += prometheus_metric("meetbot_commands_failed_total", "counter", "Browser commands that failed",
+                               [({"command": name}, commands.failed.get(name, 0)) for name in names])
+    lines += prometheus_metric("meetbot_commands_rejected_total", "counter", "Browser commands rejected by a full queue",
+                               [({"command": name}, count) for name, count in sorted(commands.rejected.items())])
+    lines += prometheus_histogram("meetbot_command_queue_wait_seconds", "Time commands waited for the driver",
+                                  [({"command": name}, histogram) for name, histogram in sorted(commands.wait_time.items())])
+    lines += prometheus_histogram("meetbot_command_duration_seconds", "Time commands ran on the driver",
+                                  [({"command": name}, histogram) for name, histogram in sorted(commands.run_time.items())])
+    lines += prometheus_metric("meetbot_command_queue_depth", "gauge", "Commands waiting or running per session",
+                               [({"session_id": session.session_id}, session.commands.depth) for session in sessions])
+    steps = tracer.step_stats()
+    lines += prometheus_summary("meetbot_step_duration_seconds", "Duration of traced bot steps",
+                                [({"step": name}, stats) for name, stats in sorted(steps.items())])
+    lines += prometheus_metric("meetbot_step_errors_total", "counter", "Failed traced bot steps",
+                               [({"step": name}, tracer.errors.get(name, 0)) for name in sorted(steps)])
+
+    # Sessions and drivers
+    lines += prometheus_metric("meetbot_sessions", "gauge", "Sessions per state",
+                               [({"state": state}, sum(1 for session in sessions if session.state.value == state))
+                                for state in sorted({session.state.value for session in sessions})])
+    lines += gauge("meetbot_sessions_max", "Session pool size", pool.max_sessions)
+    lines += gauge("meetbot_driver_pool_ready", "Warm Chrome instances ready", drivers["ready"])
+    lines += gauge("meetbot_driver_pool_launching", "Chrome instances being launched", drivers["launching"])
+    lines += gauge("meetbot_driver_pool_hits_total", "Sessions served by a warm driver", drivers["hits"], "counter")
+    lines += gauge("meetbot_driver_pool_misses_total", "Sessions that launched Chrome cold", drivers["misses"], "counter")
+    lines += gauge("meetbot_driver_pool_launch_failures_total", "Failed Chrome launches", drivers["launch_failures"],
+                   "counter")
+
+    # Browsers
+    processes = [({"session_id": session.session_id}, stats["process"])
+                 for session, stats in zip(sessions, browsers) if stats["process"]]
+    lines += prometheus_metric("meetbot_browser_rss_bytes", "gauge", "Resident memory of the Chrome process tree",
+                               [(labels, stats["rss_bytes"]) for labels, stats in processes])
+    lines += prometheus_metric("meetbot_browser_pss_bytes", "gauge",
+                               "Proportional set size of the Chrome process tree, shared pages counted once",
+                               [(labels, stats["pss_bytes"]) for labels, stats in processes])
+    lines += prometheus_metric("meetbot_browser_cpu_seconds_total", "counter", "CPU time of the Chrome process tree",
+                               [(labels, stats["cpu_seconds"]) for labels, stats in processes])
+    lines += prometheus_metric("meetbot_browser_processes", "gauge", "Processes in the Chrome process tree",
+                               [(labels, stats["processes"]) for labels, stats in processes])
+    for key, (name, metric_type, help_text) in BROWSER_METRICS.items():
+        lines += prometheus_metric(name, metric_type, help_text,
+                                   [({"session_id": session.session_id}, stats["page"][key])
+                                    for session, stats in zip(sessions, browsers) if key in stats["page"]])
+
+    # Events
+    lines += gauge("meetbot_event_subscribers", "Connected /events WebSocket subscribers", events["subscribers"])
+    lines += prometheus_metric("meetbot_preview_viewers", "gauge", "Live preview viewers",
+                               [({"session_id": session.session_id}, session.preview.viewers)
+                                for session in sessions if session.preview])
+    lines += gauge("meetbot_audio_stream_subscribers", "Recording audio WebSocket subscribers",
+                   recorder_stats["subscribers"])
+    lines += prometheus_metric("meetbot_events_total", "counter", "Broadcast events per type",
+                               [({"type": event_type}, count) for event_type, count in sorted(manager.broadcasts.items())])
+    lines += prometheus_histogram("meetbot_event_broadcast_seconds", "Time to log, serialize and queue an event for "
+                                  "every subscriber", [({}, manager.broadcast_time)])
+    lines += prometheus_histogram("meetbot_event_delivery_seconds", "Time from queueing an event until it was sent to "
+                                  "a subscriber", [({}, manager.delivery_time)])
+    lines += gauge("meetbot_event_subscriber_queued", "Events waiting in subscriber queues", events["queued"])
+    lines += gauge("meetbot_event_subscribers_evicted_total", "Subscribers disconnected for being too slow",
+                   events["evicted"], "counter")
+
+    # ffmpeg streamers
+    lines += prometheus_metric("meetbot_streamer_up", "gauge", "Whether an ffmpeg streamer is running", [
+        ({"streamer": "camera"}, int(camera_stats["running"] and sink["alive"])),
+        ({"streamer": "recorder"}, int(recorder_stats["running"])),
+        ({"streamer": "player"}, int(player_stats["running"])),
+    ])
+    lines += prometheus_metric("meetbot_streamer_restarts_total", "counter", "ffmpeg processes restarted after a crash", [
+        ({"streamer": "camera_sink"}, camera_stats["restarts"]["sink"]),
+        ({"streamer": "camera_source"}, camera_stats["restarts"]["source"]),
+        ({"streamer": "player"}, player_stats["restarts"]),
+    ])
+    lines += prometheus_metric("meetbot_camera_frames_total", "counter", "Frames written to the virtual camera", [
+        ({"kind": "written"}, camera_stats["frames_written"]),
+        ({"kind": "repeated"}, camera_stats["frames_repeated"]),
+        ({"kind": "late"}, camera_stats["frames_late"]),
+        ({"kind": "source_dropped"}, source.get("frames_dropped", 0)),
+    ])
+    try:
+        sink_fps = float(sink["fps"] or 0)
+    except ValueError:
+        sink_fps = 0.0
+    lines += gauge("meetbot_camera_sink_fps", "Frame rate reported by the camera sink ffmpeg", sink_fps)
+    lines += gauge("meetbot_recorder_seconds_captured", "Seconds of audio captured by the current recording",
+                   recorder_stats["seconds_captured"])
+    lines += gauge("meetbot_recorder_chunks_dropped_total", "PCM chunks dropped for slow audio subscribers",
+                   recorder_stats["chunks_dropped"], "counter")
+    lines += gauge("meetbot_playback_queue", "Clips waiting or playing", len(player_stats["queue"]))
+    lines += prometheus_metric("meetbot_playback_clips_total", "counter", "Clips played into the microphone", [
+        ({"result": "played"}, player_stats["played"]),
+        ({"result": "failed"}, player_stats["failed"]),
+    ])
+
+    # Memory governor
+    if governor is not None:
+        states = sorted(governor.sessions.items())
+        lines += prometheus_metric("meetbot_governor_stage", "gauge", "Memory mitigation stages applied per session",
+                                   [({"session_id": session_id}, state.stage) for session_id, state in states])
+        lines += prometheus_metric("meetbot_governor_rejoins_total", "counter", "Rejoins forced by the memory governor",
+                                   [({"session_id": session_id}, state.rejoins) for session_id, state in states])
+        lines += prometheus_metric("meetbot_governor_halted", "gauge",
+                                   "Sessions the memory governor gave up on after a rejoin did not help",
+                                   [({"session_id": session_id}, int(state.halted)) for session_id, state in states])
+    return "\n".join(lines) + "\n"
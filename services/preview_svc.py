@@ -0,0 +1,145 @@
+import asyncio
+import base64
+import time
+from typing import AsyncIterator, Optional
+
+from helpers.config import PREVIEW_FPS, PREVIEW_QUALITY, PREVIEW_MAX_WIDTH, PREVIEW_MAX_HEIGHT
+from services.cdp_svc import CDPConnection, page_websocket_url
+
+
+class PreviewStream:
+    """
+    Live JPEG screencast of a session's page through CDP Page.startScreencast.
+    The screencast runs only while somebody watches. Every frame is decoded once and shared by all viewers;
+    a viewer that falls behind skips straight to the latest frame instead of queueing old ones.
+    """
+
+    def __init__(self, address: str, target_id: str, fps: float = PREVIEW_FPS, quality: int = PREVIEW_QUALITY,
+                 max_width: int = PREVIEW_MAX_WIDTH, max_height: int = PREVIEW_MAX_HEIGHT, attach_grace: float = 10):
+        self.address = address
+        self.target_id = target_id
+        self.fps = fps
+        self.quality = quality
+        self.max_width = max_width
+        self.max_height = max_height
+        # Seconds a screencast started ahead of its viewer waits for it, see start
+        self.attach_grace = attach_grace
+        self.connection: Optional[CDPConnection] = None
+        self.frame: Optional[bytes] = None
+        # multipart/x-mixed-replace part of the latest frame, built once for every MJPEG viewer
+        self.mjpeg_part: Optional[bytes] = None
+        self.frame_id = 0
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.viewers = 0
+        self._published_at = 0.0
+        self._new_frame = asyncio.Condition()
+        self._lock = asyncio.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self.connection is not None and self.connection.connected
+
+    async def _on_frame(self, params: dict) -> None:
+        # Chrome sends the next frame only once this one is acknowledged
+        await self.connection.send_nowait("Page.screencastFrameAck", {"sessionId": params["sessionId"]})
+        self.frames_received += 1
+        now = time.monotonic()
+        if now - self._published_at < 1 / self.fps:
+            self.frames_dropped += 1
+            return
+        self._published_at = now
+        frame = base64.b64decode(params["data"])
+        async with self._new_frame:
+            self.frame = frame
+            self.mjpeg_part = (b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                               + str(len(frame)).encode() + b"\r\n\r\n" + frame + b"\r\n")
+            self.frame_id += 1
+            self._new_frame.notify_all()
+
+    async def start(self) -> None:
+        """
+        Starts the screencast unless it is running. Started without a viewer, e.g. to report errors
+        before a streaming response is sent, it is stopped again unless a viewer attaches within attach_grace.
+        """
+        async with self._lock:
+            if self.running:
+                return
+            ws_url = await asyncio.to_thread(page_websocket_url, self.address, self.target_id)
+            connection = CDPConnection(ws_url)
+            await connection.connect()
+            connection.on("Page.screencastFrame", self._on_frame)
+            self.connection = connection
+            try:
+                await connection.send("Page.enable")
+                await connection.send("Page.startScreencast", {
+                    "format": "jpeg",
+                    "quality": self.quality,
+                    "maxWidth": self.max_width,
+                    "maxHeight": self.max_height,
+                })
+            except Exception:
+                await self._stop()
+                raise
+            if self.viewers == 0:
+                loop = asyncio.get_running_loop()
+                loop.call_later(self.attach_grace, lambda: loop.create_task(self._release()))
+
+    async def _stop(self) -> None:
+        connection, self.connection = self.connection, None
+        if connection is None:
+            return
+        try:
+            await connection.send("Page.stopScreencast", timeout=2)
+        except Exception:
+            pass
+        await connection.close()
+        async with self._new_frame:
+            self._new_frame.notify_all()
+
+    async def stop(self) -> None:
+        async with self._lock:
+            await self._stop()
+
+    async def _release(self) -> None:
+        async with self._lock:
+            if self.viewers == 0:
+                await self._stop()
+
+    async def watch(self, max_fps: Optional[float] = None, mjpeg: bool = False) -> AsyncIterator[bytes]:
+        """
+        Yields the latest frame (or its MJPEG part) whenever a new one arrives, at most max_fps times a second.
+        The screencast is started for the first viewer and stopped after the last one left.
+        """
+        self.viewers += 1
+        try:
+            await self.start()
+            last_seen = 0
+            while True:
+                async with self._new_frame:
+                    await self._new_frame.wait_for(lambda: self.frame_id != last_seen or not self.running)
+                    if not self.running:
+                        return
+                    last_seen = self.frame_id
+                    frame = self.mjpeg_part if mjpeg else self.frame
+                yield frame
+                if max_fps:
+                    await asyncio.sleep(1 / max_fps)
+        finally:
+            self.viewers -= 1
+            if self.viewers == 0:
+                # Viewer tasks are usually being cancelled here, stop from a task of its own
+                asyncio.get_running_loop().create_task(self._release())
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "viewers": self.viewers,
+            "fps": self.fps,
+            "quality": self.quality,
+            "max_width": self.max_width,
+            "max_height": self.max_height,
+            "frames_received": self.frames_received,
+            "frames_dropped": self.frames_dropped,
+            "frames_published": self.frame_id,
+        }
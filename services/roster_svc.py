@@ -0,0 +1,79 @@
+from datetime import datetime
+from typing import Iterable, Optional
+
+
+class Participant:
+    """
+    A single roster entry, kept around after the participant left
+    """
+
+    def __init__(self, name: str, joined_at: datetime):
+        self.name = name
+        self.joined_at = joined_at
+        self.left_at: Optional[datetime] = None
+        self.present = True
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "present": self.present,
+            "joined_at": self.joined_at.isoformat(),
+            "left_at": self.left_at.isoformat() if self.left_at else None,
+        }
+
+
+class Roster:
+    """
+    Participant index of one meeting, maintained incrementally from observer events and participant list snapshots.
+    Lookups are answered from memory without touching the browser.
+    """
+
+    def __init__(self):
+        self.participants: dict[str, Participant] = {}
+        self.present_count = 0
+
+    def mark_joined(self, name: str, at: Optional[datetime] = None) -> None:
+        participant = self.participants.get(name)
+        if participant is None:
+            self.participants[name] = Participant(name, at or datetime.now())
+            self.present_count += 1
+        elif not participant.present:
+            participant.present = True
+            participant.joined_at = at or datetime.now()
+            participant.left_at = None
+            self.present_count += 1
+
+    def mark_left(self, name: str, at: Optional[datetime] = None) -> None:
+        participant = self.participants.get(name)
+        if participant is None:
+            # Joined before the bot did, only their departure was observed
+            participant = self.participants[name] = Participant(name, at or datetime.now())
+            self.present_count += 1
+        if participant.present:
+            participant.present = False
+            participant.left_at = at or datetime.now()
+            self.present_count -= 1
+
+    def sync(self, names: Iterable[str], at: Optional[datetime] = None) -> None:
+        """
+        Reconciles the roster with a full participant list read from the page
+        """
+        listed = set(names)
+        for name in listed:
+            self.mark_joined(name, at)
+        for name, participant in self.participants.items():
+            if participant.present and name not in listed:
+                self.mark_left(name, at)
+
+    def contains(self, name: str) -> bool:
+        participant = self.participants.get(name)
+        return participant is not None and participant.present
+
+    def to_dict(self, present_only: bool = False) -> dict:
+        return {
+            "present_count": self.present_count,
+            "participants": [
+                participant.to_dict() for participant in self.participants.values()
+                if participant.present or not present_only
+            ],
+        }
@@ -0,0 +1,169 @@
+import uuid
+from datetime import datetime
+from typing import Optional
+
+import undetected_chromedriver as uc
+
+from helpers.config import MAX_SESSIONS, EVENT_BUFFER_SIZE
+from helpers.screenshots import ScreenshotStore, attach_store, detach_store
+from models.models import SessionState
+from services.cdp_svc import PageEventStream
+from services.chat_svc import ChatStore, open_chat_store, release_chat_store
+from services.command_svc import CommandMetrics, CommandQueue, OperationRegistry
+from services.launch_svc import DriverPool, DriverLease
+from services.preview_svc import PreviewStream
+from services.roster_svc import Roster
+from services.state_svc import StateCache
+
+
+class PoolFullError(Exception):
+    """
+    Raised when the session pool has no free slot for another meeting
+    """
+
+
+class Session:
+    """
+    A single bot sitting in one meeting, with its own Chrome instance and profile directory
+    """
+
+    def __init__(self, bot_name: str, meeting_url: str, drivers: DriverPool,
+                 operations: Optional[OperationRegistry] = None, command_metrics: Optional[CommandMetrics] = None):
+        self.session_id = uuid.uuid4().hex[:12]
+        self.bot_name = bot_name
+        self.meeting_url = meeting_url
+        self.drivers = drivers
+        self.lease: Optional[DriverLease] = None
+        self.driver: Optional[uc.Chrome] = None
+        self.events: Optional[PageEventStream] = None
+        self.preview: Optional[PreviewStream] = None
+        self.commands = CommandQueue(self.session_id, registry=operations, metrics=command_metrics)
+        self.roster = Roster()
+        self.chat: ChatStore = open_chat_store(meeting_url, self.session_id)
+        self.ui_state = StateCache()
+        self.screenshots = ScreenshotStore(self.session_id)
+        self.state = SessionState.STARTING
+        self.created_at = datetime.now()
+        # Observer event bookkeeping, see accept_event
+        self.event_epoch: Optional[str] = None
+        self.last_event_seq = 0
+        self.missing_event_seqs: set[int] = set()
+        self.events_dropped = 0
+        # Set while waiting in the lobby, see join_meeting_background
+        self.admission_started_ns: Optional[int] = None
+
+    def launch(self) -> uc.Chrome:
+        """
+        Takes a Chrome instance for this session from the driver pool. Blocking, run it off the event loop.
+        """
+        self.lease = self.drivers.acquire()
+        self.driver = self.lease.driver
+        attach_store(self.driver, self.screenshots)
+        return self.driver
+
+    def relaunch(self) -> uc.Chrome:
+        """
+        Swaps the session's Chrome instance for a fresh one from the driver pool, keeping the session itself,
+        its command queue, roster and chat. The old instance is quit. Blocking, run it off the event loop.
+        """
+        if self.lease:
+            detach_store(self.driver)
+            self.drivers.release(self.lease, recycle=False)
+            self.lease = None
+            self.driver = None
+        return self.launch()
+
+    @property
+    def profile_dir(self) -> Optional[str]:
+        return self.lease.profile_dir if self.lease else None
+
+    def close(self, recycle: bool = True) -> None:
+        """
+        Hands the Chrome instance back to the driver pool, which recycles or quits it, and releases the chat store. Blocking.
+        """
+        if self.lease:
+            detach_store(self.driver)
+            self.drivers.release(self.lease, recycle=recycle)
+            self.lease = None
+            self.driver = None
+        release_chat_store(self.chat, self.session_id)
+        self.state = SessionState.CLOSED
+
+    def accept_event(self, event: dict) -> bool:
+        """
+        Tells whether an observer event has not been delivered yet.
+        Events arrive both pushed and drained, and out of order around stream reconnects,
+        so skipped sequence numbers are remembered until they show up.
+        """
+        epoch, seq = event.get("epoch"), event["seq"]
+        if epoch != self.event_epoch:
+            # The page was reloaded, its observer starts counting again
+            self.event_epoch = epoch
+            self.last_event_seq = 0
+            self.missing_event_seqs.clear()
+            self.events_dropped = 0
+        if seq > self.last_event_seq:
+            oldest = seq - EVENT_BUFFER_SIZE
+            self.missing_event_seqs = {s for s in self.missing_event_seqs if s > oldest}
+            self.missing_event_seqs.update(range(max(self.last_event_seq + 1, oldest + 1), seq))
+            self.last_event_seq = seq
+            return True
+        if seq in self.missing_event_seqs:
+            self.missing_event_seqs.discard(seq)
+            return True
+        return False
+
+    def to_dict(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "bot_name": self.bot_name,
+            "meeting_url": self.meeting_url,
+            "state": self.state.value,
+            "command_queue_depth": self.commands.depth,
+            "last_event_seq": self.last_event_seq,
+            "events_dropped": self.events_dropped,
+            "created_at": self.created_at.isoformat(),
+        }
+
+
+class SessionPool:
+    """
+    Keeps track of all concurrent meeting sessions and enforces the configured pool size
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, drivers: Optional[DriverPool] = None):
+        self.max_sessions = max_sessions
+        self.drivers = drivers or DriverPool()
+        self.operations = OperationRegistry()
+        self.command_metrics = CommandMetrics()
+        self.sessions: dict[str, Session] = {}
+
+    def create(self, bot_name: str, meeting_url: str) -> Session:
+        """
+        Admits a new session into the pool, or raises PoolFullError when every slot is taken.
+        """
+        if len(self.sessions) >= self.max_sessions:
+            raise PoolFullError(f"Session pool is full ({self.max_sessions} sessions active)")
+        session = Session(bot_name, meeting_url, self.drivers, self.operations, self.command_metrics)
+        self.sessions[session.session_id] = session
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        return self.sessions.get(session_id)
+
+    def remove(self, session_id: str) -> Optional[Session]:
+        """
+        Releases the pool slot held by a session. The caller is responsible for closing it.
+        """
+        return self.sessions.pop(session_id, None)
+
+    def active(self) -> list[Session]:
+        """
+        Returns sessions whose browser is up and can be driven
+        """
+        return [session for session in self.sessions.values() if session.driver is not None]
+
+    def close_all(self) -> None:
+        for session_id in list(self.sessions):
+            self.remove(session_id).close(recycle=False)
+        self.drivers.shutdown()
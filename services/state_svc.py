@@ -0,0 +1,46 @@
+import time
+from typing import Optional
+
+from helpers.config import STATE_CACHE_TTL
+
+
+class StateCache:
+    """
+    Last meeting state probe of a session. Entries expire after a short TTL and are invalidated
+    as soon as an observer event or a finished command says the page changed.
+    """
+
+    def __init__(self, ttl: float = STATE_CACHE_TTL):
+        self.ttl = ttl
+        self.state: Optional[dict] = None
+        self.probed_at = 0.0
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self) -> Optional[dict]:
+        """
+        Returns the cached state while it is fresh, None otherwise
+        """
+        if self.state is not None and time.monotonic() - self.probed_at < self.ttl:
+            self.hits += 1
+            return self.state
+        self.misses += 1
+        return None
+
+    @property
+    def age_ms(self) -> Optional[float]:
+        return round((time.monotonic() - self.probed_at) * 1000, 3) if self.state is not None else None
+
+    def update(self, state: dict, generation: int) -> None:
+        """
+        Stores a probe result, unless the cache was invalidated while the probe was running
+        """
+        if generation != self.generation:
+            return
+        self.state = state
+        self.probed_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        self.generation += 1
+        self.state = None